@@ -1,14 +1,14 @@
 import streamlit as st
 from io import StringIO
 import pandas as pd
-from portfolio import Portfolio
+from portfolio import Portfolio, metrics
 from portfolio.presentation import Figure
 from portfolio.ai import AI
 from portfolio.sentiment import Sentiment
 
 import os
-import time
 import datetime
+import logging
 
 def load_css(filepath):
     with open(os.path.join("data","css",filepath),"r") as fh: 
@@ -31,6 +31,15 @@ def get_fig(_portfolio, date_range, title:str=None):
     fig.update_layout(title={ 'text': title, 'y':0.95,  'x':0.5, 'xanchor':'center', 'yanchor': 'top'})
     return fig
 
+def get_forecast_table(_portfolio, horizon=30):
+    # last value and forecast at the end of the horizon of the portfolio close and of the price of the symbols
+    forecasts = _portfolio.get_forecast(horizon=horizon)
+    last = {"portfolio": _portfolio.history["close"].iloc[-1]}
+    last.update(_portfolio.get_unit_values("close").ffill().iloc[-1].items())
+    table = pd.DataFrame({name: {"last": last.get(name), "forecast": forecast["yhat"].iloc[-1], "lower": forecast["yhat_lower"].iloc[-1], "upper": forecast["yhat_upper"].iloc[-1]} for name, forecast in forecasts.items()}).T
+    table["change %"] = 100 * (table["forecast"] / table["last"] - 1)
+    return table
+
 def section_title(text:str, level=1):
     """
         Generates a h3 header and returns th corresponding anchor id
@@ -56,7 +65,7 @@ def section_title(text:str, level=1):
     return id
 
 def st_reset_session():
-    for state  in ["ai_response","fig","portfolio","recommendation","sentiment","sentiment_value""sentiment_result","forecast","forecast_delta"]:
+    for state  in ["ai_response","fig","portfolio","recommendation","sentiment","sentiment_value""sentiment_result","forecast","forecast_delta","forecast_table"]:
         if state in st.session_state:
             del st.session_state[state]
 
@@ -65,9 +74,19 @@ def reload_transactions(_portfolio, selected_only=True):
     calc_portfolio(_portfolio, selected_only=selected_only)
 
 def calc_portfolio(_portfolio, selected_only=True):
-    _portfolio.load_history(selected_only=selected_only)
+    _portfolio.refresh_history(selected_only=selected_only)
     _portfolio.aggregate_to(level="portfolio", inplace=True, selected_only=selected_only)
-    _portfolio.get_portfolio_tech_indicators(inplace=True, symbols= None, interval=interval)
+    # only the chosen indicators (and their inputs) are computed
+    _portfolio.get_portfolio_tech_indicators(inplace=True, symbols= None, interval=interval, indicators=st.session_state.get("_indicators") or [])
+
+def debug_panel():
+    report = metrics.report()
+    spans = pd.DataFrame.from_dict(report["spans"], orient="index")
+    if len(spans) > 0: spans = spans.sort_values("seconds", ascending=False)
+    st.dataframe(spans, use_container_width=True)
+    st.dataframe(pd.DataFrame.from_dict(report["caches"], orient="index"), use_container_width=True)
+    st.json({"counters": report["counters"], "gauges": report["gauges"]})
+    if st.button("Reset metrics"): metrics.reset()
 
 def navbar(entries:dict):
     with open(os.path.join("data","markdown","navbar.header.markdown")) as fh:
@@ -91,7 +110,7 @@ def load_portfolio(_portfolio:Portfolio, reset = True, uploader = None, df = Non
         if "portfolio" in st.session_state: del st.session_state["portfolio"]
     _portfolio._init_data()
     if uploader is not None:
-        _portfolio.from_csv(st_uploader)
+        _portfolio.from_file(st_uploader)
         print(_portfolio.transactions.dtypes)
         calc_portfolio(_portfolio)
     if df is not None:
@@ -117,7 +136,7 @@ if __name__ == "__main__":
         section_title("Load")
         ticker1,ticker2,ticker3 = st.columns([3,3,3])
         if "file_uploader_key" not in st.session_state: st.session_state["file_uploader_key"] = 0
-        with ticker1:   st_uploader = st.file_uploader("**Upload**", type=["csv"],label_visibility="collapsed", key=f'upload_{st.session_state["file_uploader_key"]}')
+        with ticker1:   st_uploader = st.file_uploader("**Upload**", type=["csv", "parquet", "arrow", "feather"],label_visibility="collapsed", key=f'upload_{st.session_state["file_uploader_key"]}')
         with ticker2:   st_load_ticker=st.button("**Load Ticker**", use_container_width=True,)
         with ticker3:   st_ticker_text = st.text_input("Ticker Symbol", label_visibility="collapsed", placeholder="Ticker Symbol", key="ticker_symbol",max_chars=10)
 
@@ -188,7 +207,7 @@ if __name__ == "__main__":
             st_cont_chart = st.container()
             with st_cont_chart: st.write(" ")
 
-        st_cont_forecast=st.expander("Forecast (TBD)",expanded=False)
+        st_cont_forecast=st.expander("Forecast (30 days)",expanded=False)
         with st_cont_forecast: st.write(" ")
 
         st_cont_sentiment = st.expander("Sentiment",expanded=False)
@@ -196,6 +215,9 @@ if __name__ == "__main__":
         
         st_cont_ai = st.expander("AI Analysis",expanded=False)
         with st_cont_ai: st.write(" ")
+
+        # only with PORTFOLIO_METRICS=1, filled at the end of the run
+        st_cont_debug = st.expander("Debug (metrics)",expanded=False) if metrics.enabled() else None
         
     if st_uploader or st_load_ticker or analyze_btn:
         with st_commands:
@@ -242,7 +264,7 @@ if __name__ == "__main__":
             
             with trans_col:            
                 st.session_state.portfolio.transactions["selected"]=True
-                st_data_editor = st.data_editor(data=st.session_state.portfolio.transactions, use_container_width=True, num_rows="dynamic", key="st_data_editor", on_change=None)
+                st_data_editor = st.data_editor(data=st.session_state.portfolio.transactions.astype({"NAME": object, "SYMBOL": object}), use_container_width=True, num_rows="dynamic", key="st_data_editor", on_change=None)
             
             with sym_col:
                 st.dataframe(pd.DataFrame({"Symbols":st.session_state.portfolio.symbol_list}), use_container_width=True, hide_index=True)
@@ -256,7 +278,7 @@ if __name__ == "__main__":
                 st_tech_analysis_chart = st.plotly_chart(st.session_state.fig,use_container_width=True,height=600, theme="streamlit", key="_history_chart",)
 
     if analyze_btn:
-        for state in ["ai_response","forecast","forecast_delta","sentiment","sentiment_result","sentiment_value","recommendation"]:
+        for state in ["ai_response","forecast","forecast_delta","forecast_table","sentiment","sentiment_result","sentiment_value","recommendation"]:
             if state not in st.session_state: st.session_state[state] = None
         
         with st_commands:            
@@ -271,16 +293,17 @@ if __name__ == "__main__":
                     st.session_state.sentiment = my_sentiment
 
             with st.spinner(f"Forecast..."):
-                time.sleep(2.0)
-                plus = 100
-                st.session_state.forecast = f"{int(st.session_state.portfolio.history['close'].iloc[-1])+plus} €"
-                st.session_state.forecast_delta = f"{plus} €"
+                st.session_state.forecast_table = get_forecast_table(st.session_state.portfolio, horizon=30)
+                portfolio_forecast = st.session_state.forecast_table.loc["portfolio"]
+                plus = int(portfolio_forecast["forecast"] - portfolio_forecast["last"])
+                st.session_state.forecast = f"{int(portfolio_forecast['forecast'])} €"
+                st.session_state.forecast_delta = f"{plus:,} €"
         
         with st_cont_ai:
             st.markdown(st.session_state.ai_response)
         
         with st_cont_forecast:
-            st.write(st.session_state.forecast)            
+            st.dataframe(st.session_state.forecast_table, use_container_width=True)            
         
         with st_cont_sentiment:
             if "portfolio" in st.session_state:
@@ -290,11 +313,19 @@ if __name__ == "__main__":
                 st.session_state.sentiment.init_data()
                 st.session_state.sentiment.score_data(model=_model)
                 st.dataframe(st.session_state.sentiment.ticker_info)
+                if len(st.session_state.sentiment.errors) > 0:
+                    st.dataframe(pd.DataFrame(st.session_state.sentiment.errors), use_container_width=True, hide_index=True)
+                try:
+                    # the headlines are in the news archive now, the history gets the daily weighted sentiment (drawn with the next chart)
+                    st.line_chart(st.session_state.portfolio.get_sentiment(model=_model).tail(date_range))
+                except Exception as e:
+                    logging.error(f"No sentiment history. Error: {e}")
+                    st.warning(f"No sentiment history: {e}")
                 fig_sent = st.session_state.sentiment.get_treemap(_model)
                 st.plotly_chart(fig_sent)
     
         with m4:
-            forc_metric = st.metric("Forecast (TBD)",value=st.session_state.forecast, delta=st.session_state.forecast_delta, border=True)
+            forc_metric = st.metric("Forecast (30 days)",value=st.session_state.forecast, delta=st.session_state.forecast_delta, border=True)
         
         with m5:
             st.session_state.sentiment_result = st.session_state.sentiment.total_sentiment(_model)
@@ -303,4 +334,8 @@ if __name__ == "__main__":
         with m6:
             ai_metric   = st.metric("AI Recommendation",value=st.session_state.recommendation, delta=f"by {ai_type.upper()}", border=True, delta_color="off")
 
+    if st_cont_debug is not None:
+        with st_cont_debug:
+            debug_panel()
+
     st.markdown(nav_header, unsafe_allow_html=True)
@@ -1,16 +1,17 @@
-import yfinance as yf
 import numpy as np
 import pandas as pd
 from datetime import datetime
 import logging
 import sys
-from prophet import Prophet
 import json
-from .ticker import _get_history_ticker, _get_rates, _get_ticker_info
-
-
-from warnings import simplefilter
-simplefilter(action="ignore", category=pd.errors.PerformanceWarning)
+from .ticker import _get_history_tickers, _get_rates, _get_ticker_info, _download_infos
+from .history import HistoryEngine
+from .fx import FXMatrix
+from .ingest import read_transactions, report_rejected
+from .indicators import batch_indicators, RollingStats, portfolio_registry
+from .streaming import StreamingIndicator, PortfolioIndicators
+from .forecast import Forecaster
+from . import metrics
 
 logging.basicConfig(
     format="{asctime} - {levelname} - {message}",
@@ -31,8 +32,11 @@ class Portfolio:
             self.start_date             : The start date of the portfolip
             self.end_date               : The last date the portfolio is analyzed (typically today or later)
             self.history                : The historical development of the portfolio from start to end
-            self.target_currency        : For simplicity the portfolio is calcluated in one currency. Defaults to "USD"      
+            self.target_currency        : For simplicity the portfolio is calcluated in one currency. Defaults to "EUR"      
+            self.transaction_currency   : The currency of the PRICE column of the transactions. Defaults to None, i.e. the target currency
             self.selected_info_fields   : Minimal List of (default) info fields from yfinance which will be stored in basedata
+            self.compact                : Compact memory mode of self.history, see set_memory_mode(). Defaults to False
+            self.forecaster             : The forecast.Forecaster of get_forecast(), keeps the fitted models between the calls
         """
         self._init_data()
 
@@ -53,6 +57,9 @@ class Portfolio:
         # for simplicity the portfolio is calcluated in one currency
         self.target_currency = "EUR"
 
+        # the currency of the PRICE column of the transactions, None means it is the target currency
+        self.transaction_currency = None
+
         # The historical development of the portfolio from start to end
         self.history = None
 
@@ -62,26 +69,65 @@ class Portfolio:
         # default info values from yfinance which will be stored in basedata
         self.selected_info_fields=["longName", "country", "currency", "sector", "industry", "marketCap"] 
 
+        # rows of the last loaded file which failed the validation (see from_file())
+        self.rejected_transactions = None
+
+        # compact memory mode of the history: float32 per symbol close, integer or sparse holdings, no intermediates (see set_memory_mode())
+        self.compact = False
+
+        # forecasts of the close and the symbols with the cache of the fitted models (see get_forecast())
+        self.forecaster = None
+
+        # daily sentiment of the symbols from the archived headlines, updated with the new headlines only (see get_sentiment())
+        self.sentiment_index = None
+
         self._exchange_rates = None
+        # exchange rates of all currencies against a pivot currency, any pair is triangulated
+        self._fx = FXMatrix()
+        self._engine = None
+        self._history_symbols = None
+        self._history_selected_only = True
+        self._history_end = None
+        self._history_columns = None
+        # the per symbol value columns were dropped by aggregate_to(cleanup=True), the aggregates are summed in the engine
+        self._history_cleanup = False
+        # symbol -> the first day the quotes of the symbol are fetched from (its first booked transaction)
+        self._quote_starts = {}
+        self._indicator_interval = None
+        # the requested portfolio tech indicators, None for all
+        self._indicator_names = None
+        # streaming portfolio tech indicators, their state ends at the last complete row of self.history
+        self._indicator_stream = None
+        # prefix sums of close and perf for the sma and std of any interval
+        self._indicator_stats = None
         self._currencies = []
         self._prefix_portfolio_indicator="__port_ind__"
         self._prefix_symbol_indicator="__symb_ind__"
         self._prefix_ticker="__tck__"
+        self._prefix_sentiment="__sent__"
+        # model and half life of the sentiment columns of self.history, None if there are none
+        self._sentiment_args = None
 
-        self.portfolio_tech_indicators = ['win', 'sma', 'ema', 'std', 'bb_upper', 'bb_lower', 'perf', 'perf_sma', 'perf_ema', 'perf_std', 'perf_bb_upper', 'perf_bb_lower', 'rsi', 'macd', 'signal_line', 'histogram']
+        # the portfolio tech indicators and their inputs, custom indicators are added with register_indicator()
+        self.indicator_registry = portfolio_registry.copy()
+        self.portfolio_tech_indicators = self.indicator_registry.names()
         
 # ----------------------------
 # PUBLIC methods
 # ----------------------------
-    def from_csv(self,csvfile):
+    def from_csv(self,csvfile, chunksize = 100_000):
         """
         loads transactions from csvfile and save them to self.transactions. Also self.basedata will be filled.
         Columns: NAME, VOLUME, PRICE, DATE, SYMBOL, 
+        The file is read in chunks with explicit dtypes, invalid rows are rejected (see from_file()).
 
         Parameters
         ----------
         csvfile : str
             The file name of the CSV file.
+        chunksize : int
+            default: 100_000
+            Number of rows read at once
 
         Returns
         -------
@@ -95,17 +141,51 @@ class Portfolio:
         NAME,VOLUME,PRICE,DATE,SYMBOL
         AMUNDI MSCI WLD,1,300,01.01.2023,CM9.PA
         
+        """
+        self.from_file(csvfile, format="csv", chunksize=chunksize)
+
+    @metrics.timed()
+    def from_file(self, file, format = None, chunksize = 100_000):
+        """
+        loads transactions from a CSV, Parquet or Arrow IPC (Feather) file and save them to self.transactions. Also self.basedata will be filled.
+        Columns: NAME, VOLUME, PRICE, DATE, SYMBOL, 
+        The file is read and validated chunk by chunk: NAME and SYMBOL become categorical, VOLUME and PRICE float64.
+        Rows with an invalid DATE, VOLUME or PRICE or without SYMBOL are not loaded, they are logged at once and kept in self.rejected_transactions.
+
+        Parameters
+        ----------
+        file : str or file like
+            The file name or an open file (e.g. an upload)
+        format : str
+            default: None
+            "csv", "parquet" or "arrow", if None it is derived from the file name
+        chunksize : int
+            default: 100_000
+            Number of rows read at once
+
+        Returns
+        -------
+        
+        Raises
+        -------
+
+        Example
+        -------
+
+        portfolio.from_file("transactions.parquet")
+        
         """
         try:
-            # self.transactions
-            df  = pd.read_csv(csvfile, sep=",", dayfirst=True,date_format="%d.%m.%Y")
+            df, self.rejected_transactions = read_transactions(file, format=format, chunksize=chunksize)
+            report_rejected(self.rejected_transactions, source=getattr(file, "name", file))
             self.load_transactions(df)
-            logging.info(f"Data loaded from CSV file {csvfile}:")
+            logging.info(f"Data loaded from file {getattr(file, 'name', file)}: {len(df)} transactions")
 
         except Exception as e:
-            logging.error(f"Data could not be loaded from CSV file {csvfile}: {e} ")
+            logging.error(f"Data could not be loaded from file {getattr(file, 'name', file)}: {e} ")
 
 
+    @metrics.timed()
     def load_transactions(self, df:pd.DataFrame):
         """
         loads transactions from Pandas Dataframe and save them to self.transactions. Also self.basedata will be filled.
@@ -132,15 +212,15 @@ class Portfolio:
             # Helper column "select" to select relevant transactions only
             if "selected" not in self.transactions.columns:
                 self.transactions["selected"]=True
-            self.symbol_list = list(set(self.transactions["SYMBOL"]))
+            self.symbol_list = list(self.transactions["SYMBOL"].unique())
             # self.start_date
             self.start_date = self.transactions.index.min()
             self._load_basedata()
             self.history = None
-            logging.info(f"Data loaded from Pandas Dataframe {df}")
+            logging.info(f"Data loaded from Pandas Dataframe with {len(df)} rows")
 
         except Exception as e:
-            logging.error(f"Data could not be loaded from Pandas Dataframe {df}: {e} ")
+            logging.error(f"Data could not be loaded from Pandas Dataframe with {len(df)} rows: {e} ")
 
     def to_csv(self, csvfile, precision = None, selected_only=True):
         """
@@ -203,6 +283,7 @@ class Portfolio:
         except Exception as e:
             logging.error(f"History could not be written to CSV file {csvfile}: {e.with_traceback()} ")
 
+    @metrics.timed()
     def load_history(self, start = None, end = None, aggregate_to = None, cleanup = False, symbols:list= None, selected_only=True):
         """
         computes history and saves to self.history
@@ -236,70 +317,154 @@ class Portfolio:
         if start is None:   start = self.start_date
         if end   is None:   end = datetime.today()
         
-        days = pd.date_range(start=start, end=end, freq='D')
+        days = pd.date_range(start=start, end=end, freq='D', name='Date')
         
-        self.history = pd.DataFrame({'Date': days})
-        self.history = self.history.set_index('Date')
-        
-        transactions = self.transactions.loc[self.transactions["selected"] == True] if selected_only else self.transactions
-        # transactions = self.transactions
+        self._history_symbols, self._history_selected_only, self._history_end = symbols, selected_only, Portfolio._fetch_end(end)
+        transactions = self._history_transactions()
 
-        for index, row in transactions.iterrows():
-            # filter only for symbols list
-            if symbols is not None and row["SYMBOL"] not in symbols: continue 
+        # one dense (days x symbols) panel per field instead of one column per transaction
+        self._quote_starts = {}
+        ticker_dfs, currencies = self._fetch_history(transactions)
 
-            symbol = row["SYMBOL"]
-            
-            ticker_df, _currency = _get_history_ticker(symbol,index,end)
+        self._engine = HistoryEngine(days, dtype=np.float32 if self.compact else np.float64)
+        self._engine.set_quotes(ticker_dfs)
+        self._engine.set_fx(self._exchange_rates, currencies, self.target_currency, self.transaction_currency)
+        self._engine.set_transactions(transactions)
 
-            ticker_df.index = ticker_df.index.tz_localize(None)
-            exchange_factor = self._exchange_rates[f'{_currency}{self.target_currency}=X']
-            exchange_factor = exchange_factor.tz_localize(None)
-            exchange_factor = exchange_factor[start:end]
-            ticker_df["PRICE"] = row["PRICE"]
+        self.history = self._history_frame()
+        self._history_columns = self._history_registry(self._engine.symbols)
+        self._history_cleanup = False
+        # the tech indicators and the sentiment of the previous history are gone
+        self._indicator_interval, self._indicator_stream = None, None
+        self._sentiment_args = None
 
-            self.history[f"{self._prefix_ticker}{symbol}_close"]=ticker_df["Close"]
-            self.history[f"{self._prefix_ticker}{symbol}_high"]=ticker_df["High"]
-            self.history[f"{self._prefix_ticker}{symbol}_low"]=ticker_df["Low"]
-            self.history[f"{self._prefix_ticker}{symbol}_volume"]=ticker_df["Volume"]
+        self.aggregate_to(level = aggregate_to, symbols= symbols, cleanup = cleanup, inplace=True, selected_only=selected_only)
+        metrics.track_frame("history", self.history)
+        logging.info(f"loading history data done!")
 
-            self.history[f'{symbol}_volume_{index.date()}'] = 0.0
-            self.history.loc[index:end, f'{symbol}_volume_{index.date()}'] =  row["VOLUME"]
+    @metrics.timed()
+    def refresh_history(self, end = None, symbols:list= None, selected_only=True):
+        """
+        extends self.history up to end without recomputing it from self.start_date.
+        Only the missing tail (from the last complete row of quotes on) is fetched from yfinance, 
+        appended to self.history and the portfolio aggregates and tech indicators are updated for the new rows only.
+        If there is no history yet (or it was computed for other symbols or selection) load_history() is called.
 
-            self.history[f'{symbol}_close_{index.date()}'] = ticker_df["Close"] * row["VOLUME"] * exchange_factor
-            self.history[f'{symbol}_close_{index.date()}'] = self.history[f'{symbol}_close_{index.date()}'].interpolate()
-            
-            self.history[f'{symbol}_high_{index.date()}'] = ticker_df["High"] * row["VOLUME"] * exchange_factor
-            self.history[f'{symbol}_high_{index.date()}'] = self.history[f'{symbol}_high_{index.date()}'].interpolate()
+        Parameters
+        ----------
+        end: datetime (optional)
+            default: None 
+            The end date of computation. 
+            If None (default), then it is datetime.today()
 
-            self.history[f'{symbol}_low_{index.date()}'] = ticker_df["Low"] * row["VOLUME"] * exchange_factor
-            self.history[f'{symbol}_low_{index.date()}'] = self.history[f'{symbol}_low_{index.date()}'].interpolate()
+        symbols: list (optional)
+            default: None 
+            see load_history()
 
-            self.history[f'{symbol}_price_{index.date()}'] = ticker_df["PRICE"]
-            self.history[f'{symbol}_price_{index.date()}'] = self.history[f'{symbol}_price_{index.date()}'].interpolate() 
+        selected_only: bool (optional)
+            default: True 
+            see load_history()
+                
+        Returns
+        -------
+        -
+        
+        Raises
+        -------
+        -
+        
+        """
+        if self.history is None or self._engine is None or (symbols, selected_only) != (self._history_symbols, self._history_selected_only):
+            self.load_history(end=end, symbols=symbols, selected_only=selected_only)
+            return
+        if end is None:   end = datetime.today()
 
-        self.aggregate_to(level = aggregate_to, symbols= symbols, cleanup = cleanup, inplace=True, selected_only=selected_only)
-        logging.info(f"loading history data done!")
+        days = pd.date_range(start=self.history.index[0], end=end, freq='D', name='Date')
+        if len(days) < len(self.history): return
+        logging.info(f"started refreshing history data")
+
+        self._history_end = Portfolio._fetch_end(end)
+        start = self._engine.first_open_day()
+        ticker_dfs = _get_history_tickers(tuple(self._engine.symbols), start, self._history_end) if len(self._engine.symbols) > 0 else {}
+        self._extend_exchange_rates(start, end)
+        start = self._engine.extend(days, ticker_dfs, self._exchange_rates, self._history_transactions())
+
+        tail = self._history_frame(start=start)
+        # columns dropped by a cleanup are not restored
+        tail = tail[[col for col in tail.columns if col in self.history.columns]]
+        self.history = pd.concat([self.history.loc[self.history.index < start], tail])
+
+        if "close" in self.history.columns:
+            self.aggregate_to(level="portfolio", symbols=symbols, inplace=True, selected_only=selected_only, start=start)
+        if self._indicator_interval is not None:
+            self.get_portfolio_tech_indicators(interval=self._indicator_interval, inplace=True, start=start, indicators=self._indicator_names)
+        self._update_sentiment()
+        metrics.track_frame("history", self.history)
+        logging.info(f"refreshing history data from {start.date()} on done!")
     
-    def aggregate_to(self, level = None, symbols= None, cleanup = False, inplace=False, selected_only=True):
+    @metrics.timed()
+    def aggregate_to(self, level = None, symbols= None, cleanup = False, inplace=False, selected_only=True, start = None):
+        """
+        aggregates the per symbol columns of self.history to the given level. 
+        The columns are looked up in the registry self._history_columns (column -> kind, field, symbol), 
+        the portfolio aggregation is one grouped reduction over the fields.
+
+        Parameters
+        ----------
+        level: str
+            Allowed values are "symbol" or "portfolio" or None (default)
+        symbols: list (optional)
+            default: None
+            aggregate only these symbols
+        cleanup: bool (optional)
+            default: False
+            drop the per symbol columns after the aggregation to "portfolio" (only if inplace)
+        inplace: bool (optional)
+            default: False
+            if True the aggregates are written to self.history, otherwise returned
+        selected_only: bool (optional)
+            default: True
+            only symbols of selected transactions (level "symbol")
+        start: datetime (optional)
+            default: None
+            only the rows from start on are (re)computed (only if inplace)
+
+        Returns
+        -------
+        pd.DataFrame if inplace is False
+        
+        Raises
+        -------
+        -
+        
+        """
         if inplace == False: 
             aggregate = pd.DataFrame()
         if level == "portfolio":
-            cols = {"price":[], "close":[], "high":[], "low":[], "volume":[]}
-
-            filtered_history_columns =self.history.columns
+            registry = self._history_columns.loc[self._history_columns["kind"] == "value"]
             if symbols is not None:
-                filtered_history_columns=[col for col in self.history.columns if "_" in col and col.split("_")[0] in symbols]
-                logging.info(f"aggregate_to('portfolio') {filtered_history_columns = }")
-            for col_type in cols.keys(): 
-                cols[col_type] = [col for col in filtered_history_columns if "_"+col_type+"_" in col]
-                if col_type != "volume":
-                    if inplace == False:
-                        aggregate[f'{col_type}'] = self.history[cols[col_type]].sum(axis=1)
-                    else:
-                        self.history[f'{col_type}'] = self.history[cols[col_type]].sum(axis=1)
-                if cleanup == True and inplace == True:
-                    self.history = self.history.drop(cols[col_type], axis=1) 
+                registry = registry.loc[registry["symbol"].isin(symbols)]
+            fields = ["price", "close", "high", "low"]
+            if self.compact or self._history_cleanup:
+                # the history keeps no float64 values of all fields (or none after a cleanup), the aggregates are summed in the engine
+                engine_symbols = [symbol for symbol in self._engine.symbols if symbols is None or symbol in symbols]
+                sums = pd.DataFrame({field: self._engine.values(field, start=start if inplace == True else None, symbols=engine_symbols).sum(axis=1) for field in fields})
+            else:
+                summed = registry.loc[registry["field"].isin(fields)]
+                block = self.history.loc[start:, summed.index] if inplace == True else self.history[summed.index]
+                # grouped reduction: (days x columns) @ (columns x fields) one hot matrix of the field of each column
+                one_hot = (summed["field"].to_numpy()[:, None] == np.array(fields)[None, :]).astype(np.float64)
+                sums = pd.DataFrame(block.to_numpy(dtype=np.float64) @ one_hot, index=block.index, columns=fields)
+            if inplace == False:
+                aggregate = sums
+            elif start is None:
+                self.history[fields] = sums
+            else:
+                self.history.loc[start:, fields] = sums
+            if cleanup == True and inplace == True:
+                self.history = self.history.drop(columns=registry.index)
+                self._history_columns = self._history_columns.drop(index=registry.index)
+                self._history_cleanup = True
         elif level == "symbol":
             if selected_only == True:
                 symbol_list = list(set(self.transactions.loc[self.transactions["selected"]==True]["SYMBOL"]))
@@ -308,24 +473,23 @@ class Portfolio:
             if symbols is not None:
                 symbol_list = [sym for sym in symbol_list if sym in symbols]
             
-            for symbol in symbol_list:                
-                col_per_symbol={"price":[],"close":[], "volume":[]}
-                for col_type in col_per_symbol.keys(): 
-                    col_per_symbol[col_type] = [col for col in self.history.columns if col.startswith(symbol+"_"+col_type+"_")]
-                    if inplace == False:
-                       aggregate[f'{symbol}_{col_type}'] = self.history[col_per_symbol[col_type]].sum(axis=1)
-                    else:
-                        self.history[f'{symbol}_{col_type}'] = self.history[col_per_symbol[col_type]].sum(axis=1)
-                    if cleanup == True and inplace==True:
-                        self.history = self.history.drop(col_per_symbol[col_type], axis=1) 
+            # the per symbol columns are already built by load_history, the compact history keeps not all of them
+            if inplace == False and self.compact:
+                aggregate = pd.concat([self._engine.values(field, symbols=[symbol for symbol in self._engine.symbols if symbol in symbol_list]).add_suffix(f"_{field}") for field in ["price", "close", "volume"]], axis=1)
+            elif inplace == False:
+                registry = self._history_columns
+                registry = registry.loc[(registry["kind"] == "value") & registry["field"].isin(["price", "close", "volume"]) & registry["symbol"].isin(symbol_list)]
+                aggregate = self.history[registry.index].copy()
         elif level is not None:
             logging.error(f"No Aggregation possible. The attribute level= must be either 'symbol' or 'portfolio', not '{level}'. ")
         
         if inplace == False:
             return aggregate
         else:
+            metrics.track_frame("history", self.history)
             return
 
+    @metrics.timed()
     def add_transaction(self, transaction: pd.DataFrame):
         """
         add transation to portfolio and saves it to self.transactions
@@ -352,48 +516,706 @@ class Portfolio:
         """
 
         struct = Portfolio._set_structure(struct=transaction)
+        if "selected" not in struct.columns:
+            struct["selected"]=True
         self.transactions = pd.concat([self.transactions, struct])
-        self._load_basedata(added_item = transaction)
-        # TODO extend self.symbol_list 
-
-    def get_portfolio_tech_indicators(self, interval=20, symbols = None, inplace= True):
-        if inplace == True: indicators=self.history
-        else: indicators = pd.DataFrame()
-        indicators[f"{self._prefix_portfolio_indicator}win"]   = self.history[f'close'] - self.history[f'price']
-        indicators[f"{self._prefix_portfolio_indicator}sma"] = self.history['close'].rolling(window=interval).mean()
-        indicators[f"{self._prefix_portfolio_indicator}ema"] = self.history['close'].ewm(span=interval).mean()
-        indicators[f"{self._prefix_portfolio_indicator}std"] = self.history['close'].rolling(window=interval).std()
-        indicators[f"{self._prefix_portfolio_indicator}bb_upper"] = indicators[f"{self._prefix_portfolio_indicator}sma"] + 2 * indicators[f"{self._prefix_portfolio_indicator}std"]
-        indicators[f"{self._prefix_portfolio_indicator}bb_lower"] = indicators[f"{self._prefix_portfolio_indicator}sma"] - 2 * indicators[f"{self._prefix_portfolio_indicator}std"]
-        indicators[f"{self._prefix_portfolio_indicator}perf"] = indicators[f'{self._prefix_portfolio_indicator}win'] / self.history[f'price']
-        indicators[f"{self._prefix_portfolio_indicator}perf_sma"] = indicators[f'{self._prefix_portfolio_indicator}perf'].rolling(window=interval).mean()
-        indicators[f"{self._prefix_portfolio_indicator}perf_ema"] = indicators[f'{self._prefix_portfolio_indicator}perf'].ewm(span=interval).mean()
-        indicators[f"{self._prefix_portfolio_indicator}perf_std"] = indicators[f'{self._prefix_portfolio_indicator}perf'].rolling(window=interval).std()
-        indicators[f"{self._prefix_portfolio_indicator}perf_bb_upper"] = indicators[f"{self._prefix_portfolio_indicator}perf_sma"] + 2 * indicators[f"{self._prefix_portfolio_indicator}perf_std"]
-        indicators[f"{self._prefix_portfolio_indicator}perf_bb_lower"] = indicators[f"{self._prefix_portfolio_indicator}perf_sma"] - 2 * indicators[f"{self._prefix_portfolio_indicator}perf_std"]
-        indicators[f"{self._prefix_portfolio_indicator}rsi"] = Portfolio.calculate_rsi(self.history, interval=interval)
-        indicators[f"{self._prefix_portfolio_indicator}macd"], indicators[f"{self._prefix_portfolio_indicator}signal_line"], indicators[f"{self._prefix_portfolio_indicator}histogram"],  = Portfolio.calculate_macd(self.history)
-        # indicators[f"{self._prefix_portfolio_indicator}mfi"] = Portfolio.calculate_mfi()
+        self._load_basedata(added_item = struct)
+        self.symbol_list = list(set(self.transactions["SYMBOL"]))
+        self._patch_history(struct)
+
+    @metrics.timed()
+    def remove_transaction(self, position:int):
+        """
+        remove the transaction at (integer) position from self.transactions.
+        If self.history is loaded, only the history of the affected symbol is updated.
+
+        Parameters
+        ----------
+        position: int
+            position of the transaction in self.transactions
+                        
+        Returns
+        -------
+        -
         
-        if inplace == True:
-            self.portfolio_tech_indicators=[col[len(self._prefix_portfolio_indicator):] for col in self.history.columns if col.startswith(self._prefix_portfolio_indicator)]
-            return
+        Raises
+        -------
+        -
+        
+        """
+        removed = self.transactions.iloc[[position]]
+        self.transactions = self.transactions.iloc[[pos for pos in range(len(self.transactions)) if pos != position]]
+        self.basedata.loc[self.basedata["SYMBOL"]==removed["SYMBOL"].iloc[0], "amount"] -= removed["VOLUME"].sum()
+        self._patch_history(removed, sign=-1)
+
+    @metrics.timed()
+    def select_transactions(self, selected):
+        """
+        set the "selected" column of self.transactions.
+        If self.history is loaded from the selected transactions, only the history of the symbols 
+        of the (de)selected transactions is updated.
+
+        Parameters
+        ----------
+        selected: list or pd.Series of bool
+            one value per transaction in self.transactions
+                        
+        Returns
+        -------
+        -
+        
+        Raises
+        -------
+        -
+        
+        Examples
+        --------
+            selected = portfolio.transactions["selected"].to_numpy()
+            selected[3] = False
+            portfolio.select_transactions(selected)
+
+        """
+        selected = np.asarray(selected, dtype=bool)
+        changed = self.transactions["selected"].to_numpy(dtype=bool) != selected
+        self.transactions["selected"] = selected
+        if self._history_selected_only:
+            self._patch_history(self.transactions.loc[changed & selected], sign=1, selection=False)
+            self._patch_history(self.transactions.loc[changed & ~selected], sign=-1, selection=False)
+
+    @metrics.timed()
+    def set_target_currency(self, currency:str):
+        """
+        switch the currency the portfolio is calculated in.
+        The pairs are triangulated from the loaded FX matrix, so only a currency which was never loaded is fetched (one series).
+        If self.history is loaded, its value columns, the portfolio aggregates and the tech indicators are recomputed
+        from the loaded quotes, nothing else is downloaded.
+
+        Parameters
+        ----------
+        currency: str
+            The new target currency, e.g. "USD"
+
+        Returns
+        -------
+        -
+
+        Raises
+        -------
+        -
+
+        Examples
+        --------
+            portfolio.set_target_currency("USD")
+
+        """
+        if currency == self.target_currency: return
+        # the PRICE of the transactions stays in the currency it was entered in
+        if self.transaction_currency is None: self.transaction_currency = self.target_currency
+        self.target_currency = currency
+        self._load_exchange_rates(currencies=list(self._currencies))
+        if self.history is None or self._engine is None: return
+
+        self._engine.set_fx(self._exchange_rates, self._engine.currencies, self.target_currency, self.transaction_currency)
+        self._engine.set_transactions(self._history_transactions())
+        frame = self._history_frame()
+        # columns dropped by a cleanup are not restored
+        columns = [col for col in frame.columns if col in self.history.columns]
+        self.history[columns] = frame[columns]
+        if "close" in self.history.columns:
+            for field in ["price", "close", "high", "low"]:
+                self.history[field] = self._engine.values(field).sum(axis=1)
+        if self._indicator_interval is not None:
+            self.get_portfolio_tech_indicators(interval=self._indicator_interval, inplace=True, indicators=self._indicator_names)
+        self._update_sentiment()
+        logging.info(f"target currency switched to {currency}")
+
+    def set_memory_mode(self, compact = True):
+        """
+        switches self.history between the standard (float64, all columns) and the compact memory mode and converts a loaded history.
+        Compact keeps the per symbol close as float32 and the holdings (volume) as int32 (float32 for fractional shares), sparse if mostly zero. 
+        The intermediates (raw ticker quotes, per symbol price, high and low) are not kept in the history, they are read from the engine when needed,
+        the quotes and exchange factors of the engine are float32 (a history loaded in compact mode keeps their float32 precision when switched back).
+        The public aggregate columns (price, close, high, low) and the tech indicators are float64 in both modes.
+
+        Parameters
+        ----------
+        compact: bool
+            default: True
+            True for the compact, False for the standard memory mode
+
+        Returns
+        -------
+        -
+        
+        Raises
+        -------
+        -
+
+        Examples
+        --------
+            portfolio.set_memory_mode(compact=True)
+            portfolio.load_history(aggregate_to="portfolio")
+            print(portfolio.memory_report())
+        """
+        self.compact = compact
+        if self.history is None or self._engine is None: return
+        self._engine.set_dtype(np.float32 if compact else np.float64)
+        # the per symbol columns are rebuilt from the engine, columns dropped by a cleanup are not restored
+        symbols = list(self._history_columns["symbol"].unique())
+        history = self.history.drop(columns=[col for col in self._history_columns.index if col in self.history.columns])
+        self._history_columns = self._history_registry(symbols)
+        if self._history_cleanup: self._history_columns = self._history_columns.loc[self._history_columns["kind"] != "value"]
+        self.history = pd.concat([self._history_frame(symbols=symbols)[self._history_columns.index], history], axis=1) if len(symbols) > 0 else history
+        metrics.track_frame("history", self.history)
+
+    def memory_report(self):
+        """
+        memory use of self.history per category of columns, of the dense panels of the engine and of both together (resident)
+
+        Returns
+        -------
+        pd.DataFrame
+            index: category ("aggregates", "portfolio indicators", "symbol indicators", "symbol values", "symbol volumes", "ticker quotes", "other", "index", "history", "engine", "resident")
+            columns: columns (number of), bytes, MB. "history" is the total of the history, "engine" the panels the history is computed from, 
+            "resident" the total of both.
+        
+        Raises
+        -------
+        -
+        """
+        categories = ["aggregates", "portfolio indicators", "symbol indicators", "symbol values", "symbol volumes", "ticker quotes", "other"]
+        report = pd.DataFrame(0, index=categories + ["index", "history", "engine", "resident"], columns=["columns", "bytes"])
+        if self.history is not None:
+            usage = self.history.memory_usage(index=True, deep=False)
+            registry = self._history_columns if self._history_columns is not None else pd.DataFrame(columns=["kind", "field", "symbol"])
+            for col, size in usage.drop("Index").items():
+                if col in ["price", "close", "high", "low"]: category = "aggregates"
+                elif col.startswith(self._prefix_portfolio_indicator): category = "portfolio indicators"
+                elif col.startswith(self._prefix_symbol_indicator): category = "symbol indicators"
+                elif col in registry.index and registry.loc[col, "kind"] == "ticker": category = "ticker quotes"
+                elif col in registry.index: category = "symbol volumes" if registry.loc[col, "field"] == "volume" else "symbol values"
+                else: category = "other"
+                report.loc[category] += [1, size]
+            report.loc["index"] = [0, usage["Index"]]
+            report.loc["history"] = [len(self.history.columns), usage.sum()]
+        if self._engine is not None:
+            panels = list(self._engine.quotes.values()) + [self._engine.fx, self._engine.holdings, self._engine.invested]
+            report.loc["engine"] = [sum(panel.shape[1] for panel in panels), sum(int(panel.memory_usage(index=True).sum()) for panel in panels)]
+        report.loc["resident"] = report.loc["history"] + report.loc["engine"]
+        report["MB"] = (report["bytes"] / 2**20).round(3)
+        return report
+
+    @metrics.timed()
+    def get_forecast(self, horizon=30, symbols=None, model="auto", workers=None):
+        """
+        forecasts the close of the portfolio and the price of one share of the symbols (in the target currency) for the next days.
+        The series are fitted in parallel, the fits are cached in self.forecaster (unchanged series are not fitted again,
+        refreshed series are refitted from their previous parameters)
+
+        Parameters
+        ----------
+        horizon: int
+            default: 30
+            Number of days to forecast
+        symbols: list (optional)
+            default: None
+            forecast only these symbols (None for all, [] for the portfolio only)
+        model: str (optional)
+            default: "auto"
+            "prophet", "linear" or "auto" (see forecast.Forecaster)
+        workers: int (optional)
+            default: None
+            Number of worker processes, None for the number of CPUs, 0 to fit in this process
+
+        Returns
+        -------
+        dict
+            "portfolio" and the symbols -> pd.DataFrame indexed by the forecasted days with the columns yhat, yhat_lower and yhat_upper
+            (empty without a history)
+
+        Raises
+        -------
+        -
+        """
+        if self.history is None or self._engine is None:
+            logging.error(f"No forecast possible, load_history() first")
+            return {}
+        if self.forecaster is None: self.forecaster = Forecaster()
+        self.forecaster.horizon, self.forecaster.model, self.forecaster.workers = horizon, model, workers
+        if symbols is None: symbols = self._engine.symbols
+        symbols = [symbol for symbol in symbols if symbol in self._engine.symbols]
+        series = {"portfolio": self.history["close"]}
+        if len(symbols) > 0:
+            series.update(self.get_unit_values("close", symbols=symbols).items())
+        return self.forecaster.forecast(series)
+
+    def get_unit_values(self, field="close", symbols=None, start=None):
+        """
+        the value of one share of the symbols in the target currency, gaps (weekends, holidays) are interpolated
+
+        Parameters
+        ----------
+        field: str (optional)
+            default: "close"
+            The quote field ("close", "high" or "low")
+        symbols: list (optional)
+            default: None
+            only these symbols (None for all symbols of the history)
+        start: datetime (optional)
+            default: None
+            only the days from start on
+
+        Returns
+        -------
+        pd.DataFrame
+            indexed like self.history with a column per symbol (empty without a history)
+
+        Raises
+        -------
+        -
+        """
+        if self.history is None or self._engine is None:
+            logging.error(f"No unit values possible, load_history() first")
+            return pd.DataFrame()
+        if symbols is None: symbols = self._engine.symbols
+        symbols = [symbol for symbol in symbols if symbol in self._engine.symbols]
+        return self._engine.unit_values(field, start=start, symbols=symbols)
+
+    @metrics.timed()
+    def get_sentiment(self, model="nltk", half_life=3.0, inplace=True, fetch=False):
+        """
+        the daily sentiment of the portfolio: the sentiment of the symbols (decayed mean score of their archived headlines, see sentiment.SentimentIndex)
+        weighted with the value of their holdings. The index is kept in self.sentiment_index and only updated with the headlines archived since the last call.
+        With inplace the series are (re)placed as columns of self.history, kept up to date by refresh_history(), add_transaction() etc. and drawn by presentation.Figure
+
+        Parameters
+        ----------
+        model: str (optional)
+            default: "nltk"
+            The sentiment model (see sentiment.Sentiment.sentiment_models)
+        half_life: float (optional)
+            default: 3.0
+            Days after which the weight of a headline is halved
+        inplace: bool (optional)
+            default: True
+            if True the sentiment columns of self.history are replaced
+        fetch: bool (optional)
+            default: False
+            if True the latest headlines of the symbols are fetched into the news archive first (see sentiment.Sentiment.load_news())
+
+        Returns
+        -------
+        pd.DataFrame
+            indexed like self.history with the columns {prefix}{model} (weighted sentiment, -1 to 1, NaN without recent headlines)
+            and {prefix}{model}_coverage (share of the value of the holdings with a sentiment)
+            (empty without a history)
+
+        Raises
+        -------
+        ValueError
+            If the model is unknown or there is no news archive
+        """
+        if self.history is None or self._engine is None:
+            logging.error(f"No sentiment possible, load_history() first")
+            return pd.DataFrame()
+        from .sentiment import Sentiment, SentimentIndex
+        symbols = self._engine.symbols
+        if fetch and len(symbols) > 0: Sentiment(list(symbols)).load_news()
+        if self.sentiment_index is None or (self.sentiment_index.model, self.sentiment_index.half_life) != (model, half_life):
+            self.sentiment_index = SentimentIndex(model=model, half_life=half_life)
+        self.sentiment_index.update(end=self.history.index[-1])
+
+        scores = self.sentiment_index.panel(symbols).reindex(self.history.index).to_numpy(dtype=np.float64)
+        values = self._engine.values("close", symbols=symbols).to_numpy(dtype=np.float64)
+        held = values > 0
+        known = held & ~np.isnan(scores)
+        total, covered = np.where(held, values, 0.0).sum(axis=1), np.where(known, values, 0.0).sum(axis=1)
+        weighted = np.where(known, values * scores, 0.0).sum(axis=1)
+        column = f"{self._prefix_sentiment}{model}"
+        frame = pd.DataFrame({
+            column: np.divide(weighted, covered, out=np.full(len(covered), np.nan), where=covered > 0),
+            f"{column}_coverage": np.divide(covered, total, out=np.zeros(len(total)), where=total > 0),
+            }, index=self.history.index)
+        if inplace == False: return frame
+
+        stale = [col for col in self.history.columns if col.startswith(self._prefix_sentiment) and col not in frame.columns]
+        if len(stale) > 0: self.history = self.history.drop(columns=stale)
+        self.history[frame.columns] = frame
+        self._sentiment_args = (model, half_life)
+        metrics.track_frame("history", self.history)
+        return frame
+
+    @metrics.timed()
+    def get_portfolio_tech_indicators(self, interval=20, symbols = None, inplace= True, start = None, indicators = None):
+        """
+        computes the portfolio tech indicators (see self.indicator_registry) of close and price of the history.
+        Only the requested indicators and their inputs are computed (each once), self.history itself is only changed with inplace.
+
+        Parameters
+        ----------
+        interval: int
+            default: 20
+            The window of the indicators (days)
+        symbols: list (optional)
+            default: None
+            not used
+        inplace: bool (optional)
+            default: True
+            if True the indicators are (re)placed as columns of self.history, the columns of indicators not requested are removed
+        start: date (optional)
+            default: None
+            if given only the rows from start on are computed (see refresh_history())
+        indicators: list (optional)
+            default: None
+            the names of the indicators (see self.portfolio_tech_indicators), None for all
+
+        Returns
+        -------
+        pd.DataFrame or None
+            The indicators (prefixed columns) if not inplace
+        
+        Raises
+        -------
+        ValueError
+            If an indicator or one of its inputs is unknown
+        """
+        names = self.indicator_registry.names() if indicators is None else list(indicators)
+        self.indicator_registry.resolve(names, sources=["close", "price"])
+        if start is not None:
+            # the built in indicators of the rows from start on are computed by the streaming indicators in O(1) per row, 
+            # custom indicators from the whole history
+            streamed = [name for name in names if name in PortfolioIndicators.names and self.indicator_registry.indicators[name] == portfolio_registry.indicators[name]]
+            frame = self._stream_tech_indicators(interval, start, keep_state=inplace)[[f"{self._prefix_portfolio_indicator}{name}" for name in streamed]]
+            others = [name for name in names if name not in streamed]
+            if len(others) > 0:
+                frame = frame.join(self._compute_tech_indicators(interval, others).loc[start:])
         else:
-            return indicators
+            frame = self._compute_tech_indicators(interval, names)
+        if inplace == False: return frame
+
+        stale = [col for col in self.history.columns if col.startswith(self._prefix_portfolio_indicator) and col not in frame.columns]
+        if len(stale) > 0: self.history = self.history.drop(columns=stale)
+        if start is not None:
+            self.history.loc[start:, frame.columns] = frame
+        else:
+            self.history[frame.columns] = frame
+            # the history is recomputed, the state of the streaming indicators is primed again when needed
+            self._indicator_stream = None
+        self._indicator_interval = interval
+        self._indicator_names = None if indicators is None else names
+        metrics.track_frame("history", self.history)
+
+    def register_indicator(self, name, inputs, func):
+        """
+        adds a custom portfolio tech indicator to self.indicator_registry (see indicators.IndicatorRegistry), 
+        afterwards it can be requested in get_portfolio_tech_indicators() like the built in ones.
+
+        Parameters
+        ----------
+        name: str
+            The name of the indicator
+        inputs: list
+            The sources ("close", "price") and indicators the function gets as positional arguments
+        func: callable
+            func(*inputs, interval=interval) -> pd.Series over the days of the history
+
+        Returns
+        -------
+        -
         
+        Raises
+        -------
+        -
+
+        Examples
+        --------
+            portfolio.register_indicator("bb_width", ["bb_upper", "bb_lower", "sma"], lambda upper, lower, sma, interval: (upper - lower) / sma)
+            portfolio.get_portfolio_tech_indicators(interval=20, indicators=["sma", "bb_width"])
+        """
+        self.indicator_registry.register(name, inputs, func)
+        self.portfolio_tech_indicators = self.indicator_registry.names()
+        
+    @metrics.timed()
     def get_symbol_tech_indicators(self, symbol, interval=14, inplace = True):
         if inplace == True:
-            self.history[f"{self._prefix_symbol_indicator}{symbol}_mfi"] = Portfolio.calculate_mfi(self.history[f"{self._prefix_ticker}{symbol}_high"], self.history[f"{self._prefix_ticker}{symbol}_low"], self.history[f"{self._prefix_ticker}{symbol}_close"], self.history[f"{self._prefix_ticker}{symbol}_volume"], interval=interval)
+            self.history[f"{self._prefix_symbol_indicator}{symbol}_mfi"] = Portfolio.calculate_mfi(*[self._ticker_quote(symbol, field) for field in ["high", "low", "close", "volume"]], interval=interval)
             self.symbol_tech_indicators=[col[len(self._prefix_symbol_indicator):] for col in self.history.columns if col.startswith(self._prefix_symbol_indicator)]
             return
         else:
             indicators= pd.DataFrame()
-            indicators[f"{self._prefix_symbol_indicator}{symbol}_mfi"] = Portfolio.calculate_mfi(self.history[f"{self._prefix_ticker}{symbol}_high"], self.history[f"{self._prefix_ticker}{symbol}_low"], self.history[f"{self._prefix_ticker}{symbol}_close"], self.history[f"{self._prefix_ticker}{symbol}_volume"], interval=interval)
+            indicators[f"{self._prefix_symbol_indicator}{symbol}_mfi"] = Portfolio.calculate_mfi(*[self._ticker_quote(symbol, field) for field in ["high", "low", "close", "volume"]], interval=interval)
             return indicators
 
+    @metrics.timed()
+    def get_all_symbols_tech_indicators(self, interval=14, symbols = None, indicators = None, latest = False):
+        """
+        computes technical indicators (see indicators.symbol_indicators: sma, ema, std, Bollinger bands, rsi, macd and mfi) 
+        of all symbols in one vectorized pass over the (days x symbols) quotes of the loaded history.
+        The quotes are in the currency of the symbol, gaps (weekends, holidays) are interpolated (like the values of the history) and have no volume.
+
+        Parameters
+        ----------
+        interval: int
+            default: 14
+            The window of the indicators (days)
+        symbols: list (optional)
+            default: None
+            only these symbols, None for all symbols of the history
+        indicators: list (optional)
+            default: None
+            only these indicators, None for all
+        latest: bool (optional)
+            default: False
+            if True only the indicators of the last day are returned as (symbols x indicators) frame, e.g. for screening
+
+        Returns
+        -------
+        pd.DataFrame
+            (days x (symbol, indicator)), i.e. result["MSFT"] are the indicators of MSFT, or (symbols x indicators) if latest
+        
+        Raises
+        -------
+        -
+
+        Examples
+        --------
+            portfolio.load_history()
+            screen = portfolio.get_all_symbols_tech_indicators(interval=14, latest=True)
+            oversold = screen.loc[screen["rsi"] < 0.3]
+
+        """
+        if self._engine is None:
+            logging.error(f"No technical indicators possible, load_history() first")
+            return None
+        if symbols is None: symbols = self._engine.symbols
+        quotes = {field: self._engine.quotes[field][symbols].astype(np.float64).interpolate() for field in ["close", "high", "low"]}
+        quotes["volume"] = self._engine.quotes["volume"][symbols].astype(np.float64).fillna(0.0)
+        if latest:
+            # the last day only needs the lookback rows of the rolling and ewm windows
+            quotes = {field: quote.iloc[-Portfolio._indicator_lookback(interval):] for field, quote in quotes.items()}
+        result = batch_indicators(quotes, interval=interval, indicators=indicators)
+        if latest:
+            return result.iloc[-1].unstack("indicator").reindex(index=symbols, columns=result.columns.get_level_values("indicator").unique())
+        return result
+
+    def precompute_indicator_windows(self, windows = range(1, 366)):
+        """
+        precomputes sma, std and Bollinger bands of close and perf for all windows at once (e.g. the range of the interval slider), 
+        afterwards get_portfolio_tech_indicators() looks them up instead of computing them. 
+        Without precomputation every interval is computed once from the prefix sums and kept.
+
+        Parameters
+        ----------
+        windows: iterable of int
+            default: range(1, 366)
+            The intervals
+
+        Returns
+        -------
+        -
+        
+        Raises
+        -------
+        -
+        """
+        for stats in self._rolling_stats().values(): stats.grid(windows)
+
+    def get_indicator_state(self):
+        """
+        The state of the streaming portfolio tech indicators (see streaming.PortfolioIndicators) as JSON serializable dict, 
+        None if there is none. It can be saved with the portfolio and resumed with set_indicator_state().
+        """
+        return self._indicator_stream.state() if self._indicator_stream is not None else None
+
+    def set_indicator_state(self, state):
+        """
+        Resume the streaming portfolio tech indicators from get_indicator_state(), 
+        the next refresh_history() only computes the new days from this state.
+        """
+        self._indicator_stream = StreamingIndicator.from_state(state) if state is not None else None
+        if self._indicator_stream is not None: self._indicator_interval = self._indicator_stream.interval
+
 # ----------------------------
 # PRIVATE methods
 # ----------------------------
+    def _rolling_stats(self):
+        """
+            The prefix sums (indicators.RollingStats) of close and perf of self.history, kept as long as close and price do not change
+        """
+        close, price = self.history["close"], self.history["price"]
+        key = (self.history.index[0], len(self.history), hash(close.to_numpy().tobytes()), hash(price.to_numpy().tobytes()))
+        if self._indicator_stats is None or self._indicator_stats[0] != key:
+            self._indicator_stats = (key, {"close": RollingStats(close), "perf": RollingStats((close - price) / price)})
+        return self._indicator_stats[1]
+
+    @metrics.timed()
+    def _compute_tech_indicators(self, interval, names):
+        """
+            The portfolio tech indicators names of the whole history, the prefix sums of close and perf are taken from the cache (see _rolling_stats())
+        """
+        data = self.history
+        sources = {"close": data["close"], "price": data["price"]}
+        stats = self._rolling_stats()
+        sources["close_stats"], sources["perf_stats"] = stats["close"], stats["perf"]
+        values = self.indicator_registry.compute(sources, names, interval=interval)
+        return pd.DataFrame(values, index=data.index, columns=names).add_prefix(self._prefix_portfolio_indicator)
+
+    @metrics.timed()
+    def _stream_tech_indicators(self, interval, start, keep_state = True):
+        """
+            The portfolio tech indicators of the rows from start on, computed by the streaming indicators in O(1) per row.
+            The stream is primed (once, vectorized) from the rows before start if its state does not end the day before start.
+            With keep_state the stream is kept up to the last complete row, the open rows at the end (see HistoryEngine.first_open_day()) 
+            may change with the next refresh, so they are computed on a copy.
+        """
+        stream = self._indicator_stream
+        if stream is None or stream.interval != interval or stream.end is None or stream.end + pd.Timedelta(days=1) != start:
+            before = self.history.loc[self.history.index < start]
+            stream = PortfolioIndicators(interval).prime(before["close"], before["price"], end=before.index[-1] if len(before) > 0 else None)
+        rows = self.history.loc[start:, ["close", "price"]]
+        open_day = self._engine.first_open_day() if self._engine is not None else rows.index[-1] + pd.Timedelta(days=1)
+        complete = rows.loc[rows.index < open_day]
+        values = [stream.update(close, price, day) for day, close, price in zip(complete.index, complete["close"].to_numpy(), complete["price"].to_numpy())]
+        if keep_state: self._indicator_stream = stream
+        stream = stream.copy()
+        rows = rows.loc[rows.index >= open_day]
+        values += [stream.update(close, price, day) for day, close, price in zip(rows.index, rows["close"].to_numpy(), rows["price"].to_numpy())]
+        return pd.DataFrame(values, index=complete.index.append(rows.index)).add_prefix(self._prefix_portfolio_indicator)
+
+    def _update_sentiment(self):
+        """
+            Recomputes the sentiment columns of self.history (see get_sentiment()) after a change of the history, a failure keeps the history usable
+        """
+        if self._sentiment_args is None: return
+        try:
+            self.get_sentiment(*self._sentiment_args)
+        except Exception as e:
+            logging.error(f"sentiment of the history not updated: {e}")
+
+    def _history_transactions(self):
+        """
+            The transactions the history is computed from (see symbols and selected_only in load_history())
+        """
+        transactions = self.transactions.loc[self.transactions["selected"] == True] if self._history_selected_only else self.transactions
+        # filter only for symbols list
+        if self._history_symbols is not None: transactions = transactions.loc[transactions["SYMBOL"].isin(self._history_symbols)]
+        return transactions
+
+    @metrics.timed()
+    def _fetch_history(self, transactions):
+        """
+            Fetches the ticker histories needed for transactions: one request per symbol from its earliest trade to self._history_end,
+            the requests run concurrently on the fetch scheduler. Returns the dicts symbol -> ticker history and symbol -> currency.
+        """
+        plan = Portfolio._plan_history_requests(transactions)
+        if len(plan) == 0: return {}, {}
+        downloaded = _get_history_tickers(tuple(plan.index), tuple(plan), self._history_end)
+        ticker_dfs, currencies = {}, {}
+        infos = _download_infos(list(plan.index))
+        for (symbol, first_date), info in zip(plan.items(), infos):
+            ticker_df = HistoryEngine._naive(downloaded[symbol])
+            ticker_dfs[symbol] = ticker_df.loc[ticker_df.index >= first_date]
+            currencies[symbol] = info.get("currency")
+            self._quote_starts[symbol] = first_date
+        return ticker_dfs, currencies
+
+    def _move_quote_starts(self, symbols):
+        """
+            The quotes of a symbol start with its first booked transaction (like in load_history()). The quotes of the symbols 
+            whose first booked transaction has moved (an earlier trade, the first one removed or deselected) are fetched again from it.
+            Returns the first changed day or None
+        """
+        transactions = self._history_transactions()
+        first = Portfolio._plan_history_requests(transactions.loc[transactions["SYMBOL"].isin(symbols)])
+        old = {symbol: self._quote_starts.get(symbol) for symbol, first_date in first.items() if first_date != self._quote_starts.get(symbol)}
+        if len(old) == 0: return None
+        ticker_dfs, _ = self._fetch_history(transactions.loc[transactions["SYMBOL"].isin(list(old))])
+        for symbol, ticker_df in ticker_dfs.items():
+            self._engine.replace_quotes(symbol, ticker_df)
+        return min([first[symbol] for symbol in old] + [start for start in old.values() if start is not None])
+
+    @metrics.timed()
+    def _history_frame(self, start = None, symbols = None):
+        """
+            Builds the history columns (ticker quotes and per symbol values) from self._engine, from start on and for symbols if given
+        """
+        if symbols is None: symbols = self._engine.symbols
+        if self.compact:
+            # only the per symbol close (float32) and holdings (integer or sparse), quotes, price, high and low stay in the engine
+            close = self._engine.values("close", start=start, symbols=symbols).astype(np.float32).add_suffix("_close")
+            holdings = self._engine.values("volume", start=start, symbols=symbols)
+            return pd.concat([close, pd.DataFrame({f"{symbol}_volume": Portfolio._compact_volume(holdings[symbol]) for symbol in symbols}, index=holdings.index)], axis=1)
+        return pd.concat(
+            [self._engine.quotes[field].loc[start:, symbols].add_prefix(self._prefix_ticker).add_suffix(f"_{field}") for field in HistoryEngine.quote_fields] + 
+            [self._engine.values(field, start=start, symbols=symbols).add_suffix(f"_{field}") for field in HistoryEngine.value_fields], 
+            axis=1)
+
+    def _ticker_quote(self, symbol, field):
+        """
+            The raw quotes of field of symbol (currency of the symbol) as history column, from the engine if the history keeps no ticker columns (compact)
+        """
+        column = f"{self._prefix_ticker}{symbol}_{field}"
+        if column in self.history.columns: return self.history[column]
+        return self._engine.quotes[field][symbol].reindex(self.history.index).rename(column)
+
+    def _history_registry(self, symbols):
+        """
+            The registry entries (column -> kind, field, symbol) of the history columns built by _history_frame() for symbols
+        """
+        if self.compact:
+            rows = [(f"{symbol}_{field}", "value", field, symbol) for field in Portfolio._compact_fields for symbol in symbols]
+        else:
+            rows = [(f"{self._prefix_ticker}{symbol}_{field}", "ticker", field, symbol) for field in HistoryEngine.quote_fields for symbol in symbols]
+            rows += [(f"{symbol}_{field}", "value", field, symbol) for field in HistoryEngine.value_fields for symbol in symbols]
+        return pd.DataFrame(rows, columns=["column", "kind", "field", "symbol"]).set_index("column")
+
+    @metrics.timed()
+    def _patch_history(self, transactions, sign = 1, selection = True):
+        """
+            Books (sign=1) or cancels (sign=-1) transactions on an already loaded self.history.
+            Only the columns of the affected symbols from the first transaction date on are recomputed, 
+            followed by the portfolio aggregates and the tail of the tech indicators.
+            With selection=False the "selected" column of the transactions is ignored.
+        """
+        if self.history is None or self._engine is None: return
+        if selection and self._history_selected_only: transactions = transactions.loc[transactions["selected"] == True]
+        if self._history_symbols is not None: transactions = transactions.loc[transactions["SYMBOL"].isin(self._history_symbols)]
+        if len(transactions) == 0: return
+
+        new_symbols = [symbol for symbol in transactions["SYMBOL"].unique() if symbol not in self._engine.symbols]
+        ticker_dfs, currencies = self._fetch_history(transactions.loc[transactions["SYMBOL"].isin(new_symbols)])
+        for symbol in new_symbols:
+            self._engine.add_symbol(symbol, ticker_dfs[symbol], currencies[symbol], self._exchange_rates)
+
+        start = self._engine.apply_transactions(transactions, sign=sign)
+        if start is None: return
+
+        symbols = [symbol for symbol in transactions["SYMBOL"].unique() if symbol not in new_symbols]
+        moved = self._move_quote_starts(symbols)
+        if moved is not None: start = min(start, moved)
+        # columns dropped by a cleanup are not restored
+        if len(symbols) > 0 and self.compact:
+            # the dtype of the sparse holdings may change, the columns are replaced
+            patch = self._history_frame(symbols=symbols)
+            columns = [col for col in patch.columns if col in self.history.columns]
+            self.history[columns] = patch[columns]
+        elif len(symbols) > 0:
+            patch = self._history_frame(start=start, symbols=symbols)
+            columns = [col for col in patch.columns if col in self.history.columns]
+            self.history.loc[start:, columns] = patch[columns]
+        if len(new_symbols) > 0:
+            registry = self._history_registry(new_symbols)
+            if self._history_cleanup: registry = registry.loc[registry["kind"] != "value"]
+            self.history = pd.concat([self.history, self._history_frame(symbols=new_symbols)[registry.index]], axis=1)
+            self._history_columns = pd.concat([self._history_columns, registry])
+
+        if "close" in self.history.columns:
+            self.aggregate_to(level="portfolio", symbols=self._history_symbols, inplace=True, selected_only=self._history_selected_only, start=start)
+        if self._indicator_interval is not None:
+            self.get_portfolio_tech_indicators(interval=self._indicator_interval, inplace=True, start=start, indicators=self._indicator_names)
+        self._update_sentiment()
+        logging.info(f"history of {list(transactions['SYMBOL'].unique())} patched from {start.date()} on")
+
     def _load_currencies(self):
         try:
             if isinstance(self.basedata, pd.DataFrame) and "currency" in  self.basedata.columns:
@@ -403,23 +1225,26 @@ class Portfolio:
             logging.error(f"Error: _currencies not found: {e}")
             return []
 
+    @metrics.timed()
     def _load_basedata(self, added_item = None):
         """
             Fill self.basedata including currency info and exchange rates
         """
         if added_item is None:
-            self.basedata = pd.DataFrame({"SYMBOL":list(set(list(self.transactions["SYMBOL"])))})
+            amounts = self.transactions.groupby("SYMBOL", observed=True)["VOLUME"].sum()
+            self.basedata = pd.DataFrame({"SYMBOL":list(amounts.index)})
             infos = []
-            for _, row in self.basedata.iterrows():
-                ticker_info= _get_ticker_info(row["SYMBOL"])
+            # the ticker infos are fetched concurrently
+            ticker_infos = _download_infos(list(self.basedata["SYMBOL"]))
+            for (_, row), ticker_info in zip(self.basedata.iterrows(), ticker_infos):
                 info = {"SYMBOL":row["SYMBOL"]}
                 for k in self.selected_info_fields:
                     info[k] = ticker_info.get(k,None)
-                info["amount"] = self.transactions.loc[self.transactions["SYMBOL"]==row["SYMBOL"]]["VOLUME"].sum(axis=0, numeric_only=True)
+                info["amount"] = amounts[row["SYMBOL"]]
                 infos.append(info)
             self.basedata = pd.DataFrame(infos)
             self._load_currencies()
-            self._load_exchange_rates(rates_symbols=[f"{curr.upper()}{self.target_currency.upper()}=X" for curr in self._currencies])
+            self._load_exchange_rates(currencies=list(self._currencies))
 
         elif isinstance(added_item, pd.DataFrame) and isinstance(self.basedata, pd.DataFrame):
             if added_item["SYMBOL"].iloc[0] not in set(self.basedata["SYMBOL"]):
@@ -427,32 +1252,34 @@ class Portfolio:
                 info = {"SYMBOL":added_item["SYMBOL"].iloc[0]}
                 for k in self.selected_info_fields:
                     info[k] = ticker_info.get(k,None)
+                info["amount"] = added_item["VOLUME"].sum()
                 added_item = pd.DataFrame([info])
-                self.basedata = pd.concat([self.basedata,added_item])
-                self.basedata.reindex()
+                self.basedata = pd.concat([self.basedata,added_item], ignore_index=True)
                 self._load_currencies()
-                self._load_exchange_rates(rates_symbols=[f"{info['currency'].upper()}{self.target_currency.upper()}=X"])                         
+                # only a new currency is fetched
+                self._load_exchange_rates(currencies=[info['currency']])
+            else:
+                self.basedata.loc[self.basedata["SYMBOL"]==added_item["SYMBOL"].iloc[0], "amount"] += added_item["VOLUME"].sum()
 
-    def _load_exchange_rates(self, rates_symbols, start = None, end = None, append = False):
+    @metrics.timed()
+    def _load_exchange_rates(self, currencies, start = None, end = None):
         """
-            Fill self._exchange_rates
-
+            Load the rates of currencies (and of the target and transaction currency) into the FX matrix self._fx 
+            and derive self._exchange_rates (columns like "USDEUR=X") for the target currency
         """
         if start is None: start = self.start_date
         if end  is None: end = datetime.today()
-        joined_rates_symbols = ' '.join(rates_symbols)
-        _rates = _get_rates(joined_rates_symbols, start, end)
-        
-        if not append:
-            self._exchange_rates = pd.DataFrame(_rates).T
-            self._exchange_rates.columns = rates_symbols
-            self._exchange_rates[f"{self.target_currency.upper()}{self.target_currency.upper()}=X"] = 1.0
-        else:
-            df_rates=pd.DataFrame(_rates).T
-            self.df_rates.columns = rates_symbols
-            self._exchange_rates = pd.concat([self._exchange_rates, df_rates], axis=1)
+        self._fx.load(list(currencies) + [self.target_currency, self.transaction_currency], pd.Timestamp(start), Portfolio._fetch_end(end))
+        self._exchange_rates = self._fx.table(self.target_currency)
 
-        self._exchange_rates.index = self._exchange_rates.index.tz_localize(None)
+    @metrics.timed()
+    def _extend_exchange_rates(self, start, end = None):
+        """
+            Refresh the FX matrix from start to end (existing rates are overwritten by the fetched ones) and derive self._exchange_rates
+        """
+        if end  is None: end = datetime.today()
+        self._fx.extend(pd.Timestamp(start), Portfolio._fetch_end(end))
+        self._exchange_rates = self._fx.table(self.target_currency)
 
 # ----------------------------
 # TECH INDICATOR methods
@@ -473,14 +1300,14 @@ class Portfolio:
     def calculate_macd(data, interval_1=12, interval_2=26, interval_3=9, symbol=""):
         # from https://www.pyquantnews.com/free-python-resources/python-for-trading-key-technical-indicators
         # makes sense for a single symbol and a portfolio
+        # data is not changed, the intermediate emas are local
         if symbol!="": symbol+="_"
-        data['EMA1'] = data['close'].ewm(span=interval_1, adjust=False).mean()
-        data['EMA2'] = data['close'].ewm(span=interval_2, adjust=False).mean()
-        data[f'{symbol}macd'] = data['EMA1'] - data['EMA2']
-        data[f'{symbol}signal_line'] = data[f'{symbol}macd'].ewm(span=interval_3, adjust=False).mean()
-        data[f'{symbol}histogram'] = data[f'{symbol}macd'] - data[f'{symbol}signal_line']
-        data = data.drop(columns=["EMA1","EMA2"], axis=1)
-        return data[f'{symbol}macd'], data[f'{symbol}signal_line'], data[f'{symbol}histogram']
+        ema_1 = data[f'{symbol}close'].ewm(span=interval_1, adjust=False).mean()
+        ema_2 = data[f'{symbol}close'].ewm(span=interval_2, adjust=False).mean()
+        macd = (ema_1 - ema_2).rename(f'{symbol}macd')
+        signal_line = macd.ewm(span=interval_3, adjust=False).mean().rename(f'{symbol}signal_line')
+        histogram = (macd - signal_line).rename(f'{symbol}histogram')
+        return macd, signal_line, histogram
 
     @staticmethod
     def calculate_mfi(high, low, close, volume, interval = 14):
@@ -499,10 +1326,42 @@ class Portfolio:
 # ----------------------------
 # HELPER static methods
 # ----------------------------
+    @staticmethod
+    def _plan_history_requests(transactions):
+        # one request per symbol: from the earliest trade of the symbol on
+        return transactions.reset_index().groupby("SYMBOL", observed=True)["DATE"].min()
+
+    @staticmethod
+    def _fetch_end(end):
+        # the day after end (end is exclusive for yfinance), without time to keep the cache key stable during the day
+        return pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+
+    # the per symbol value columns of the compact history
+    _compact_fields = ["close", "volume"]
+
+    @staticmethod
+    def _compact_volume(holdings):
+        # int32 shares (float32 for fractional shares), sparse if the symbol is not held most of the days (e.g. bought late)
+        values = holdings.to_numpy()
+        integral = np.all(values == np.round(values)) and np.abs(values).max(initial=0) < 2**31
+        values = values.astype(np.int32 if integral else np.float32)
+        if np.count_nonzero(values) < len(values) / 2:
+            return pd.arrays.SparseArray(values, fill_value=0)
+        return values
+
+    @staticmethod
+    def _indicator_lookback(interval):
+        # the truncated weight of an ewm over 10 spans is below 1e-8, the rolling windows need one interval only
+        return 10 * max(interval, 26)
+
     @staticmethod
     def _set_structure(struct):
-        struct["DATE"]= pd.to_datetime(struct['DATE'], format="%d.%m.%Y")
-        struct = struct.sort_values("DATE", ascending=True)
+        # typed frames (see read_transactions()) are neither parsed nor sorted again
+        if not pd.api.types.is_datetime64_any_dtype(struct["DATE"]):
+            struct["DATE"]= pd.to_datetime(struct['DATE'], format="%d.%m.%Y")
         struct = struct.set_index("DATE")
-        struct.index = struct.index.tz_localize(None)
+        if not struct.index.is_monotonic_increasing:
+            struct = struct.sort_index(kind="stable")
+        if struct.index.tz is not None:
+            struct.index = struct.index.tz_localize(None)
         return struct
@@ -3,11 +3,6 @@ import functools
 import tempfile
 import base64
 
-from dotenv import load_dotenv
-from openai import OpenAI
-import ollama
-import os
-
 from portfolio import logging
 
 class AI():
@@ -28,6 +23,7 @@ class AI():
 
     def _ping_Llama(self):
         try:
+            import ollama
             messages = [{'role': 'user', 'content': "what is the color of a rose?"}]
             response = ollama.chat(model='llama3.2', messages=messages)
             return response["message"]["content"]
@@ -37,6 +33,7 @@ class AI():
 
     def _ask_Ollama(self, prompt:str,image_data, type):
         try:
+            import ollama
             model ="llava" if type=="llava" else 'llama3.2-vision'
             messages = [{'role': 'user', 'content': prompt, 'images': [image_data]}]
             response = ollama.chat(model=model, messages=messages)
@@ -47,6 +44,8 @@ class AI():
 
     def _ask_ChatGPT(self, prompt:str,image_data):
         try:
+            from dotenv import load_dotenv
+            from openai import OpenAI
             load_dotenv()
             OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
             client = OpenAI(api_key=OPENAI_API_KEY)
@@ -0,0 +1,208 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from . import Portfolio
+from .ticker import _get_history_tickers, _download_infos
+from .history import HistoryEngine
+from .fx import FXMatrix
+from .ingest import read_transactions, report_rejected
+from . import metrics
+
+# --------------------------------------------------------
+# batch valuation of many portfolios against one shared price/FX panel
+# -------------------------------
+class PortfolioBatch():
+    """
+    Values many transaction books (e.g. the portfolios of all clients) at once. The union of their symbols is fetched,
+    aligned and converted into the target currency only once, as one (fields x days x symbols) panel of unit values.
+    The books are valued against this panel in a process pool, the workers read the panel from shared memory.
+    Fetching and aligning scale with the unique symbols, the valuation of a book with its trades and held symbols.
+
+    The results are the portfolio aggregates of Portfolio.load_history(aggregate_to="portfolio") for every book.
+
+    Attributes
+    ----------
+        self.books                  : dict name -> DATE indexed transactions of the book
+        self.rejected_transactions  : dict name -> rejected rows of the books read from files (see ingest.read_transactions())
+        self.target_currency        : The currency all books are calculated in. Defaults to "EUR"
+        self.transaction_currency   : The currency of the PRICE column of the transactions. Defaults to None, i.e. the target currency
+        self.days                   : The daily DatetimeIndex of the panel, from the first trade of all books on
+        self.symbols                : The symbols (columns) of the panel
+        self.panel                  : (fields x days x symbols) float64 value of one share in the target currency, missing values are 0
+
+    Examples
+    --------
+        batch = PortfolioBatch({"client A": "a.csv", "client B": transactions_df})
+        batch.load()
+        results = batch.run(workers=8)      # dict name -> DataFrame with the columns price, close, high, low
+    """
+
+    fields = ["close", "high", "low"]
+
+    def __init__(self, books:dict, target_currency:str = "EUR", transaction_currency:str = None):
+        self.target_currency = target_currency
+        self.transaction_currency = transaction_currency
+        self.books, self.rejected_transactions = {}, {}
+        for name, book in books.items():
+            self.books[name] = self._read_book(name, book)
+        self.days = None
+        self.symbols = []
+        self.panel = None
+        self._price_fx = None
+
+    def _read_book(self, name, book):
+        # a file (see Portfolio.from_file()) or a frame like Portfolio.load_transactions() accepts it, only the selected transactions
+        if not isinstance(book, pd.DataFrame):
+            path = book
+            book, self.rejected_transactions[name] = read_transactions(path)
+            report_rejected(self.rejected_transactions[name], source=f"{name} ({getattr(path, 'name', path)})")
+        book = Portfolio._set_structure(book.copy())
+        if "selected" in book.columns:
+            book = book.loc[book["selected"] == True]
+        return book[["SYMBOL", "VOLUME", "PRICE"]]
+
+    @metrics.timed()
+    def load(self, end = None):
+        """
+        Fetches the quotes of all symbols of all books (each symbol once, from its earliest trade on) and the exchange rates,
+        and builds the shared panel of unit values
+
+        Parameters
+        ----------
+        end: datetime (optional)
+            default: None
+            The last day of the panel, defaults to today
+
+        Returns
+        -------
+        -
+
+        Raises
+        -------
+        ValueError
+            If there are no transactions at all
+        """
+        if end is None: end = datetime.today()
+        transactions = pd.concat([book for book in self.books.values()])
+        if len(transactions) == 0:
+            raise ValueError("no transactions in any of the books")
+        fetch_end = Portfolio._fetch_end(end)
+        self.days = pd.date_range(start=transactions.index.min(), end=end, freq='D', name='Date')
+
+        plan = Portfolio._plan_history_requests(transactions)
+        # each symbol from its own first trade
+        downloaded = _get_history_tickers(tuple(plan.index), tuple(plan), fetch_end)
+        ticker_dfs = {}
+        for symbol, first_date in plan.items():
+            ticker_df = HistoryEngine._naive(downloaded[symbol])
+            ticker_dfs[symbol] = ticker_df.loc[ticker_df.index >= first_date]
+        currencies = {symbol: info.get("currency") for symbol, info in zip(plan.index, _download_infos(list(plan.index)))}
+
+        fx = FXMatrix()
+        fx.load(list(currencies.values()) + [self.target_currency, self.transaction_currency], pd.Timestamp(self.days[0]), fetch_end)
+        engine = HistoryEngine(self.days)
+        engine.set_quotes(ticker_dfs)
+        engine.set_fx(fx.table(self.target_currency), currencies, self.target_currency, self.transaction_currency)
+
+        self.symbols = engine.symbols
+        # NaN (no quote or no rate) values a holding with 0 like Portfolio.history does
+        self.panel = np.stack([np.nan_to_num(engine.unit_values(field).to_numpy(dtype=np.float64), nan=0.0) for field in PortfolioBatch.fields])
+        self._price_fx = engine.price_fx.to_numpy(dtype=np.float64)
+        metrics.gauge("batch.panel.bytes", self.panel.nbytes)
+        logging.info(f"batch panel of {len(self.books)} books: {len(self.days)} days x {len(self.symbols)} symbols")
+
+    @metrics.timed()
+    def run(self, workers:int = None, chunksize:int = None) -> dict:
+        """
+        Values all books against the panel (see load())
+
+        Parameters
+        ----------
+        workers: int (optional)
+            default: None
+            Number of worker processes, None for the number of CPUs, 0 to value the books in this process
+        chunksize: int (optional)
+            default: None
+            Number of books per task, by default about four tasks per worker
+
+        Returns
+        -------
+        dict
+            name -> DataFrame indexed by the days from the first trade of the book on, with the columns price (invested capital), close, high and low
+
+        Raises
+        -------
+        -
+
+        """
+        if self.panel is None: self.load()
+        tasks = [(name, *self._book_arrays(book)) for name, book in self.books.items()]
+        if workers is None: workers = os.cpu_count() or 1
+        if workers == 0 or len(tasks) <= 1:
+            values = _value_books(self.panel, tasks)
+        else:
+            if chunksize is None: chunksize = max(1, len(tasks) // (workers * 4))
+            chunks = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
+            shm = shared_memory.SharedMemory(create=True, size=self.panel.nbytes)
+            try:
+                np.ndarray(self.panel.shape, dtype=self.panel.dtype, buffer=shm.buf)[:] = self.panel
+                with ProcessPoolExecutor(max_workers=workers, initializer=_attach_panel, initargs=(shm.name, self.panel.shape)) as pool:
+                    values = {name: result for chunk in pool.map(_value_chunk, chunks) for name, result in chunk.items()}
+            finally:
+                shm.close()
+                shm.unlink()
+
+        results = {}
+        for name, (first, result) in values.items():
+            results[name] = pd.DataFrame(result, index=self.days[first:], columns=["price"] + PortfolioBatch.fields)
+        metrics.count("batch.books", len(results))
+        return results
+
+    def _book_arrays(self, book:pd.DataFrame):
+        # the trades as (day row, symbol column, volume, converted price), trades before the first day are booked on it, after the last day ignored
+        rows = np.searchsorted(self.days.to_numpy(), book.index.normalize().to_numpy(), side="left")
+        valid = rows < len(self.days)
+        rows = rows[valid]
+        columns = pd.Index(self.symbols).get_indexer(book["SYMBOL"].to_numpy()[valid])
+        volume = book["VOLUME"].to_numpy(dtype=np.float64)[valid]
+        price = book["PRICE"].to_numpy(dtype=np.float64)[valid] * self._price_fx[rows]
+        first = int(self.days.searchsorted(book.index.min().normalize())) if len(book) > 0 else len(self.days)
+        return first, rows, columns, volume, price
+
+# --------------------------------------------------------
+# worker side: the panel is attached once per process
+# -------------------------------
+_shared = {}
+
+def _attach_panel(name:str, shape:tuple):
+    shm = shared_memory.SharedMemory(name=name)
+    # the segment is owned (and unlinked) by the parent process
+    _shared["shm"] = shm
+    _shared["panel"] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+def _value_chunk(tasks:list) -> dict:
+    return _value_books(_shared["panel"], tasks)
+
+def _value_books(panel:np.ndarray, tasks:list) -> dict:
+    """
+    Values the books of tasks (name, first day row, trade rows, symbol columns, volumes, prices) against panel.
+    Holdings are the cumulative sums of the volume deltas of the held symbols only, the invested capital
+    is the cumulative sum of the price deltas of all trades (a single series).
+    """
+    results = {}
+    days = panel.shape[1]
+    for name, first, rows, columns, volume, price in tasks:
+        held, local = np.unique(columns, return_inverse=True)
+        holdings = np.zeros((days - first, len(held)))
+        np.add.at(holdings, (rows - first, local), volume)
+        holdings = np.cumsum(holdings, axis=0)
+        result = np.empty((days - first, 1 + panel.shape[0]))
+        result[:, 0] = np.cumsum(np.bincount(rows - first, weights=price, minlength=days - first))
+        for i in range(panel.shape[0]):
+            result[:, i + 1] = np.einsum("ij,ij->i", panel[i, first:][:, held], holdings)
+        results[name] = (first, result)
+    return results
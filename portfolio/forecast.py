@@ -0,0 +1,195 @@
+import os
+import pickle
+import hashlib
+import logging
+import urllib.parse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from . import metrics
+
+# directory of the fitted models, kept between the sessions if set (see Forecaster.cache_dir)
+default_cache_dir = os.environ.get("PORTFOLIO_FORECAST_CACHE", "") or None
+
+# --------------------------------------------------------
+# forecasting of price series: Prophet or a cheap log-linear trend, fitted in parallel
+# -------------------------------
+class Forecaster():
+    """
+    Forecasts many series (the symbols and the close of a portfolio) in a process pool.
+    A fit is cached by name, series hash, end date, horizon and model, so an unchanged series is not fitted again.
+    A changed series (e.g. the daily refresh) is refitted from the parameters of its previous fit (warm start).
+
+    Attributes
+    ----------
+        self.horizon        : Number of days to forecast
+        self.model          : "prophet", "linear" (log-linear trend of the last year) or "auto" (prophet if installed, else linear)
+        self.history_days   : Only the last days of a series are fitted, defaults to 3 years
+        self.workers        : Number of worker processes, None for the number of CPUs, 0 to fit in this process
+        self.cache_dir      : Directory the last fit of every series is stored in (pickle files), None for an in-memory cache only.
+                              Defaults to the environment variable PORTFOLIO_FORECAST_CACHE
+
+    Examples
+    --------
+        forecaster = Forecaster(horizon=30, cache_dir="forecasts")
+        forecasts = forecaster.forecast({"MSFT": msft_close, "portfolio": history["close"]})
+    """
+
+    models = ["prophet", "linear", "auto"]
+    # the last fit of a series with less points is the linear trend
+    min_points = 60
+
+    def __init__(self, horizon:int = 30, model:str = "auto", history_days:int = 3 * 365, workers:int = None, cache_dir:str = default_cache_dir):
+        if model not in Forecaster.models:
+            raise ValueError(f"unknown forecast model '{model}', allowed are {Forecaster.models}")
+        self.horizon = horizon
+        self.model = model
+        self.history_days = history_days
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self._fits = {}
+        if cache_dir is not None: os.makedirs(cache_dir, exist_ok=True)
+
+    @metrics.timed()
+    def forecast(self, series:dict) -> dict:
+        """
+        Forecasts the series, only those without a cached fit are fitted
+
+        Parameters
+        ----------
+        series: dict
+            name -> pd.Series with a daily DatetimeIndex (e.g. Portfolio.history["close"])
+
+        Returns
+        -------
+        dict
+            name -> pd.DataFrame indexed by the next self.horizon days with the columns yhat, yhat_lower and yhat_upper
+
+        Raises
+        -------
+        -
+
+        """
+        model = self.model
+        if model == "auto": model = "prophet" if _prophet_installed() else "linear"
+        results, tasks = {}, []
+        for name, values in series.items():
+            values = values.dropna().iloc[-self.history_days:]
+            if len(values) == 0:
+                logging.error(f"Forecast of {name} not possible: no values")
+                continue
+            key = (Forecaster._hash(values), values.index[-1], self.horizon, model)
+            fit = self._read_fit(name)
+            if fit is not None and fit["key"] == key:
+                metrics.count("forecast.cache.hits")
+                results[name] = fit["forecast"]
+                continue
+            metrics.count("forecast.cache.misses")
+            # warm start from the parameters of the previous fit of the same series
+            init = fit["params"] if fit is not None and fit["model"] == model else None
+            tasks.append((name, key, values, self.horizon, model, init))
+
+        workers = (os.cpu_count() or 1) if self.workers is None else self.workers
+        if workers == 0 or len(tasks) <= 1:
+            fitted = [_fit(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                fitted = list(pool.map(_fit, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+        for (name, key, *_), (forecast, params, used) in zip(tasks, fitted):
+            self._write_fit(name, {"key": key, "model": used, "params": params, "forecast": forecast})
+            metrics.count(f"forecast.fits.{used}")
+            results[name] = forecast
+        return results
+
+    def clear(self):
+        """
+        Drops all cached fits (in memory and in self.cache_dir)
+        """
+        self._fits = {}
+        if self.cache_dir is not None:
+            for file in os.listdir(self.cache_dir):
+                if file.startswith("forecast_"): os.remove(os.path.join(self.cache_dir, file))
+
+    def _read_fit(self, name):
+        if name not in self._fits and self.cache_dir is not None and os.path.exists(self._file(name)):
+            try:
+                with open(self._file(name), "rb") as fh: self._fits[name] = pickle.load(fh)
+            except Exception as e:
+                logging.error(f"Cached forecast of {name} could not be read: {e}")
+        return self._fits.get(name)
+
+    def _write_fit(self, name, fit:dict):
+        # only the last fit of a series is kept
+        self._fits[name] = fit
+        if self.cache_dir is not None:
+            with open(self._file(name), "wb") as fh: pickle.dump(fit, fh)
+
+    def _file(self, name) -> str:
+        return os.path.join(self.cache_dir, f"forecast_{urllib.parse.quote(str(name), safe='')}.pkl")
+
+    @staticmethod
+    def _hash(values:pd.Series) -> str:
+        return hashlib.sha1(pd.util.hash_pandas_object(values, index=True).to_numpy().tobytes()).hexdigest()
+
+# --------------------------------------------------------
+# worker side
+# -------------------------------
+def _prophet_installed() -> bool:
+    try:
+        import prophet
+        return True
+    except ImportError:
+        return False
+
+def _fit(task:tuple):
+    """
+    Fits one series, returns the forecast, the parameters (the warm start of the next fit) and the model used.
+    Prophet falls back to the linear trend if the series is too short or the fit fails.
+    """
+    name, key, values, horizon, model, init = task
+    if model == "prophet" and len(values) >= Forecaster.min_points:
+        try:
+            return _fit_prophet(values, horizon, init)
+        except Exception as e:
+            logging.error(f"Prophet forecast of {name} failed, using the linear trend: {e}")
+    return _fit_linear(values, horizon)
+
+def _fit_prophet(values:pd.Series, horizon:int, init:dict = None):
+    from prophet import Prophet
+    # cmdstanpy logs every fit
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    frame = pd.DataFrame({"ds": values.index, "y": values.to_numpy()})
+    def new_model():
+        # the daily series are interpolated over weekends, there is no daily or weekly pattern
+        return Prophet(daily_seasonality=False, weekly_seasonality=False, uncertainty_samples=200)
+    if init is None:
+        model = new_model().fit(frame)
+    else:
+        try:
+            model = new_model().fit(frame, init=init)
+        except Exception:
+            # the previous parameters do not fit (e.g. other number of changepoints)
+            model = new_model().fit(frame)
+    future = pd.DataFrame({"ds": pd.date_range(values.index[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")})
+    forecast = model.predict(future).set_index("ds")[["yhat", "yhat_lower", "yhat_upper"]]
+    forecast.index.name = "Date"
+    params = {name: model.params[name][0][0] for name in ["k", "m", "sigma_obs"]}
+    params.update({name: model.params[name][0] for name in ["delta", "beta"]})
+    return forecast, params, "prophet"
+
+def _fit_linear(values:pd.Series, horizon:int, window:int = 365):
+    # trend of the log values (of the levels if there are values <= 0) of the last year, the band widens like a random walk
+    values = values.iloc[-window:]
+    y = values.to_numpy(dtype=np.float64)
+    log = bool(np.all(y > 0))
+    if log: y = np.log(y)
+    x = (values.index - values.index[-1]).days.to_numpy(dtype=np.float64)
+    slope, intercept = np.polyfit(x, y, 1) if len(y) > 1 else (0.0, y[-1])
+    sigma = np.std(np.diff(y)) if len(y) > 2 else 0.0
+    steps = np.arange(1, horizon + 1, dtype=np.float64)
+    yhat = intercept + slope * steps
+    band = 1.96 * sigma * np.sqrt(steps)
+    forecast = pd.DataFrame({"yhat": yhat, "yhat_lower": yhat - band, "yhat_upper": yhat + band},
+                            index=pd.date_range(values.index[-1] + pd.Timedelta(days=1), periods=horizon, freq="D", name="Date"))
+    if log: forecast = np.exp(forecast)
+    return forecast, {"slope": slope, "intercept": intercept, "sigma": sigma}, "linear"
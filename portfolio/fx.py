@@ -0,0 +1,101 @@
+import pandas as pd
+from .ticker import _get_rates
+
+
+class FXMatrix():
+    """
+    Exchange rates of all currencies against one pivot currency, stored as one dense (days x currencies) frame.
+    Any currency pair is derived by triangulation over the pivot, so switching the target currency needs no download
+    and a new currency needs exactly one new series.
+
+    Attributes
+    ----------
+        self.pivot      : The pivot currency, defaults to "USD"
+        self.rates      : (days x currencies) value of one unit of the currency in the pivot currency, e.g. the column "EUR" is "EURUSD=X"
+        self.start      : The start date of the loaded rates
+        self.end        : The end date of the loaded rates
+    """
+
+    # quotes in minor units (e.g. London stocks in pence): currency -> (major currency, factor)
+    minor_units = {"GBp": ("GBP", 0.01), "GBX": ("GBP", 0.01), "ZAc": ("ZAR", 0.01), "ILA": ("ILS", 0.01)}
+
+    def __init__(self, pivot:str = "USD"):
+        self.pivot = pivot
+        self.rates = pd.DataFrame({pivot: pd.Series(dtype=float)}, index=pd.DatetimeIndex([], name="Date"))
+        self.start = None
+        self.end = None
+
+    def load(self, currencies:list, start, end):
+        """
+        Fetches the rates of the currencies which are not yet in the matrix (one series per currency),
+        the rates of the loaded currencies only for the part of the date range which is not yet loaded
+
+        Parameters
+        ----------
+        currencies: list
+            The currencies, e.g. ["USD", "EUR", "GBp"]
+        start: datetime
+            start date of the rates
+        end: datetime
+            end date of the rates
+        """
+        # the loaded currencies are extended if the date range grows
+        loaded = [currency for currency in self.rates.columns if currency != self.pivot]
+        if len(loaded) > 0 and start < self.start:
+            self.rates = self._fetch(loaded, start, self.start).combine_first(self.rates)
+        if len(loaded) > 0 and end > self.end:
+            self.rates = self._fetch(loaded, self.end, end).combine_first(self.rates)
+        self.start = start if self.start is None else min(self.start, start)
+        self.end = end if self.end is None else max(self.end, end)
+        missing = sorted({FXMatrix._major(currency) for currency in currencies if currency is not None} - set(self.rates.columns))
+        if len(missing) > 0:
+            self.rates = self._fetch(missing, self.start, self.end).combine_first(self.rates)
+        self.rates[self.pivot] = 1.0
+
+    def extend(self, start, end):
+        """
+        Fetches the rates of all currencies in the matrix from start to end, fetched rates replace existing ones
+        """
+        self.end = end if self.end is None else max(self.end, end)
+        currencies = [currency for currency in self.rates.columns if currency != self.pivot]
+        if len(currencies) > 0:
+            self.rates = self._fetch(currencies, start, end).combine_first(self.rates)
+        self.rates[self.pivot] = 1.0
+
+    def rate(self, from_currency:str, to_currency:str) -> pd.Series:
+        """
+        Units of to_currency for one unit of from_currency at each day, triangulated over the pivot currency.
+        Rates of the currencies are forward filled, so days on which only one of them is quoted are aligned.
+        """
+        rates = self.rates.ffill()
+        from_major, from_factor = FXMatrix._major_factor(from_currency)
+        to_major, to_factor = FXMatrix._major_factor(to_currency)
+        return (rates[from_major] * from_factor) / (rates[to_major] * to_factor)
+
+    def table(self, target_currency:str, currencies:list = None) -> pd.DataFrame:
+        """
+        The rates of currencies (default: all in the matrix incl. their minor units) into target_currency with columns like "USDEUR=X"
+        """
+        if currencies is None: 
+            currencies = list(self.rates.columns) + [minor for minor, (major, _) in FXMatrix.minor_units.items() if major in self.rates.columns]
+        table = pd.DataFrame({f"{currency}{target_currency}=X": self.rate(currency, target_currency) for currency in currencies}, index=self.rates.index)
+        table[f"{target_currency}{target_currency}=X"] = 1.0
+        return table
+
+    def _fetch(self, currencies:list, start, end) -> pd.DataFrame:
+        rates_symbols = [f"{currency}{self.pivot}=X" for currency in currencies]
+        rates = pd.DataFrame({currency: series for currency, series in zip(currencies, _get_rates(" ".join(rates_symbols), start, end))})
+        if getattr(rates.index, "tz", None) is not None:
+            rates.index = rates.index.tz_localize(None)
+        rates.index.name = "Date"
+        return rates
+
+    @staticmethod
+    def _major(currency:str) -> str:
+        return FXMatrix._major_factor(currency)[0]
+
+    @staticmethod
+    def _major_factor(currency:str):
+        if currency in FXMatrix.minor_units:
+            return FXMatrix.minor_units[currency]
+        return currency.upper(), 1.0
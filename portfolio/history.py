@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+
+
+class HistoryEngine():
+    """
+    Dense, columnar representation of the history of a portfolio.
+
+    Instead of one column per transaction the engine keeps one (days x symbols) frame per field.
+    Holdings and invested capital are the cumulative sums of the dated volume and price deltas of the
+    transactions, the valuations are a single vectorized multiplication of quotes, exchange factors and holdings.
+
+    Attributes
+    ----------
+        self.days       : The daily DatetimeIndex of the history
+        self.symbols    : The symbols (columns) of all panels
+        self.quotes     : dict field -> (days x symbols) raw quotes in the currency of the symbol ("close", "high", "low", "volume")
+        self.fx         : (days x symbols) exchange factor from the currency of the symbol into the target currency
+        self.holdings   : (days x symbols) number of shares held at each day
+        self.invested   : (days x symbols) invested capital ("price") at each day, converted at the trade date
+        self.price_fx   : (days) exchange factor from the transaction currency into the target currency
+        self.dtype      : The dtype of the quotes and the exchange factors (float32 in the compact memory mode), holdings and invested capital are float64
+    """
+
+    quote_fields = {"close": "Close", "high": "High", "low": "Low", "volume": "Volume"}
+    value_fields = ["price", "close", "high", "low", "volume"]
+
+    def __init__(self, days: pd.DatetimeIndex, dtype = np.float64):
+        self.days = days
+        self.dtype = dtype
+        self.symbols = []
+        self.quotes = {field: pd.DataFrame(index=days) for field in HistoryEngine.quote_fields}
+        self.fx = pd.DataFrame(index=days)
+        self.holdings = pd.DataFrame(index=days)
+        self.invested = pd.DataFrame(index=days)
+        self.currencies = {}
+        self.target_currency = None
+        self.transaction_currency = None
+        self.price_fx = pd.Series(1.0, index=days)
+
+    def set_quotes(self, ticker_dfs: dict):
+        """
+        Aligns the ticker histories to self.days and stores them as one panel per field
+
+        Parameters
+        ----------
+        ticker_dfs: dict
+            symbol -> pd.DataFrame as returned by yfinance (columns Close, High, Low, Volume)
+        """
+        self.symbols = list(ticker_dfs.keys())
+        for field, yf_field in HistoryEngine.quote_fields.items():
+            panel = {symbol: HistoryEngine._naive(df[yf_field]) for symbol, df in ticker_dfs.items()}
+            self.quotes[field] = pd.DataFrame(panel, index=self.days, columns=self.symbols, dtype=self.dtype)
+
+    def set_fx(self, exchange_rates: pd.DataFrame, currencies: dict, target_currency: str, transaction_currency: str = None):
+        """
+        Builds the (days x symbols) exchange factor panel
+
+        Parameters
+        ----------
+        exchange_rates: pd.DataFrame
+            The exchange rates with columns like "USDEUR=X"
+        currencies: dict
+            symbol -> currency of the symbol
+        target_currency: str
+            The currency the portfolio is calculated in
+        transaction_currency: str
+            The currency of the PRICE of the transactions, None if it is the target currency
+        """
+        self.currencies = currencies
+        self.target_currency = target_currency
+        self.transaction_currency = transaction_currency
+        self.fx = HistoryEngine._fx_panel(exchange_rates, self.days, self.symbols, currencies, target_currency).astype(self.dtype)
+        self.price_fx = self._price_fx_series(exchange_rates, self.days)
+
+    def set_transactions(self, transactions: pd.DataFrame):
+        """
+        Builds holdings and invested capital as cumulative sums of the dated transaction deltas.
+        Transactions before the first day are booked on the first day, transactions after the last day are ignored.
+
+        Parameters
+        ----------
+        transactions: pd.DataFrame
+            DATE indexed transactions with columns SYMBOL, VOLUME and PRICE
+        """
+        deltas = self._deltas(transactions, self.days)
+        self.holdings = HistoryEngine._cumulate(deltas["VOLUME"], self.days, self.symbols)
+        self.invested = HistoryEngine._cumulate(deltas["PRICE"], self.days, self.symbols)
+
+    def extend(self, days: pd.DatetimeIndex, ticker_dfs: dict, exchange_rates: pd.DataFrame, transactions: pd.DataFrame):
+        """
+        Extends all panels to the new days. Only the tail is touched: the fetched ticker data overrides
+        existing quotes, holdings and invested capital are continued from the last known row.
+
+        Parameters
+        ----------
+        days: pd.DatetimeIndex
+            The new daily index, it has to start with self.days
+        ticker_dfs: dict
+            symbol -> pd.DataFrame with the (tail of the) ticker history
+        exchange_rates: pd.DataFrame
+            The exchange rates with columns like "USDEUR=X", at least covering the tail
+        transactions: pd.DataFrame
+            DATE indexed transactions with columns SYMBOL, VOLUME and PRICE
+
+        Returns
+        -------
+        pd.Timestamp
+            The first day whose values have changed and need to be recomputed (see values(start=))
+        """
+        first_changed = self.first_open_day()
+        old_days = self.days
+        new_days = days[len(old_days):]
+        self.days = days
+        for field, yf_field in HistoryEngine.quote_fields.items():
+            tail = pd.DataFrame({symbol: HistoryEngine._naive(df[yf_field]) for symbol, df in ticker_dfs.items()}, index=days[days >= first_changed], columns=self.symbols, dtype=np.float64)
+            self.quotes[field] = tail.combine_first(self.quotes[field].reindex(days))[self.symbols].astype(self.dtype)
+        fx_tail = HistoryEngine._fx_panel(exchange_rates, days[days >= first_changed], self.symbols, self.currencies, self.target_currency)
+        self.fx = fx_tail.combine_first(self.fx.reindex(days))[self.symbols].astype(self.dtype)
+        self.price_fx = self._price_fx_series(exchange_rates, days)
+
+        deltas = self._deltas(transactions.loc[transactions.index > old_days[-1]], new_days) if len(new_days) > 0 else None
+        for panel in ["holdings", "invested"]:
+            initial = getattr(self, panel).iloc[-1] if len(old_days) > 0 else 0.0
+            tail = HistoryEngine._cumulate(deltas["VOLUME" if panel == "holdings" else "PRICE"], new_days, self.symbols, initial=initial) if deltas is not None else None
+            setattr(self, panel, pd.concat([getattr(self, panel), tail]) if tail is not None else getattr(self, panel))
+        return first_changed
+
+    def add_symbol(self, symbol: str, ticker_df: pd.DataFrame, currency: str, exchange_rates: pd.DataFrame):
+        """
+        Adds the panel columns of a new symbol (without any holdings)
+
+        Parameters
+        ----------
+        symbol: str
+            The new symbol
+        ticker_df: pd.DataFrame
+            The ticker history as returned by yfinance
+        currency: str
+            The currency of the symbol
+        exchange_rates: pd.DataFrame
+            The exchange rates with columns like "USDEUR=X"
+        """
+        self.symbols.append(symbol)
+        self.replace_quotes(symbol, ticker_df)
+        self.currencies[symbol] = currency
+        self.fx[symbol] = HistoryEngine._fx_panel(exchange_rates, self.days, [symbol], self.currencies, self.target_currency)[symbol].astype(self.dtype)
+        self.holdings[symbol] = 0.0
+        self.invested[symbol] = 0.0
+
+    def replace_quotes(self, symbol: str, ticker_df: pd.DataFrame):
+        """
+        Replaces the quotes of symbol by ticker_df (e.g. fetched from another first day), days without a bar are NaN
+        """
+        for field, yf_field in HistoryEngine.quote_fields.items():
+            self.quotes[field][symbol] = HistoryEngine._naive(ticker_df[yf_field]).reindex(self.days).astype(self.dtype)
+
+    def set_dtype(self, dtype):
+        """
+        Converts the quotes and the exchange factors to dtype (e.g. np.float32 to halve their memory)
+        """
+        self.dtype = dtype
+        self.quotes = {field: quotes.astype(dtype) for field, quotes in self.quotes.items()}
+        self.fx = self.fx.astype(dtype)
+
+    def apply_transactions(self, transactions: pd.DataFrame, sign: int = 1):
+        """
+        Books (sign=1) or cancels (sign=-1) transactions on holdings and invested capital.
+        Only the columns of the affected symbols from the first transaction date on are touched.
+
+        Parameters
+        ----------
+        transactions: pd.DataFrame
+            DATE indexed transactions with columns SYMBOL, VOLUME and PRICE, the symbols have to be known (see add_symbol())
+        sign: int
+            1 to book, -1 to cancel the transactions
+
+        Returns
+        -------
+        pd.Timestamp or None
+            The first changed day or None if no day is affected
+        """
+        deltas = self._deltas(transactions, self.days)
+        if len(deltas) == 0:
+            return None
+        start = deltas.index.get_level_values("DATE").min()
+        days = self.days[self.days >= start]
+        symbols = list(deltas.index.get_level_values("SYMBOL").unique())
+        self.holdings.loc[start:, symbols] += sign * HistoryEngine._cumulate(deltas["VOLUME"], days, symbols)
+        self.invested.loc[start:, symbols] += sign * HistoryEngine._cumulate(deltas["PRICE"], days, symbols)
+        return start
+
+    def first_open_day(self) -> pd.Timestamp:
+        """
+        The first day after the last complete row of quotes, i.e. the first day which may change when new quotes arrive
+        """
+        last_valid = (self.quotes["close"] * self.fx).apply(lambda col: col.last_valid_index()).dropna()
+        if len(last_valid) == 0:
+            return self.days[0]
+        return min(last_valid.min() + pd.Timedelta(days=1), self.days[-1])
+
+    def unit_values(self, field: str, start = None, symbols: list = None) -> pd.DataFrame:
+        """
+        (days x symbols) value of one share in the target currency, gaps (weekends, holidays) are interpolated.
+        If start is given only the rows from start on are computed (exactly, i.e. as part of the full interpolation).
+        If symbols is given only these columns are computed.
+        """
+        if symbols is None: symbols = self.symbols
+        product = self.quotes[field][symbols] * self.fx[symbols]
+        if start is None:
+            return product.interpolate()
+        # interpolation needs the last valid value before start for every symbol
+        anchors = product.loc[:start].apply(lambda col: col.last_valid_index()).dropna()
+        anchor = anchors.min() if len(anchors) > 0 else start
+        return product.loc[anchor:].interpolate().loc[start:]
+
+    def values(self, field: str, start = None, symbols: list = None) -> pd.DataFrame:
+        """
+        (days x symbols) value of the holdings in the target currency.
+        Field "price" is the invested capital, field "volume" the number of shares held.
+        If start is given only the rows from start on are returned, if symbols is given only these columns.
+        """
+        if symbols is None: symbols = self.symbols
+        if field == "price":
+            return self.invested.loc[start:, symbols]
+        if field == "volume":
+            return self.holdings.loc[start:, symbols]
+        return (self.unit_values(field, start=start, symbols=symbols) * self.holdings.loc[start:, symbols]).fillna(0.0)
+
+    def _deltas(self, transactions: pd.DataFrame, days: pd.DatetimeIndex) -> pd.DataFrame:
+        # volume and price (converted at the trade date) deltas per day and symbol
+        dates = transactions.index.where(transactions.index >= days[0], days[0]).normalize()
+        price = transactions["PRICE"].to_numpy() * self.price_fx.reindex(dates).to_numpy()
+        deltas = pd.DataFrame({"DATE": dates, "SYMBOL": transactions["SYMBOL"].to_numpy(), "VOLUME": transactions["VOLUME"].to_numpy(), "PRICE": price})
+        deltas = deltas.loc[deltas["DATE"] <= days[-1]]
+        return deltas.groupby(["DATE", "SYMBOL"])[["VOLUME", "PRICE"]].sum()
+
+    def _price_fx_series(self, exchange_rates: pd.DataFrame, days: pd.DatetimeIndex) -> pd.Series:
+        if self.transaction_currency is None or self.transaction_currency == self.target_currency:
+            return pd.Series(1.0, index=days)
+        rates = exchange_rates[f"{self.transaction_currency}{self.target_currency}=X"]
+        return rates.reindex(rates.index.union(days)).ffill().bfill().reindex(days)
+
+    @staticmethod
+    def _cumulate(deltas: pd.Series, days: pd.DatetimeIndex, symbols: list, initial = 0.0) -> pd.DataFrame:
+        panel = deltas.unstack("SYMBOL").reindex(index=days, columns=symbols).fillna(0.0)
+        return panel.cumsum() + initial
+
+    @staticmethod
+    def _fx_panel(exchange_rates: pd.DataFrame, days: pd.DatetimeIndex, symbols: list, currencies: dict, target_currency: str) -> pd.DataFrame:
+        rates = exchange_rates.reindex(days)
+        # a symbol without currency (no ticker info) or rate has no value
+        fx = {symbol: rates.get(f"{currencies.get(symbol)}{target_currency}=X", np.nan) for symbol in symbols}
+        return pd.DataFrame(fx, index=days, columns=symbols, dtype=np.float64)
+
+    @staticmethod
+    def _naive(data):
+        # Series or DataFrame with a timezone free index
+        if getattr(data.index, "tz", None) is not None:
+            data = data.copy()
+            data.index = data.index.tz_localize(None)
+        return data
@@ -0,0 +1,321 @@
+import numpy as np
+import pandas as pd
+
+# --------------------------------------------------------
+# batched technical indicators
+# every function works on (days x symbols) frames (and on series), so all symbols are computed in one vectorized pass
+# -------------------------------
+
+def sma(close:pd.DataFrame, interval:int) -> pd.DataFrame:
+    return close.rolling(window=interval).mean()
+
+
+def ema(close:pd.DataFrame, interval:int) -> pd.DataFrame:
+    return close.ewm(span=interval).mean()
+
+
+def std(close:pd.DataFrame, interval:int) -> pd.DataFrame:
+    return close.rolling(window=interval).std()
+
+
+def bollinger(close:pd.DataFrame, interval:int, width:float = 2):
+    """
+    upper and lower Bollinger band: sma +/- width * std
+    """
+    mean, deviation = sma(close, interval), std(close, interval)
+    return mean + width * deviation, mean - width * deviation
+
+
+def rsi(close:pd.DataFrame, interval:int) -> pd.DataFrame:
+    """
+    relative strength index (0..1) of the mean gain and loss over interval, see Portfolio.calculate_rsi()
+    """
+    delta = close.diff(1).to_numpy()
+    gain = _frame(np.where(delta > 0, delta, 0), close).rolling(window=interval).mean()
+    loss = _frame(np.where(delta < 0, -delta, 0), close).rolling(window=interval).mean()
+    return 1 - 1 / (1 + gain / loss)
+
+
+def macd(close:pd.DataFrame, interval_1:int = 12, interval_2:int = 26, interval_3:int = 9):
+    """
+    macd line, signal line and histogram, see Portfolio.calculate_macd()
+    """
+    line = close.ewm(span=interval_1, adjust=False).mean() - close.ewm(span=interval_2, adjust=False).mean()
+    signal_line = line.ewm(span=interval_3, adjust=False).mean()
+    return line, signal_line, line - signal_line
+
+
+def mfi(high:pd.DataFrame, low:pd.DataFrame, close:pd.DataFrame, volume:pd.DataFrame, interval:int = 14) -> pd.DataFrame:
+    """
+    money flow index (0..1) over interval, see Portfolio.calculate_mfi()
+    """
+    typical_price = ((high + low + close) / 3).to_numpy()
+    previous = np.vstack([np.full((1, typical_price.shape[1]), np.nan), typical_price[:-1]])
+    signed_mf = typical_price * volume.to_numpy(dtype=np.float64) * np.where(typical_price > previous, 1, -1)
+    mf_avg_gain = _frame(np.where(signed_mf > 0, signed_mf, 0), close).rolling(interval, min_periods=1).sum()
+    mf_avg_loss = _frame(np.where(signed_mf < 0, -signed_mf, 0), close).rolling(interval, min_periods=1).sum()
+    return 1 - 1 / (1 + mf_avg_gain / mf_avg_loss)
+
+
+def batch_indicators(quotes:dict, interval:int = 14, indicators:list = None) -> pd.DataFrame:
+    """
+    Technical indicators of all symbols at once
+
+    Parameters
+    ----------
+    quotes: dict
+        field -> (days x symbols) quotes, the fields "close", "high", "low", "volume" (high, low and volume only for "mfi")
+    interval: int
+        default: 14
+        The window of sma, ema, std, Bollinger bands, rsi and mfi
+    indicators: list (optional)
+        default: None
+        The indicators to compute (see symbol_indicators), None for all
+
+    Returns
+    -------
+    pd.DataFrame
+        (days x (symbol, indicator)) with symbol as first column level, i.e. result["MSFT"] are the indicators of MSFT
+    """
+    if indicators is None: indicators = symbol_indicators
+    close = quotes["close"]
+    # the shared intermediates are computed once, see symbol_registry
+    results = symbol_registry.compute(quotes, indicators, interval=interval)
+
+    # (days x symbols x indicators) block, one frame without any column wise inserts
+    block = np.stack([results[indicator].to_numpy() for indicator in indicators], axis=2).reshape(len(close), -1)
+    return pd.DataFrame(block, index=close.index, columns=pd.MultiIndex.from_product([close.columns, indicators], names=["symbol", "indicator"]))
+
+
+def _frame(values:np.ndarray, like):
+    # the values as frame (or series) like the input
+    if isinstance(like, pd.Series): return pd.Series(values, index=like.index)
+    return pd.DataFrame(values, index=like.index, columns=like.columns)
+
+
+class RollingStats():
+    """
+    Prefix sums, prefix sums of squares and prefix counts of the valid values of one series.
+    SMA, rolling std and Bollinger bands of any window are differences of the prefix sums (O(1) per row) without another rolling pass,
+    the results of a grid of windows can be precomputed at once (see grid()).
+    NaN (and infinite) values are not valid, like rolling(window) a window needs window valid values.
+
+    Attributes
+    ----------
+        self.index      : The index of the series
+        self.windows    : dict window -> (sma, std) of the precomputed windows
+    """
+
+    def __init__(self, series:pd.Series):
+        self.index = series.index
+        values = series.to_numpy(dtype=np.float64)
+        valid = np.isfinite(values)
+        # the values are centered and summed in extended precision, so the differences of the prefix sums of squares keep the precision of the variance
+        self._shift = float(values[valid].mean()) if valid.any() else 0.0
+        centered = np.where(valid, values - self._shift, 0.0).astype(np.longdouble)
+        self._sum = np.concatenate([[0.0], np.cumsum(centered)])
+        self._sum_sq = np.concatenate([[0.0], np.cumsum(centered * centered)])
+        self._count = np.concatenate([[0], np.cumsum(valid)])
+        # number of value changes, a window without change has exactly std 0
+        changes = np.concatenate([[True], (values[1:] != values[:-1]) & valid[1:]]) if len(values) > 0 else np.array([], dtype=bool)
+        self._changes = np.concatenate([[0], np.cumsum(changes)])
+        self.windows = {}
+
+    def sma(self, window:int) -> pd.Series:
+        return pd.Series(self._stats(window)[0], index=self.index)
+
+    def std(self, window:int) -> pd.Series:
+        return pd.Series(self._stats(window)[1], index=self.index)
+
+    def bollinger(self, window:int, width:float = 2):
+        """
+        upper and lower Bollinger band: sma +/- width * std
+        """
+        mean, deviation = self._stats(window)
+        return pd.Series(mean + width * deviation, index=self.index), pd.Series(mean - width * deviation, index=self.index)
+
+    def grid(self, windows):
+        """
+        Precomputes sma and std of all windows (e.g. range(1, 366)) at once, afterwards every window is a lookup
+        """
+        for window in windows: self._stats(int(window))
+        return self
+
+    def _stats(self, window:int):
+        if window not in self.windows:
+            self.windows[window] = self._compute(window)
+        return self.windows[window]
+
+    def _compute(self, window:int):
+        # differences of the prefix sums of the complete windows, the rows in front of the first complete window are NaN
+        sma, std = np.full(len(self.index), np.nan), np.full(len(self.index), np.nan)
+        if window > len(self.index) or window < 1: return sma, std
+        total = (self._sum[window:] - self._sum[:-window]).astype(np.float64)
+        total_sq = (self._sum_sq[window:] - self._sum_sq[:-window]).astype(np.float64)
+        complete = (self._count[window:] - self._count[:-window]) == window
+        mean = total / window
+        sma[window - 1:] = np.where(complete, mean + self._shift, np.nan)
+        if window > 1:
+            variance = np.maximum(total_sq - total * mean, 0.0) / (window - 1)
+            # like pandas: a window of equal values has std 0
+            constant = (self._changes[window:] - self._changes[1:len(self._changes) - window + 1]) == 0
+            std[window - 1:] = np.where(complete, np.where(constant, 0.0, np.sqrt(variance)), np.nan)
+        return sma, std
+
+
+# --------------------------------------------------------
+# indicator registry
+# every indicator declares its inputs (sources or other indicators), a request is resolved as DAG:
+# the shared intermediates are computed once, everything not needed is skipped and the sources are never changed
+# -------------------------------
+class IndicatorRegistry():
+    """
+    Registry of technical indicators and their inputs.
+
+    An indicator is a function of the values of its inputs and the interval, e.g. bb_upper = f(sma, std).
+    Inputs are other indicators or sources, i.e. the values given to compute() like "close" and "price".
+    Private indicators are intermediates (e.g. the prefix sums of close), they are not offered by names().
+
+    Attributes
+    ----------
+        self.indicators : dict name -> (inputs, function, public) in the order of registration
+
+    Examples
+    --------
+        registry = portfolio_registry.copy()
+        registry.register("bb_width", ["bb_upper", "bb_lower", "sma"], lambda upper, lower, sma, interval: (upper - lower) / sma)
+        values = registry.compute({"close": close, "price": price}, ["bb_width"], interval=20)
+    """
+
+    def __init__(self):
+        self.indicators = {}
+
+    def register(self, name:str, inputs:list, func, public:bool = True):
+        """
+        Registers (or replaces) an indicator
+
+        Parameters
+        ----------
+        name: str
+            The name of the indicator
+        inputs: list
+            The names of the sources or indicators the function gets as positional arguments (in this order)
+        func: callable
+            func(*inputs, interval=interval) -> the values of the indicator
+        public: bool (optional)
+            default: True
+            False for intermediates, which are only computed as input of other indicators
+
+        Returns
+        -------
+        IndicatorRegistry
+            self, so registrations can be chained
+        """
+        self.indicators[name] = (list(inputs), func, public)
+        return self
+
+    def names(self) -> list:
+        """
+        The public indicators in the order of registration
+        """
+        return [name for name, (inputs, func, public) in self.indicators.items() if public]
+
+    def copy(self):
+        registry = IndicatorRegistry()
+        registry.indicators = dict(self.indicators)
+        return registry
+
+    def resolve(self, names:list, sources = ()) -> list:
+        """
+        The indicators needed for names in an order where every indicator follows its inputs (each once)
+
+        Raises
+        -------
+        ValueError
+            If an input is neither a source nor a registered indicator or the inputs are cyclic
+        """
+        order, done, visiting = [], set(sources), set()
+
+        def visit(name, path):
+            if name in done: return
+            if name not in self.indicators:
+                raise ValueError(f"unknown indicator or source '{name}'" + (f" (input of '{path[-1]}')" if len(path) > 0 else ""))
+            if name in visiting:
+                raise ValueError(f"cyclic indicator inputs {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for input in self.indicators[name][0]: visit(input, path + [name])
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in names: visit(name, [])
+        return order
+
+    def compute(self, sources:dict, names:list = None, interval:int = 14) -> dict:
+        """
+        Computes the requested indicators and (once) everything they depend on
+
+        Parameters
+        ----------
+        sources: dict
+            name -> values, e.g. {"close": ..., "price": ...}. A source with the name of an indicator (e.g. precomputed intermediates) 
+            is taken as it is instead of computing the indicator
+        names: list (optional)
+            default: None
+            The requested indicators, None for all public ones
+        interval: int
+            default: 14
+            The interval passed to every indicator function
+
+        Returns
+        -------
+        dict
+            name -> values of the requested indicators (in the order of names), the sources are not changed
+        """
+        if names is None: names = self.names()
+        values = dict(sources)
+        for name in self.resolve(names, sources=sources.keys()):
+            inputs, func, public = self.indicators[name]
+            values[name] = func(*[values[input] for input in inputs], interval=interval)
+        return {name: values[name] for name in names}
+
+
+# the (days x symbols) indicators of batch_indicators(), sources "close", "high", "low" and "volume"
+symbol_registry = IndicatorRegistry()
+symbol_registry.register("sma", ["close"], sma)
+symbol_registry.register("ema", ["close"], ema)
+symbol_registry.register("std", ["close"], std)
+symbol_registry.register("bb_upper", ["sma", "std"], lambda mean, deviation, interval: mean + 2 * deviation)
+symbol_registry.register("bb_lower", ["sma", "std"], lambda mean, deviation, interval: mean - 2 * deviation)
+symbol_registry.register("rsi", ["close"], rsi)
+symbol_registry.register("ema_fast", ["close"], lambda close, interval: close.ewm(span=12, adjust=False).mean(), public=False)
+symbol_registry.register("ema_slow", ["close"], lambda close, interval: close.ewm(span=26, adjust=False).mean(), public=False)
+symbol_registry.register("macd", ["ema_fast", "ema_slow"], lambda fast, slow, interval: fast - slow)
+symbol_registry.register("signal_line", ["macd"], lambda line, interval: line.ewm(span=9, adjust=False).mean())
+symbol_registry.register("histogram", ["macd", "signal_line"], lambda line, signal_line, interval: line - signal_line)
+symbol_registry.register("mfi", ["high", "low", "close", "volume"], mfi)
+symbol_indicators = symbol_registry.names()
+
+# the indicators of the portfolio history, sources "close" and "price".
+# sma and std are differences of the prefix sums of close and perf (close_stats, perf_stats), which can be given as precomputed sources
+portfolio_registry = IndicatorRegistry()
+portfolio_registry.register("close_stats", ["close"], lambda close, interval: RollingStats(close), public=False)
+portfolio_registry.register("win", ["close", "price"], lambda close, price, interval: close - price)
+portfolio_registry.register("sma", ["close_stats"], lambda stats, interval: stats.sma(interval))
+portfolio_registry.register("ema", ["close"], ema)
+portfolio_registry.register("std", ["close_stats"], lambda stats, interval: stats.std(interval))
+portfolio_registry.register("bb_upper", ["sma", "std"], lambda mean, deviation, interval: mean + 2 * deviation)
+portfolio_registry.register("bb_lower", ["sma", "std"], lambda mean, deviation, interval: mean - 2 * deviation)
+portfolio_registry.register("perf", ["win", "price"], lambda win, price, interval: win / price)
+portfolio_registry.register("perf_stats", ["perf"], lambda perf, interval: RollingStats(perf), public=False)
+portfolio_registry.register("perf_sma", ["perf_stats"], lambda stats, interval: stats.sma(interval))
+portfolio_registry.register("perf_ema", ["perf"], ema)
+portfolio_registry.register("perf_std", ["perf_stats"], lambda stats, interval: stats.std(interval))
+portfolio_registry.register("perf_bb_upper", ["perf_sma", "perf_std"], lambda mean, deviation, interval: mean + 2 * deviation)
+portfolio_registry.register("perf_bb_lower", ["perf_sma", "perf_std"], lambda mean, deviation, interval: mean - 2 * deviation)
+portfolio_registry.register("rsi", ["close"], rsi)
+portfolio_registry.register("ema_fast", ["close"], lambda close, interval: close.ewm(span=12, adjust=False).mean(), public=False)
+portfolio_registry.register("ema_slow", ["close"], lambda close, interval: close.ewm(span=26, adjust=False).mean(), public=False)
+portfolio_registry.register("macd", ["ema_fast", "ema_slow"], lambda fast, slow, interval: fast - slow)
+portfolio_registry.register("signal_line", ["macd"], lambda line, interval: line.ewm(span=9, adjust=False).mean())
+portfolio_registry.register("histogram", ["macd", "signal_line"], lambda line, signal_line, interval: line - signal_line)
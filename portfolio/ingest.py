@@ -0,0 +1,194 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+# --------------------------------------------------------
+# chunked, typed ingestion of transactions from CSV, Parquet and Arrow IPC
+# -------------------------------
+transaction_columns = ["NAME", "VOLUME", "PRICE", "DATE", "SYMBOL"]
+date_format = "%d.%m.%Y"
+formats = {".csv": "csv", ".txt": "csv", ".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+
+
+def read_transactions(source, format:str = None, chunksize:int = 100_000):
+    """
+    Read transactions chunk by chunk, every chunk is validated and converted to the final dtypes
+    (NAME and SYMBOL categorical, VOLUME and PRICE float64, DATE datetime64) before the next one is read,
+    so only one raw chunk is held in memory besides the typed result.
+
+    Parameters
+    ----------
+    source: str or file like
+        The file name or an open (binary) file, e.g. an upload
+    format: str (optional)
+        default: None
+        "csv", "parquet" or "arrow" (Arrow IPC / Feather), if None it is derived from the file name (default "csv")
+    chunksize: int (optional)
+        default: 100_000
+        Number of rows per chunk
+
+    Returns
+    -------
+    (pd.DataFrame, pd.DataFrame)
+        The valid transactions with a DATE column (in the order of the source) and the rejected rows
+        with the columns ROW (position in the source), REASON and the raw values
+
+    Raises
+    -------
+    ValueError
+        If the format is unknown or a required column is missing
+    """
+    if format is None:
+        name = source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", "")
+        format = formats.get(os.path.splitext(str(name))[1].lower(), "csv")
+    if format == "csv":
+        chunks = _csv_chunks(source, chunksize)
+    elif format == "parquet":
+        chunks = _parquet_chunks(source, chunksize)
+    elif format == "arrow":
+        chunks = _arrow_chunks(source, chunksize)
+    else:
+        raise ValueError(f"unknown transaction format '{format}', allowed are 'csv', 'parquet' and 'arrow'")
+
+    columns, rejected, offset = None, [], 0
+    for chunk in chunks:
+        typed, bad = validate_transactions(chunk, offset=offset)
+        offset += len(chunk)
+        if columns is None: columns = {col: [] for col in typed.columns}
+        # the typed chunks are kept as column arrays only
+        for col in columns: columns[col].append(typed[col].array)
+        if len(bad) > 0: rejected.append(bad)
+        del chunk, typed
+    transactions = _concat(columns) if columns is not None else validate_transactions(pd.DataFrame(columns=transaction_columns))[0]
+    rejected = pd.concat(rejected, ignore_index=True) if len(rejected) > 0 else pd.DataFrame(columns=["ROW", "REASON"] + transaction_columns)
+    return transactions, rejected
+
+
+def validate_transactions(df:pd.DataFrame, offset:int = 0):
+    """
+    Vectorized validation and typing of raw transactions.
+    A row is rejected if DATE is no valid date (dd.mm.yyyy, yyyy-mm-dd as written by Portfolio.to_csv() or a timestamp), VOLUME or PRICE is not numeric or SYMBOL is empty.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        The raw transactions with the columns NAME, VOLUME, PRICE, DATE, SYMBOL (other columns are kept)
+    offset: int (optional)
+        default: 0
+        Position of the first row of df in the source, used for ROW of the rejected rows
+
+    Returns
+    -------
+    (pd.DataFrame, pd.DataFrame)
+        The typed valid rows and the rejected rows (see read_transactions())
+
+    Raises
+    -------
+    ValueError
+        If a required column is missing
+    """
+    missing = [col for col in transaction_columns if col not in df.columns and col != "NAME"]
+    if len(missing) > 0:
+        raise ValueError(f"transactions have no column(s) {missing}")
+
+    date = df["DATE"] if pd.api.types.is_datetime64_any_dtype(df["DATE"]) else _parse_dates(df["DATE"])
+    if getattr(date.dt, "tz", None) is not None: date = date.dt.tz_localize(None)
+    volume = pd.to_numeric(df["VOLUME"], errors="coerce").astype(np.float64)
+    price = pd.to_numeric(df["PRICE"], errors="coerce").astype(np.float64)
+    symbol = _categorical(df["SYMBOL"])
+    symbol = symbol.cat.rename_categories(symbol.cat.categories.str.strip()) if symbol.cat.categories.str.strip().is_unique else symbol.astype(object).str.strip().astype("category")
+
+    checks = {"invalid DATE": date.isna(), "invalid VOLUME": volume.isna(), "invalid PRICE": price.isna(), "missing SYMBOL": symbol.isna() | (symbol == "")}
+    bad = np.zeros(len(df), dtype=bool)
+    for mask in checks.values(): bad |= mask.to_numpy()
+
+    rejected = pd.DataFrame(columns=["ROW", "REASON"] + transaction_columns)
+    if bad.any():
+        reasons = pd.Series("", index=df.index[bad])
+        for reason, mask in checks.items():
+            reasons = reasons.where(~mask.to_numpy()[bad], reasons + reason + "; ")
+        rejected = df.loc[bad].reindex(columns=transaction_columns).astype(object)
+        rejected.insert(0, "REASON", reasons.str.rstrip("; ").to_numpy())
+        rejected.insert(0, "ROW", np.flatnonzero(bad) + offset)
+        rejected = rejected.reset_index(drop=True)
+
+    keep = ~bad
+    typed = pd.DataFrame({
+        "NAME": _categorical(df["NAME"] if "NAME" in df.columns else pd.Series(None, index=df.index)).loc[keep],
+        "VOLUME": volume.loc[keep],
+        "PRICE": price.loc[keep],
+        "DATE": date.loc[keep],
+        "SYMBOL": symbol.loc[keep].cat.remove_unused_categories(),
+    })
+    extra = [col for col in df.columns if col not in transaction_columns]
+    for col in extra: typed[col] = df.loc[keep, col].to_numpy()
+    if "selected" in extra and not pd.api.types.is_bool_dtype(typed["selected"]):
+        typed["selected"] = typed["selected"].astype(str).str.lower().isin(["true", "1"])
+    return typed.reset_index(drop=True), rejected
+
+
+def report_rejected(rejected:pd.DataFrame, source = "", max_rows:int = 10):
+    """
+    Log the rejected rows in one message: the number of rows per reason and the first max_rows rows
+    """
+    if len(rejected) == 0: return
+    counts = rejected["REASON"].str.split("; ").explode().value_counts()
+    logging.error(f"{len(rejected)} transactions of {source} rejected ({', '.join(f'{reason}: {count}' for reason, count in counts.items())}), first rows:\n{rejected.head(max_rows).to_string(index=False)}")
+
+
+def _parse_dates(dates:pd.Series) -> pd.Series:
+    # a trade log has few distinct days, so only the distinct strings are parsed
+    codes, uniques = pd.factorize(dates)
+    parsed = pd.to_datetime(pd.Series(uniques), format=date_format, errors="coerce")
+    failed = parsed.isna()
+    if failed.any():
+        parsed.loc[failed] = pd.to_datetime(pd.Series(uniques).loc[failed], format="ISO8601", errors="coerce")
+    values = parsed.to_numpy()[codes]
+    values[codes == -1] = np.datetime64("NaT")
+    return pd.Series(values, index=dates.index)
+
+
+def _categorical(values:pd.Series) -> pd.Series:
+    # categories of plain strings (object), so the categoricals of all chunks can be united
+    values = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype("category")
+    return values.cat.rename_categories(values.cat.categories.astype(str))
+
+
+def _concat(columns:dict) -> pd.DataFrame:
+    # one column after the other is concatenated and its chunks are released, so the peak memory stays close to the result.
+    # the categories of the chunks differ, they are united without converting the columns to object
+    for col, arrays in columns.items():
+        if isinstance(arrays[0].dtype, pd.CategoricalDtype):
+            columns[col] = pd.api.types.union_categoricals(arrays)
+        else:
+            columns[col] = pd.concat([pd.Series(array, copy=False) for array in arrays], ignore_index=True)
+        arrays.clear()
+    return pd.DataFrame(columns, copy=False)
+
+
+def _csv_chunks(source, chunksize:int):
+    # all columns are read as strings, the conversion happens in validate_transactions() so invalid values do not abort the read
+    with pd.read_csv(source, sep=",", dtype=str, keep_default_na=False, na_values=[""], chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def _parquet_chunks(source, chunksize:int):
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(source)
+    for batch in parquet_file.iter_batches(batch_size=chunksize):
+        yield batch.to_pandas(date_as_object=False)
+
+
+def _arrow_chunks(source, chunksize:int):
+    import pyarrow as pa
+    try:
+        reader = pa.ipc.open_file(source)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        if hasattr(source, "seek"): source.seek(0)
+        batches = pa.ipc.open_stream(source)
+    for batch in batches:
+        for start in range(0, batch.num_rows, chunksize):
+            yield batch.slice(start, chunksize).to_pandas(date_as_object=False)
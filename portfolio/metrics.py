@@ -0,0 +1,163 @@
+import os
+import time
+import logging
+import threading
+import functools
+import contextlib
+
+# --------------------------------------------------------
+# optional instrumentation: nested timing spans, counters, gauges and the hit rates of the cached functions
+# disabled by default, set PORTFOLIO_METRICS=1 or call enable(). Disabled, a span or counter is one flag check.
+# -------------------------------
+_enabled = os.environ.get("PORTFOLIO_METRICS", "") not in ["", "0"]
+_lock = threading.Lock()
+_local = threading.local()
+_spans = {}
+_counters = {}
+_gauges = {}
+_caches = {}
+_logger = logging.getLogger("portfolio.metrics")
+# the root logger (portfolio.log) only passes warnings, the metrics are info
+_logger.setLevel(logging.INFO if _enabled else logging.WARNING)
+
+
+def enable(on:bool = True):
+    """
+    Switch the instrumentation on (or off), the recorded data is kept (see reset())
+    """
+    global _enabled
+    _enabled = on
+    _logger.setLevel(logging.INFO if on else logging.WARNING)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """
+    Drops all recorded spans, counters and gauges
+    """
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+@contextlib.contextmanager
+def _span(name:str):
+    stack = getattr(_local, "stack", None)
+    if stack is None: stack = _local.stack = []
+    stack.append(name)
+    path = "/".join(stack)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        with _lock:
+            stats = _spans.setdefault(path, {"count": 0, "seconds": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["seconds"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+        if len(stack) == 0: _logger.info(f"metrics: {path} {elapsed:.4f}s")
+        else: _logger.debug(f"metrics: {path} {elapsed:.4f}s")
+
+
+def span(name:str):
+    """
+    Context manager timing the enclosed block, spans opened inside it (in the same thread) are nested,
+    i.e. recorded as "outer/inner". The top level spans are logged.
+
+    Examples
+    --------
+        with metrics.span("load quotes"):
+            ...
+    """
+    return _span(name) if _enabled else contextlib.nullcontext()
+
+
+def timed(name:str = None):
+    """
+    Decorator recording every call of the function as span (default name: the qualified name of the function)
+    """
+    def decorator(func):
+        span_name = name if name is not None else func.__qualname__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled: return func(*args, **kwargs)
+            with _span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name:str, value:float = 1):
+    """
+    Adds value to the counter name, e.g. the number of provider calls
+    """
+    if not _enabled: return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def gauge(name:str, value):
+    """
+    Sets the gauge name to its current value, e.g. the number of history columns
+    """
+    if not _enabled: return
+    with _lock:
+        _gauges[name] = value
+
+
+def track_frame(name:str, df):
+    """
+    Rows, columns and memory (bytes) of a frame as gauges name.rows, name.columns and name.bytes
+    """
+    if not _enabled or df is None: return
+    gauge(f"{name}.rows", df.shape[0])
+    gauge(f"{name}.columns", df.shape[1])
+    gauge(f"{name}.bytes", int(df.memory_usage(index=True, deep=False).sum()))
+
+
+def register_cache(name:str, func):
+    """
+    Registers a functools.cache decorated function, its hits and misses are part of the report
+    """
+    _caches[name] = func
+    return func
+
+
+def report() -> dict:
+    """
+    The recorded data
+
+    Returns
+    -------
+    dict
+        "spans": path -> count, seconds (total), mean and max,
+        "counters": name -> value,
+        "gauges": name -> value,
+        "caches": name -> hits, misses, hit_rate and size of the registered cached functions
+    """
+    with _lock:
+        spans = {path: dict(stats, mean=stats["seconds"] / stats["count"]) for path, stats in _spans.items()}
+        counters, gauges = dict(_counters), dict(_gauges)
+    caches = {}
+    for name, func in _caches.items():
+        info = func.cache_info()
+        calls = info.hits + info.misses
+        caches[name] = {"hits": info.hits, "misses": info.misses, "hit_rate": info.hits / calls if calls > 0 else None, "size": info.currsize}
+    return {"enabled": _enabled, "spans": spans, "counters": counters, "gauges": gauges, "caches": caches}
+
+
+def log_report():
+    """
+    Writes the report to the log (portfolio.log) if the instrumentation is enabled
+    """
+    data = report()
+    lines = [f"{path}: {stats['count']} x, {stats['seconds']:.4f}s (mean {stats['mean']:.4f}s, max {stats['max']:.4f}s)" for path, stats in sorted(data["spans"].items())]
+    lines += [f"{name} = {value}" for name, value in sorted({**data["counters"], **data["gauges"]}.items())]
+    lines += [f"cache {name}: {stats['hits']} hits, {stats['misses']} misses" for name, stats in data["caches"].items()]
+    _logger.info("metrics report:\n" + "\n".join(lines))
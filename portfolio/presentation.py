@@ -1,6 +1,4 @@
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from portfolio import Portfolio, logging
+from portfolio import Portfolio, logging, metrics
 import pandas as pd
 import functools
 import os
@@ -41,8 +39,13 @@ class Figure():
     def __init__(self,portfolio: Portfolio):
         self.portfolio = portfolio
 
+    @metrics.timed()
     def fig(self, date_range:int = None, level="portfolio", primary_y_stretch:float=1.2, secondary_y_stretch:float=1.2, exclude:str = None, height:int = 500, sep="||"):
 
+        # plotly is imported with the first figure
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+
         self.y_axis={"primary_y":{"max":0, "min":0},"secondary_y":{"max":0, "min":0}}
         
         if level in ["portfolio","symbol"]: self.portfolio.aggregate_to(level=level, inplace=True)
@@ -79,6 +82,14 @@ class Figure():
                 self.y_axis[which_y]["min"] = min(self.y_axis[which_y]["min"], data_set[col].min())
                 self.y_axis[which_y]["max"] = max(self.y_axis[which_y]["max"], data_set[col].max())
 
+        # the portfolio weighted sentiment (see Portfolio.get_sentiment()) next to the yields, without its coverage
+        if exclude is None or "sentiment" not in exclude:
+            prefix = self.portfolio._prefix_sentiment
+            for col in [col for col in data_set.columns if col.startswith(prefix) and not col.endswith("_coverage")]:
+                fig.add_trace(go.Scatter(x=data_set.index, y=data_set[col], mode='lines', name=f"SENT {col[len(prefix):].upper()}", line={"dash":"dot"},), secondary_y=True,)
+                self.y_axis["secondary_y"]["min"] = min(self.y_axis["secondary_y"]["min"], data_set[col].min())
+                self.y_axis["secondary_y"]["max"] = max(self.y_axis["secondary_y"]["max"], data_set[col].max())
+
 
         fig.update_xaxes(title_text="<b>History</b>")
 
@@ -0,0 +1,245 @@
+import os
+import time
+import json
+import random
+import threading
+import urllib.parse
+import pandas as pd
+from datetime import datetime
+
+# --------------------------------------------------------
+# market data providers
+# one interface for history, info, fx, news and intraday quotes, see ticker._get_provider()
+# -------------------------------
+class MarketDataProvider():
+    """
+    Interface of a market data backend. history() and info() are required, fx() and quote() are derived from them by default.
+
+    Attributes
+    ----------
+        self.name       : Name of the backend
+    """
+
+    name = "base"
+    bar_columns = ["Open", "High", "Low", "Close", "Volume"]
+    news_columns = ["Date", "Title", "Link", "Source"]
+
+    def history(self, symbol:str, start:datetime, end:datetime, interval:str = "1d") -> pd.DataFrame:
+        """
+        Bars of symbol in [start, end) with the columns Open, High, Low, Close, Volume, raises an exception if the request fails
+        """
+        raise NotImplementedError
+
+    def info(self, symbol:str) -> dict:
+        """
+        Base data of symbol like yfinance Ticker.info (at least "currency")
+        """
+        raise NotImplementedError
+
+    def fx(self, from_currency:str, to_currency:str, start:datetime, end:datetime) -> pd.Series:
+        """
+        Daily exchange rates (units of to_currency for one from_currency) in [start, end)
+        """
+        return self.history(f"{from_currency}{to_currency}=X", start, end)["Close"]
+
+    def news(self, symbol:str) -> pd.DataFrame:
+        """
+        Latest headlines of symbol with the columns Date, Title, Link, Source
+        """
+        raise NotImplementedError
+
+    def quote(self, symbol:str) -> float:
+        """
+        Latest intraday price of symbol (last close of the 1 minute bars of the day), None if there is none
+        """
+        bars = self.history(symbol, pd.Timestamp.today().normalize(), pd.Timestamp.today().normalize() + pd.Timedelta(days=1), interval="1m")
+        return float(bars["Close"].iloc[-1]) if len(bars) > 0 else None
+
+
+class YFinanceProvider(MarketDataProvider):
+    """
+    Yahoo finance (yfinance) backend, the news are taken from finviz (finvizfinance)
+
+    Attributes
+    ----------
+        self.timeout    : Time in seconds to wait for one download
+    """
+
+    name = "yfinance"
+
+    def __init__(self, timeout:float = 60.0):
+        self.timeout = timeout
+        self._tickers = {}
+
+    def history(self, symbol:str, start:datetime, end:datetime, interval:str = "1d") -> pd.DataFrame:
+        if interval == "1m":
+            # yfinance serves the minute bars by period only
+            bars = self._ticker(symbol).history(interval=interval, period="1d", raise_errors=True, timeout=self.timeout)
+        else:
+            bars = self._ticker(symbol).history(start=start, end=end, interval=interval, auto_adjust=True, raise_errors=True, timeout=self.timeout)
+        return bars[MarketDataProvider.bar_columns]
+
+    def info(self, symbol:str) -> dict:
+        return self._ticker(symbol).info
+
+    def news(self, symbol:str) -> pd.DataFrame:
+        from finvizfinance.quote import finvizfinance
+        return finvizfinance(symbol).ticker_news()[MarketDataProvider.news_columns]
+
+    def _ticker(self, symbol:str):
+        # the yfinance Ticker objects keep their session and are reused, yfinance is only imported with the first one
+        if symbol not in self._tickers:
+            import yfinance as yf
+            self._tickers[symbol] = yf.Ticker(symbol)
+        return self._tickers[symbol]
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Record/replay backend: every response of the recorded provider is written to a local directory and served from there,
+    so Portfolio, Sentiment and the dashboard run offline and with reproducible timing.
+    The bars of a symbol are recorded in one file per interval, a replayed history request is the slice [start, end) of it.
+    The recorded date ranges of the bars are kept next to it (.coverage.json), "auto" fetches the parts of a request not recorded yet.
+
+    The recordings are pickle files, only replay recordings of trusted sources.
+
+    Attributes
+    ----------
+        self.path       : Directory of the recordings
+        self.provider   : The recorded provider (e.g. YFinanceProvider()), not needed for mode "replay"
+        self.mode       : "replay" (only recordings, a missing one or a history range not recorded raises LookupError), "record" (always the provider)
+                          or "auto" (recordings, the provider for the missing ones and the history ranges not recorded)
+        self.latency    : Seconds each replayed response is delayed, a float or a dict method -> seconds (e.g. {"history": 0.2})
+        self.jitter     : Random additional delay (0..jitter seconds) of each replayed response, reproducible by seed
+
+    Examples
+    --------
+        ticker._set_provider(ReplayProvider("recordings", YFinanceProvider(), mode="record"))   # online, records
+        ticker._set_provider(ReplayProvider("recordings", mode="replay", latency=0.1))          # offline
+    """
+
+    name = "replay"
+    modes = ["replay", "record", "auto"]
+
+    def __init__(self, path:str, provider:MarketDataProvider = None, mode:str = "replay", latency = 0.0, jitter:float = 0.0, seed:int = 0):
+        if mode not in ReplayProvider.modes:
+            raise ValueError(f"unknown replay mode '{mode}', allowed are {ReplayProvider.modes}")
+        if mode != "replay" and provider is None:
+            raise ValueError(f"replay mode '{mode}' needs a provider to record")
+        self.path = path
+        self.provider = provider
+        self.mode = mode
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def history(self, symbol:str, start:datetime, end:datetime, interval:str = "1d") -> pd.DataFrame:
+        file = self._file("history", symbol, interval, ext="pkl")
+        if interval == "1m":
+            # the minute bars are served by period (the current day), not by range
+            if self._replay(file, "history"): return pd.read_pickle(file)
+            bars = self.provider.history(symbol, start, end, interval=interval)
+            with self._lock: bars.to_pickle(file)
+            return bars
+        start, end = pd.Timestamp(start).tz_localize(None), pd.Timestamp(end).tz_localize(None)
+        gaps = [(start, end)] if self.mode == "record" else self._gaps(file, start, end)
+        if self.mode == "replay" and len(gaps) > 0:
+            raise LookupError(f"recording {os.path.basename(file)} in {self.path} does not cover {[(str(gap_start), str(gap_end)) for gap_start, gap_end in gaps]}")
+        if len(gaps) == 0:
+            self._wait("history")
+            bars = pd.read_pickle(file)
+        for gap_start, gap_end in gaps:
+            fetched = self.provider.history(symbol, gap_start, gap_end, interval=interval)
+            with self._lock:
+                # the recorded bars are extended, overlapping bars are replaced by the new ones
+                coverage = self._coverage(file)
+                bars = fetched.combine_first(pd.read_pickle(file)) if os.path.exists(file) else fetched
+                bars.to_pickle(file)
+                self._write_coverage(file, coverage + [(gap_start, gap_end)])
+        days = bars.index.tz_localize(None) if getattr(bars.index, "tz", None) is not None else bars.index
+        return bars.loc[(days >= start) & (days < end)]
+
+    def info(self, symbol:str) -> dict:
+        file = self._file("info", symbol, ext="json")
+        if self._replay(file, "info"):
+            with open(file) as fh: return json.load(fh)
+        info = self.provider.info(symbol)
+        with self._lock, open(file, "w") as fh:
+            json.dump(info, fh, default=str)
+        return info
+
+    def news(self, symbol:str) -> pd.DataFrame:
+        file = self._file("news", symbol, ext="pkl")
+        if self._replay(file, "news"):
+            return pd.read_pickle(file)
+        news = self.provider.news(symbol)
+        with self._lock:
+            news.to_pickle(file)
+        return news
+
+    def _replay(self, file:str, method:str) -> bool:
+        # True if the response is served from the recording (after the latency)
+        if self.mode == "record" or (self.mode == "auto" and not os.path.exists(file)):
+            return False
+        if not os.path.exists(file):
+            raise LookupError(f"no recording {os.path.basename(file)} in {self.path}")
+        self._wait(method)
+        return True
+
+    def _wait(self, method:str):
+        # the latency (and jitter) of a replayed response
+        delay = self.latency.get(method, 0.0) if isinstance(self.latency, dict) else self.latency
+        with self._lock:
+            delay += self._random.uniform(0, self.jitter) if self.jitter > 0 else 0.0
+        if delay > 0: time.sleep(delay)
+
+    def _coverage(self, file:str) -> list:
+        # the recorded [start, end) ranges of a history file, a recording without them covers the days of its bars
+        sidecar = file[:-len(".pkl")] + ".coverage.json"
+        if os.path.exists(sidecar):
+            with open(sidecar) as fh: return [(pd.Timestamp(start), pd.Timestamp(end)) for start, end in json.load(fh)]
+        if not os.path.exists(file): return []
+        days = pd.read_pickle(file).index
+        if len(days) == 0: return []
+        if getattr(days, "tz", None) is not None: days = days.tz_localize(None)
+        return [(days.min().normalize(), days.max().normalize() + pd.Timedelta(days=1))]
+
+    def _gaps(self, file:str, start:pd.Timestamp, end:pd.Timestamp) -> list:
+        # the parts of [start, end) not recorded
+        gaps, cursor = [], start
+        for cov_start, cov_end in sorted(self._coverage(file)):
+            if cov_start > cursor: gaps.append((cursor, min(cov_start, end)))
+            cursor = max(cursor, cov_end)
+            if cursor >= end: break
+        if cursor < end: gaps.append((cursor, end))
+        return gaps
+
+    def _write_coverage(self, file:str, ranges:list):
+        # the recorded [start, end) ranges, overlapping and adjacent ranges are merged
+        merged = []
+        for cov_start, cov_end in sorted(ranges):
+            if len(merged) > 0 and cov_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], cov_end))
+            else:
+                merged.append((cov_start, cov_end))
+        with open(file[:-len(".pkl")] + ".coverage.json", "w") as fh:
+            json.dump([(cov_start.isoformat(), cov_end.isoformat()) for cov_start, cov_end in merged], fh)
+
+    def _file(self, method:str, symbol:str, interval:str = None, ext:str = "pkl") -> str:
+        # the symbol is quoted, "EURUSD=X" or "^GDAXI" are valid file names as well
+        name = "_".join([method, urllib.parse.quote(symbol, safe="")] + ([interval] if interval is not None else []))
+        return os.path.join(self.path, f"{name}.{ext}")
+
+
+def provider_from_env():
+    """
+    The provider configured by the environment: PORTFOLIO_REPLAY (directory of recordings) with PORTFOLIO_REPLAY_MODE (default "replay")
+    and PORTFOLIO_REPLAY_LATENCY (seconds, default 0), without PORTFOLIO_REPLAY Yahoo finance
+    """
+    path = os.environ.get("PORTFOLIO_REPLAY", "")
+    if path == "":
+        return YFinanceProvider()
+    mode = os.environ.get("PORTFOLIO_REPLAY_MODE", "replay")
+    return ReplayProvider(path, provider=YFinanceProvider() if mode != "replay" else None, mode=mode, latency=float(os.environ.get("PORTFOLIO_REPLAY_LATENCY", "0")))
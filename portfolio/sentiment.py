@@ -1,18 +1,221 @@
 
+import os
 import pandas as pd
-from finvizfinance.quote import finvizfinance
-from transformers import DistilBertTokenizer, DistilBertForSequenceClassification, BertTokenizer, BertForSequenceClassification
-from transformers import pipeline
 import logging
-import yfinance as yf
 import json
+import time
+import threading
+import functools
 import numpy as np
-import plotly.express as px
-import nltk
-nltk.downloader.download('vader_lexicon')
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from datetime import datetime
-import crawl4ai
+from .ticker import _get_ticker_info, _download_news, _download_quote, _get_scheduler
+from .sentiment_store import ScoreCache, NewsArchive, headline_hash
+from . import metrics
+
+# transformers, nltk and plotly are imported when a model is scored resp. a treemap is drawn
+@functools.cache
+def _vader():
+    # the VADER lexicon is downloaded once with the first nltk scoring, not on import
+    import nltk
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    try:
+        nltk.data.find("sentiment/vader_lexicon.zip")
+    except LookupError:
+        nltk.downloader.download("vader_lexicon", quiet=True)
+    return SentimentIntensityAnalyzer()
+
+# --------------------------------------------------------
+# process wide pool of the transformer models, every model is loaded once
+# -------------------------------
+class SentimentModelPool():
+    """
+    Keeps the transformer models of Sentiment.sentiment_models resident, each model is loaded once per process on its first use.
+    The headlines are tokenized once, sorted by length and scored in batches of similar length (little padding) without gradients.
+
+    Attributes
+    ----------
+        self.batch_size     : Number of headlines per forward pass
+        self.threads        : Number of torch threads for the inference, None keeps the torch default
+        self.quantize       : Dynamic int8 quantization of the linear layers (CPU only, faster with a small loss of accuracy)
+        self.max_length     : Headlines are truncated to max_length tokens
+
+    Examples
+    --------
+        sentiment._set_model_pool(SentimentModelPool(batch_size=64, threads=4, quantize=True))
+    """
+
+    def __init__(self, batch_size:int = 32, threads:int = None, quantize:bool = False, max_length:int = 64):
+        self.batch_size = batch_size
+        self.threads = threads
+        self.quantize = quantize
+        self.max_length = max_length
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, model:str):
+        """
+        The (tokenizer, model) of model, loaded (and quantized) with the first call
+        """
+        with self._lock:
+            if model not in self._models:
+                start = time.perf_counter()
+                self._models[model] = self._load(model)
+                self._stats.setdefault(model, {"headlines": 0, "seconds": 0.0})["load_seconds"] = time.perf_counter() - start
+                logging.info(f"sentiment model {model} loaded in {self._stats[model]['load_seconds']:.1f}s")
+        return self._models[model]
+
+    def score(self, model:str, texts:list) -> list:
+        """
+        Scores texts with model
+
+        Parameters
+        ----------
+        model: str
+            "finBERT" or "distilBERT" (see Sentiment.sentiment_models)
+        texts: list
+            The headlines
+
+        Returns
+        -------
+        list
+            one dict {"label": ..., "score": ...} per text (in the order of texts) like the transformers sentiment-analysis pipeline
+        """
+        import torch
+        tokenizer, _model = self.get(model)
+        if len(texts) == 0: return []
+        if self.threads is not None: torch.set_num_threads(self.threads)
+        start = time.perf_counter()
+        encoded = tokenizer([str(text) for text in texts], truncation=True, max_length=self.max_length)
+        # length buckets: similar lengths in one batch, so the batches are hardly padded
+        order = np.argsort([len(ids) for ids in encoded["input_ids"]], kind="stable")
+        labels, scores = np.empty(len(texts), dtype=np.int64), np.empty(len(texts))
+        with torch.inference_mode():
+            for i in range(0, len(order), self.batch_size):
+                rows = order[i:i + self.batch_size]
+                batch = tokenizer.pad({key: [values[row] for row in rows] for key, values in encoded.items()}, return_tensors="pt")
+                probabilities = torch.softmax(_model(**batch).logits, dim=-1)
+                best, label = probabilities.max(dim=-1)
+                scores[rows], labels[rows] = best.numpy(), label.numpy()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            stats = self._stats[model]
+            stats["headlines"] += len(texts)
+            stats["seconds"] += elapsed
+        metrics.count(f"sentiment.{model}.headlines", len(texts))
+        metrics.gauge(f"sentiment.{model}.headlines_per_second", round(len(texts) / elapsed, 1) if elapsed > 0 else None)
+        id2label = _model.config.id2label
+        return [{"label": id2label[int(label)], "score": float(score)} for label, score in zip(labels, scores)]
+
+    def version(self, model:str) -> str:
+        """
+        The version of the scores of model (the cache key, see ScoreCache): model name, truncation and quantization
+        """
+        return f"{Sentiment.sentiment_models[model]['model']}/len{self.max_length}" + ("/int8" if self.quantize else "")
+
+    def throughput(self) -> pd.DataFrame:
+        """
+        The scored headlines, the inference time and the throughput (headlines per second) and load time of every loaded model
+        """
+        with self._lock:
+            report = pd.DataFrame.from_dict(self._stats, orient="index", columns=["headlines", "seconds", "load_seconds"])
+        report["headlines_per_second"] = (report["headlines"] / report["seconds"].where(report["seconds"] > 0)).round(1)
+        return report
+
+    def _load(self, model:str):
+        from transformers import DistilBertTokenizer, DistilBertForSequenceClassification, BertTokenizer, BertForSequenceClassification
+        names = Sentiment.sentiment_models[model]
+        if model == "finBERT":
+            tokenizer = BertTokenizer.from_pretrained(names["tokenizer"])
+            _model = BertForSequenceClassification.from_pretrained(names["model"], num_labels=3)
+        elif model == "distilBERT":
+            tokenizer = DistilBertTokenizer.from_pretrained(names["tokenizer"])
+            _model = DistilBertForSequenceClassification.from_pretrained(names["model"])
+        else:
+            raise ValueError(f"no transformer model '{model}', allowed are {[name for name in Sentiment.sentiment_models if name != 'nltk']}")
+        _model.eval()
+        if self.quantize:
+            import torch
+            _model = torch.ao.quantization.quantize_dynamic(_model, {torch.nn.Linear}, dtype=torch.qint8)
+        return tokenizer, _model
+
+_model_pool = SentimentModelPool()
+
+def _get_model_pool():
+    """
+    The model pool used for all transformer scorings
+    """
+    return _model_pool
+
+def _set_model_pool(pool:SentimentModelPool):
+    """
+    Replace the model pool used for all transformer scorings (e.g. with another batch size or quantized models)
+    """
+    global _model_pool
+    _model_pool = pool
+
+# --------------------------------------------------------
+# persistent cache of the headline scores
+# set PORTFOLIO_SCORE_CACHE to the file name of the SQLite data base, an empty string disables the cache
+# -------------------------------
+_score_cache = None
+_score_cache_path = os.environ.get("PORTFOLIO_SCORE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "portfolio", "sentiment_scores.sqlite"))
+
+def _get_score_cache():
+    """
+    The persistent headline score cache or None if disabled
+    """
+    global _score_cache
+    if _score_cache is None and _score_cache_path != "":
+        _score_cache = metrics.register_cache("sentiment_scores", ScoreCache(_score_cache_path))
+    return _score_cache
+
+def _set_score_cache(cache:ScoreCache):
+    """
+    Replace the headline score cache (None disables it)
+    """
+    global _score_cache, _score_cache_path
+    _score_cache = cache
+    _score_cache_path = cache.path if cache is not None else ""
+    if cache is not None: metrics.register_cache("sentiment_scores", cache)
+
+
+# --------------------------------------------------------
+# persistent archive of the headlines
+# set PORTFOLIO_NEWS_ARCHIVE to the file name of the SQLite data base, an empty string disables the archive
+# -------------------------------
+_news_archive = None
+_news_archive_path = os.environ.get("PORTFOLIO_NEWS_ARCHIVE", os.path.join(os.path.expanduser("~"), ".cache", "portfolio", "news.sqlite"))
+
+def _get_news_archive():
+    """
+    The persistent news archive or None if disabled
+    """
+    global _news_archive
+    if _news_archive is None and _news_archive_path != "":
+        _news_archive = NewsArchive(_news_archive_path)
+    return _news_archive
+
+def _set_news_archive(archive:NewsArchive):
+    """
+    Replace the news archive (None disables it)
+    """
+    global _news_archive, _news_archive_path
+    _news_archive = archive
+    _news_archive_path = archive.path if archive is not None else ""
+
+# --------------------------------------------------------
+# news sources: name -> function(ticker, since) returning the headlines (Date, Title, Link, Source) from since on (None for all)
+# -------------------------------
+def _finviz_news(ticker:str, since = None) -> pd.DataFrame:
+    # finviz serves the latest headlines only, the older ones are dropped (the ones of the same time are deduplicated by the archive)
+    news = _download_news(ticker)
+    if since is None: return news
+    dates = pd.to_datetime(news["Date"], errors="coerce")
+    if getattr(dates.dt, "tz", None) is not None: dates = dates.dt.tz_localize(None)
+    return news.loc[dates >= since]
+
+news_sources = {"finviz": _finviz_news}
 
 
 class Sentiment():
@@ -24,45 +227,61 @@ class Sentiment():
         }
 
 
-    def __init__(self, ticker):
+    def __init__(self, ticker, timeout:float = 30.0):
+        """
+        Attributes
+        ----------
+            self.ticker         : dict ticker -> number of shares (a list of tickers means one share each)
+            self.news_df        : The headlines of all tickers with the columns Date, Title, Link, Source, Ticker
+            self.ticker_info    : Industry, Price, Shares, Sector and Stockvalue (and the scores) per ticker
+            self.timeout        : Time in seconds to wait for the info (and quote) resp. the news of one ticker
+            self.news_limit     : Number of the newest archived headlines per ticker in self.news_df (see load_news())
+            self.errors         : The failed requests of the last init_data() / load_news(), dicts with ticker, stage ("info", "quote" or "news"), type and error
+        """
         self.ticker = {t:1 for t in ticker} if isinstance(ticker, list) else ticker
         self.news_df = pd.DataFrame()
         self.ticker_info = pd.DataFrame()
+        self.timeout = timeout
+        self.news_limit = 100
+        self.errors = []
         self._init = False
 
 
     def init_data(self):
         if self._init: return
-        data={'Industry': [], 'Price': [], 'Shares': [], "Sector":[]}
-        tickers =[]
-        for ticker,shares in self.ticker.items():
-            tickerdata = yf.Ticker(ticker)
-            print(f"{ticker = }")
-            price = tickerdata.info.get("currentPrice",0.0)
-            print(ticker,price)
-            if price == 0.0: 
-                close = tickerdata.history(interval="1m", period = "1d")
-                if close.shape[0]>0: 
-                    price= close["Close"][-1] if close["Close"][-1]>0 else 0.1
-            print(ticker,price)
+        self.errors = []
+        # the infos (with the intraday quote as fallback of the price) and the news of all tickers are fetched concurrently,
+        # so the setup takes about as long as the slowest ticker
+        tickers = list(self.ticker.keys())
+        requests = [("info", ticker, None) for ticker in tickers] + [("news", ticker, "finviz") for ticker in tickers]
+        results = _get_scheduler().map(self._fetch, requests, return_exceptions=True, timeout=self.timeout)
 
+        data={'Industry': [], 'Price': [], 'Shares': [], "Sector":[]}
+        for ticker, result in zip(tickers, results[:len(tickers)]):
+            if isinstance(result, Exception):
+                self._error(ticker, "info", result)
+                result = ({}, 0.0)
+            info, price = result
             data["Price"].append(price)
-            data["Sector"].append(tickerdata.info.get("sector","No Sector"))        
-            data["Industry"].append(tickerdata.info.get("industry","No Industry"))        
-            data["Shares"].append(shares)
-            tickers.append(ticker)
+            data["Sector"].append(info.get("sector","No Sector"))        
+            data["Industry"].append(info.get("industry","No Industry"))        
+            data["Shares"].append(self.ticker[ticker])
         self.ticker_info = pd.DataFrame(data=data, index = tickers)
         self.ticker_info["Stockvalue"] = self.ticker_info['Price']*self.ticker_info["Shares"]
-        self.load_news()
+        self._set_news(tickers, results[len(tickers):], "finviz")
         self._init = True
 
 
     def load_news(self, source="finviz"):
         """
         Get news data in the form ["Date", "Title", "Link", "Source"] and load it into self.news_df
+        With the news archive (see _get_news_archive()) only the headlines newer than the archived ones are fetched
+        (and none if the ticker was fetched within the max_age of the archive), self.news_df are the newest self.news_limit archived headlines per ticker.
 
         Parameter:
         ----------
+        source: str, Default "finviz"
+        name of the news source (see news_sources)
 
         Return:
         -------
@@ -71,23 +290,65 @@ class Sentiment():
         # self.news_df-columns =["Date", "Title", "Link", "Source"]
         self.news_df=pd.DataFrame({"Date":[], "Title":[], "Link":[], "Source":[], "Ticker":[]})
         if self.ticker == {}: print("load_news(): no ticker found!"); return
-        if source =="finviz":
-            for ticker in self.ticker.keys():
-                try:
-                    stock = finvizfinance(ticker)
-                    news = stock.ticker_news()
-                    news["Ticker"]=ticker
-                    self.news_df = pd.concat([self.news_df, news], axis=0, ignore_index=True,)
-                except Exception as e:
-                    print(f"{ticker} not found in finvizfinance: {e}")
-                    news = pd.DataFrame({"Date":[datetime.today().date()], "Title":["Neutral"], "Link":["N/A"], "Source":["N/A"], "Ticker":[ticker]})
-                    self.news_df = pd.concat([self.news_df, news], axis=0, ignore_index=True,)
-            self.news_df['Date'] = pd.to_datetime(self.news_df['Date'])
+        if source in news_sources:
+            self.errors = [error for error in self.errors if error["stage"] != "news"]
+            tickers = list(self.ticker.keys())
+            results = _get_scheduler().map(self._fetch, [("news", ticker, source) for ticker in tickers], return_exceptions=True, timeout=self.timeout)
+            self._set_news(tickers, results, source)
         else:
+            self._error(None, "news", ValueError(f"unknown news source '{source}', allowed are {list(news_sources)}"))
+
+    def _fetch(self, request:tuple):
+        # one request of the fetch pipeline: ("info", ticker, None) -> (info, price) or ("news", ticker, source) -> new headlines (None if the archived ones are recent)
+        stage, ticker, source = request
+        if stage == "news":
+            archive = _get_news_archive()
+            if archive is None: return news_sources[source](ticker, None)
+            if archive.is_fresh(ticker, source): return None
+            return news_sources[source](ticker, archive.latest(ticker))
+        # info and quotes come from the market data provider (see ticker._get_provider())
+        try:
+            info = _get_ticker_info(ticker)
+        except Exception as e:
+            self._error(ticker, "info", e)
+            info = {}
+        price = info.get("currentPrice",0.0)
+        if price == 0.0: 
             try:
-                pass
+                quote = _download_quote(ticker)
             except Exception as e:
-                print(f"Error loading news from {source} for {self.ticker=} Error: {e}")
+                self._error(ticker, "quote", e)
+                quote = None
+            if quote is not None: 
+                price= quote if quote>0 else 0.1
+        return info, price
+
+    def _set_news(self, tickers:list, results:list, source:str):
+        # self.news_df is built once from the headlines of all tickers (from the archive if enabled), a failed ticker without news gets one neutral headline
+        self.news_df=pd.DataFrame({"Date":[], "Title":[], "Link":[], "Source":[], "Ticker":[]})
+        archive = _get_news_archive()
+        frames, failed = [], []
+        for ticker, news in zip(tickers, results):
+            if isinstance(news, Exception):
+                self._error(ticker, "news", news)
+                failed.append(ticker)
+            elif archive is not None and news is not None:
+                metrics.count("news.headlines.new", archive.write(ticker, news, source))
+            elif archive is None:
+                frames.append(news.assign(Ticker=ticker))
+        if archive is not None:
+            frames = [archive.read(tickers, limit=self.news_limit)]
+            failed = [ticker for ticker in failed if ticker not in set(frames[0]["Ticker"])]
+        frames += [pd.DataFrame({"Date":[datetime.today().date()], "Title":["Neutral"], "Link":["N/A"], "Source":["N/A"], "Ticker":[ticker]}) for ticker in failed]
+        frames = [frame for frame in frames if len(frame) > 0]
+        if len(frames) > 0:
+            self.news_df = pd.concat(frames, axis=0, ignore_index=True)
+        self.news_df['Date'] = pd.to_datetime(self.news_df['Date'])
+
+    def _error(self, ticker, stage:str, error:Exception):
+        # structured error list instead of printing, the requests run in worker threads
+        logging.error(f"Sentiment: {stage} of {ticker} failed: {error}")
+        self.errors.append({"ticker": ticker, "stage": stage, "type": type(error).__name__, "error": str(error)})
 
 
     def score_data(self, model="nltk") -> None:
@@ -125,9 +386,7 @@ class Sentiment():
         -------
         pandas dataframe like [...{"compound_nltk":0.9227, "neg_nltk": 0.0, "neu_nltk": 0.246, "pos_nltk": 0.754,}...]
         """
-        vader = SentimentIntensityAnalyzer()
-        scores = self.news_df["Title"].apply(vader.polarity_scores).tolist()
-        score_data = pd.DataFrame(scores)
+        score_data = self._cached_scores(model)
         score_data.rename(columns={"neg":f"neg_{model}","pos":f"pos_{model}","neu":f"neu_{model}","compound":f"compound_{model}",}, inplace=True,)
         return score_data
   
@@ -146,28 +405,36 @@ class Sentiment():
         """
         if model not in Sentiment.sentiment_models.keys(): return
         try:
-            if model == "finBERT":
-                tokenizer = BertTokenizer.from_pretrained(Sentiment.sentiment_models["finBERT"]["tokenizer"])
-                _model = BertForSequenceClassification.from_pretrained(Sentiment.sentiment_models["finBERT"]["model"], num_labels=3)
-            elif model == "distilBERT":
-                tokenizer = DistilBertTokenizer.from_pretrained(Sentiment.sentiment_models[model]["tokenizer"])
-                _model = DistilBertForSequenceClassification.from_pretrained(Sentiment.sentiment_models[model]["model"])
-            nlp = pipeline("sentiment-analysis", tokenizer=tokenizer, model=_model)
-            results = nlp(self.news_df["Title"].tolist())
-
-            sentiment_by_AI_results =[]
-            for result in results:
-                sent={f"neg_{model}":0,f"neu_{model}":0,f"pos_{model}":0,f"compound_{model}":0}
-                sent[f"compound_{model}"] = - result["score"] if result["label"].upper()=="NEGATIVE" else (result["score"] if result["label"].upper()=="POSITIVE" else 0)
-                sent[result["label"][:3].lower()+f"_{model}"]=1
-                sentiment_by_AI_results.append(sent)
-
-            return pd.DataFrame(sentiment_by_AI_results)
+            score_data = self._cached_scores(model)
+            return score_data.rename(columns={column: f"{column}_{model}" for column in ScoreCache.score_columns})
         except Exception as e:
             logging.error(f"Error in _score_data_by_ai: {e}")
-            return pd.DataFrame([{f"neg_{model}":0,f"neu_{model}":0,f"pos_{model}":0,f"compound_{model}":0}]*len(results))
+            return pd.DataFrame([{f"neg_{model}":0,f"neu_{model}":0,f"pos_{model}":0,f"compound_{model}":0}]*len(self.news_df))
     
-    def get_treemap(self,model) -> px.treemap:
+    def _cached_scores(self, model) -> pd.DataFrame:
+        """
+        neg, neu, pos and compound of every headline of self.news_df (with the index of self.news_df), see headline_scores()
+        """
+        return headline_scores(model, self.news_df["Title"])
+
+    @staticmethod
+    def _score_titles(model, titles:list) -> pd.DataFrame:
+        # neg, neu, pos and compound of every title
+        if model == "nltk":
+            vader = _vader()
+            return pd.DataFrame([vader.polarity_scores(title) for title in titles], columns=ScoreCache.score_columns, dtype=float)
+        # the models stay loaded in the pool, the headlines are scored in length bucketed batches
+        results = _get_model_pool().score(model, titles)
+        sentiment_by_AI_results =[]
+        for result in results:
+            sent={"neg":0,"neu":0,"pos":0,"compound":0}
+            sent["compound"] = - result["score"] if result["label"].upper()=="NEGATIVE" else (result["score"] if result["label"].upper()=="POSITIVE" else 0)
+            sent[result["label"][:3].lower()]=1
+            sentiment_by_AI_results.append(sent)
+        return pd.DataFrame(sentiment_by_AI_results, columns=ScoreCache.score_columns, dtype=float)
+
+    def get_treemap(self,model) -> "plotly.graph_objects.Figure":
+        import plotly.express as px
         #columns=['Price', 'neg'+f"_{model}", 'neu'+f"_{model}", 'pos'+f"_{model}", 'compound'+f"_{model}"]
         print("----------------------------------------\n", self.ticker_info.columns, "\n--------------------------------------------")
         info = self.ticker_info.reset_index()
@@ -187,6 +454,161 @@ class Sentiment():
         return fig
 
 
+def headline_scores(model:str, titles:pd.Series, hashes:pd.Series = None) -> pd.DataFrame:
+    """
+    neg, neu, pos and compound of every headline of titles (with the index of titles).
+    All headlines are looked up in the score cache at once (see _get_score_cache()), only the missing ones are scored by the model.
+    hashes are the headline_hash() of titles if known (e.g. from the news archive).
+    """
+    titles = titles.astype(str)
+    cache = _get_score_cache()
+    if cache is None:
+        return Sentiment._score_titles(model, titles.tolist()).set_axis(titles.index)
+    if hashes is None: hashes = titles.map(headline_hash)
+    version = "vader" if model == "nltk" else _get_model_pool().version(model)
+    scores = cache.read(model, version, hashes.tolist())
+    missing = hashes[~hashes.isin(scores.index)].drop_duplicates()
+    if len(missing) > 0:
+        # failed scorings raise an exception and are not cached
+        scored = Sentiment._score_titles(model, titles[missing.index].tolist()).set_axis(missing.to_numpy())
+        cache.write(model, version, scored)
+        scores = pd.concat([scores, scored]) if len(scores) > 0 else scored
+    return scores.reindex(hashes.to_numpy()).set_axis(titles.index)
+
+# --------------------------------------------------------
+# daily sentiment per ticker from the news archive with exponential time decay
+# -------------------------------
+class SentimentIndex():
+    """
+    Daily sentiment of every ticker of the news archive (see NewsArchive): the mean compound score of its headlines up to the day,
+    the weight of a headline is halved every half_life days.
+    Kept are the decayed sums of the scores and of the number of headlines (sums[d] = decay * sums[d-1] + scores of day d),
+    update() scores only the headlines archived since the last update and recomputes the days from the earliest new headline on, all tickers at once.
+
+    Attributes
+    ----------
+        self.model          : The model the headlines are scored with (see Sentiment.sentiment_models), the scores are cached (see headline_scores())
+        self.half_life      : Days after which the weight of a headline is halved
+        self.min_weight     : Days with less decayed headlines have no sentiment (NaN), 0.1 is one headline about 3 half-lives ago
+        self.archive        : The news archive, None for _get_news_archive()
+        self.daily_scores   : (days x tickers) sum of the compound scores of the headlines of the day
+        self.daily_counts   : (days x tickers) number of headlines of the day
+        self.sums           : (days x tickers) decayed sums of the scores
+        self.weights        : (days x tickers) decayed number of headlines
+
+    Examples
+    --------
+        index = SentimentIndex(model="nltk", half_life=3)
+        index.update()
+        panel = index.panel(["MSFT", "KO"], start="2025-01-01")
+    """
+
+    def __init__(self, model:str = "nltk", half_life:float = 3.0, min_weight:float = 0.1, archive:NewsArchive = None):
+        if model not in Sentiment.sentiment_models:
+            raise ValueError(f"unknown sentiment model '{model}', allowed are {list(Sentiment.sentiment_models)}")
+        if half_life <= 0:
+            raise ValueError(f"half_life must be positive, not {half_life}")
+        self.model = model
+        self.half_life = half_life
+        self.min_weight = min_weight
+        self.archive = archive
+        self._reset(None)
+
+    def _reset(self, path):
+        self.daily_scores, self.daily_counts, self.sums, self.weights = [pd.DataFrame(dtype=np.float64, index=pd.DatetimeIndex([], name="Date")) for _ in range(4)]
+        # the archive and its last row id the panels are built from
+        self._path, self._last_row = path, 0
+
+    @metrics.timed()
+    def update(self, end = None) -> int:
+        """
+        Adds the headlines archived since the last update and extends the panels up to end
+
+        Parameters
+        ----------
+        end: datetime (optional)
+            default: None
+            The last day of the panels, defaults to today (or the newest headline if it is later)
+
+        Returns
+        -------
+        int
+            Number of new headlines
+
+        Raises
+        -------
+        ValueError
+            If there is no news archive (see _get_news_archive())
+        """
+        archive = self.archive if self.archive is not None else _get_news_archive()
+        if archive is None:
+            raise ValueError("the sentiment index needs the news archive, see PORTFOLIO_NEWS_ARCHIVE")
+        if archive.path != self._path: self._reset(archive.path)
+        if end is None: end = datetime.today()
+        news, last_row = archive.changes(self._last_row)
+        news = news.dropna(subset=["Date"])
+        # scored before the panels are changed, a failed scoring leaves the index as it was
+        news["compound"] = headline_scores(self.model, news["Title"], news["hash"])["compound"].fillna(0.0).to_numpy() if len(news) > 0 else np.zeros(0)
+        news["Date"] = news["Date"].dt.normalize()
+
+        old_days = self.sums.index
+        bounds = [pd.Timestamp(end).normalize()] + list(news["Date"].agg(["min", "max"]) if len(news) > 0 else []) + list(old_days[[0, -1]] if len(old_days) > 0 else [])
+        days = pd.date_range(min(bounds), max(bounds), freq="D", name="Date")
+        tickers = self.sums.columns.union(pd.Index(news["Ticker"].unique()))
+        daily = news.groupby(["Date", "Ticker"])["compound"].agg(["sum", "count"])
+        self.daily_scores, self.daily_counts = [
+            panel.reindex(index=days, columns=tickers, fill_value=0.0).add(daily[field].unstack().reindex(index=days, columns=tickers), fill_value=0.0) if len(daily) > 0 else panel.reindex(index=days, columns=tickers, fill_value=0.0)
+            for panel, field in [(self.daily_scores, "sum"), (self.daily_counts, "count")]]
+
+        # the days from the earliest new headline (or the first new day) on are recomputed
+        since = [news["Date"].min()] if len(news) > 0 else []
+        if len(old_days) > 0 and old_days[-1] < days[-1]: since.append(old_days[-1] + pd.Timedelta(days=1))
+        if len(old_days) == 0 or old_days[0] > days[0]: since.append(days[0])
+        row = days.get_loc(min(since)) if len(since) > 0 else len(days)
+        decay = 0.5 ** (1 / self.half_life)
+        sums, weights = [panel.reindex(index=days, columns=tickers, fill_value=0.0) for panel in [self.sums, self.weights]]
+        for panel, daily_panel in [(sums, self.daily_scores), (weights, self.daily_counts)]:
+            if row < len(days):
+                initial = panel.iloc[row - 1].to_numpy() if row > 0 else np.zeros(len(tickers))
+                panel.iloc[row:] = _decayed(daily_panel.iloc[row:].to_numpy(dtype=np.float64), initial, decay)
+        self.sums, self.weights, self._last_row = sums, weights, last_row
+        metrics.count("sentiment.index.headlines", len(news))
+        return len(news)
+
+    def panel(self, tickers:list = None, start = None, end = None) -> pd.DataFrame:
+        """
+        The daily sentiment (decayed mean compound score, -1 to 1) of tickers, NaN without recent headlines
+
+        Parameters
+        ----------
+        tickers: list (optional)
+            default: None
+            The tickers (columns), None for all, tickers without headlines are NaN
+        start: datetime (optional)
+            default: None
+            The first day
+        end: datetime (optional)
+            default: None
+            The last day
+
+        Returns
+        -------
+        pd.DataFrame
+            (days x tickers)
+        """
+        sentiment = (self.sums / self.weights).where(self.weights >= self.min_weight)
+        if tickers is not None: sentiment = sentiment.reindex(columns=tickers)
+        return sentiment.loc[start:end]
+
+def _decayed(values:np.ndarray, initial:np.ndarray, decay:float) -> np.ndarray:
+    # x[t] = decay * x[t-1] + values[t] with x[-1] = initial for all columns at once:
+    # the adjusted exponential mean of pandas (a C loop) times the sum of its weights 1 + decay + ... + decay^t
+    frame = pd.DataFrame(np.vstack([initial, values]))
+    means = frame.ewm(alpha=1 - decay, adjust=True).mean().to_numpy()
+    weights = (1 - decay ** np.arange(1, len(frame) + 1)) / (1 - decay)
+    return (means * weights[:, None])[1:]
+
+
 if __name__=="__main__":
 
     _model ="finBERT"
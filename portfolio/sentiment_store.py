@@ -0,0 +1,260 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import contextlib
+import collections
+import unicodedata
+import pandas as pd
+from datetime import datetime, timedelta
+
+# hits, misses, maxsize and currsize like functools.cache, see metrics.register_cache()
+CacheInfo = collections.namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+def headline_hash(title:str) -> str:
+    """
+    Content address of a headline: the hash of the normalized text (unicode NFKC, whitespace collapsed).
+    The case is kept, VADER scores capitals as emphasis.
+    """
+    text = " ".join(unicodedata.normalize("NFKC", str(title)).split())
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ScoreCache():
+    """
+    Persistent cache (SQLite) of the sentiment scores of headlines, keyed by model, model version and headline hash (see headline_hash()).
+    The cache is bounded: above max_entries the least recently used scores are evicted (down to 90% of max_entries).
+
+    Attributes
+    ----------
+        self.path           : The file name of the SQLite data base
+        self.max_entries    : Maximum number of cached scores
+        self.hits           : Number of headlines found in the cache (since the creation of the object)
+        self.misses         : Number of headlines not found
+        self.evicted        : Number of evicted scores
+    """
+
+    score_columns = ["neg", "neu", "pos", "compound"]
+    # SQLite limits the number of parameters of one statement
+    chunk_size = 500
+
+    def __init__(self, path:str, max_entries:int = 500_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits, self.misses, self.evicted = 0, 0, 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path) != "": os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS scores (model TEXT, version TEXT, hash TEXT, neg REAL, neu REAL, pos REAL, compound REAL, used_at REAL, PRIMARY KEY (model, version, hash))")
+            conn.execute("CREATE INDEX IF NOT EXISTS scores_used_at ON scores (used_at)")
+
+    def read(self, model:str, version:str, hashes:list) -> pd.DataFrame:
+        """
+        The cached scores of hashes (one bulk lookup), the found ones are marked as used
+
+        Returns
+        -------
+        pd.DataFrame
+            indexed by the found hashes with the columns neg, neu, pos and compound
+        """
+        hashes = list(dict.fromkeys(hashes))
+        rows = []
+        now = time.time()
+        with self._connect() as conn:
+            for i in range(0, len(hashes), ScoreCache.chunk_size):
+                chunk = hashes[i:i + ScoreCache.chunk_size]
+                marks = ",".join("?" * len(chunk))
+                rows += conn.execute(f"SELECT hash, neg, neu, pos, compound FROM scores WHERE model=? AND version=? AND hash IN ({marks})", [model, version] + chunk).fetchall()
+                conn.execute(f"UPDATE scores SET used_at=? WHERE model=? AND version=? AND hash IN ({marks})", [now, model, version] + chunk)
+        found = pd.DataFrame(rows, columns=["hash"] + ScoreCache.score_columns).set_index("hash")
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    def write(self, model:str, version:str, scores:pd.DataFrame):
+        """
+        Stores scores (indexed by headline hash with the columns neg, neu, pos and compound), evicts the least recently used ones if the cache is full
+        """
+        now = time.time()
+        rows = [(model, version, key) + tuple(float(value) for value in values) + (now,) for key, values in zip(scores.index, scores[ScoreCache.score_columns].itertuples(index=False))]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            size = conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+            if size > self.max_entries:
+                evict = size - int(self.max_entries * 0.9)
+                conn.execute("DELETE FROM scores WHERE rowid IN (SELECT rowid FROM scores ORDER BY used_at LIMIT ?)", (evict,))
+                with self._lock: self.evicted += evict
+
+    def size(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def stats(self) -> dict:
+        """
+        hits, misses, hit_rate (None without lookups), size and evicted
+        """
+        calls = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / calls if calls > 0 else None, "size": self.size(), "evicted": self.evicted}
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.max_entries, self.size())
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM scores")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # one connection per operation, so the cache can be used from several threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+class NewsArchive():
+    """
+    Persistent archive (SQLite) of the headlines of all tickers, the base of repeated analyses and of sentiment backtests.
+    The headlines of a ticker are deduplicated by link and by the hash of the headline (see headline_hash()),
+    the archive knows the newest headline and the last fetch of every ticker and source, so only newer headlines have to be fetched.
+
+    Attributes
+    ----------
+        self.path       : The file name of the SQLite data base
+        self.max_age    : Age after which the headlines of a ticker are fetched again
+    """
+
+    news_columns = ["Date", "Title", "Link", "Source", "Ticker"]
+
+    def __init__(self, path:str, max_age:timedelta = timedelta(minutes=15)):
+        self.path = path
+        self.max_age = max_age
+        if os.path.dirname(path) != "": os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS news (ticker TEXT, date TEXT, title TEXT, link TEXT, source TEXT, hash TEXT, archived_at TEXT, UNIQUE (ticker, link), UNIQUE (ticker, hash))")
+            conn.execute("CREATE INDEX IF NOT EXISTS news_ticker_date ON news (ticker, date)")
+            conn.execute("CREATE TABLE IF NOT EXISTS fetches (ticker TEXT, source TEXT, fetched_at TEXT, PRIMARY KEY (ticker, source))")
+
+    def write(self, ticker:str, news:pd.DataFrame, source:str, fetched_at:datetime = None) -> int:
+        """
+        Archives the headlines of ticker (columns Date, Title, Link, Source), known links and headlines are skipped,
+        and records the fetch from source
+
+        Returns
+        -------
+        int
+            Number of new headlines
+        """
+        if fetched_at is None: fetched_at = datetime.now()
+        dates = NewsArchive._dates(news["Date"]) if len(news) > 0 else []
+        rows = [(ticker, date, str(title), str(link), str(news_source), headline_hash(title), fetched_at.isoformat())
+                for date, title, link, news_source in zip(dates, news["Title"], news["Link"], news["Source"]) if date is not None]
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO news VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            added = conn.total_changes - before
+            conn.execute("INSERT OR REPLACE INTO fetches VALUES (?, ?, ?)", (ticker, source, fetched_at.isoformat()))
+        return added
+
+    def read(self, tickers:list = None, start = None, end = None, limit:int = None) -> pd.DataFrame:
+        """
+        The archived headlines (served from the index on ticker and date)
+
+        Parameters
+        ----------
+        tickers: list (optional)
+            default: None
+            Only these tickers, None for all
+        start: datetime (optional)
+            default: None
+            Only headlines from start on
+        end: datetime (optional)
+            default: None
+            Only headlines before end
+        limit: int (optional)
+            default: None
+            Only the newest limit headlines of every ticker
+
+        Returns
+        -------
+        pd.DataFrame
+            columns Date, Title, Link, Source, Ticker, ordered by ticker and date
+        """
+        conditions, parameters = [], []
+        if start is not None: conditions.append("date >= ?"); parameters.append(NewsArchive._date(start))
+        if end is not None: conditions.append("date < ?"); parameters.append(NewsArchive._date(end))
+        rows = []
+        with self._connect() as conn:
+            for ticker in (tickers if tickers is not None else [row[0] for row in conn.execute("SELECT DISTINCT ticker FROM news")]):
+                where = " AND ".join(["ticker = ?"] + conditions)
+                query = f"SELECT date, title, link, source, ticker FROM news WHERE {where} ORDER BY date DESC" + (" LIMIT ?" if limit is not None else "")
+                rows += reversed(conn.execute(query, [ticker] + parameters + ([limit] if limit is not None else [])).fetchall())
+        news = pd.DataFrame(rows, columns=NewsArchive.news_columns)
+        news["Date"] = pd.to_datetime(news["Date"])
+        return news
+
+    def changes(self, after:int = 0) -> tuple:
+        """
+        The headlines archived after the row id after (the row ids of the archive only grow), e.g. to update an index built from the archive
+
+        Returns
+        -------
+        tuple
+            (pd.DataFrame with the columns Date, Title, Ticker, hash (see headline_hash()); the last row id, after if there are no new headlines)
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT rowid, date, title, ticker, hash FROM news WHERE rowid > ? ORDER BY rowid", (after,)).fetchall()
+        news = pd.DataFrame([row[1:] for row in rows], columns=["Date", "Title", "Ticker", "hash"])
+        news["Date"] = pd.to_datetime(news["Date"])
+        return news, rows[-1][0] if len(rows) > 0 else after
+
+    def latest(self, ticker:str):
+        """
+        The date of the newest archived headline of ticker, None if there is none
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(date) FROM news WHERE ticker=?", (ticker,)).fetchone()
+        return pd.Timestamp(row[0]) if row[0] is not None else None
+
+    def is_fresh(self, ticker:str, source:str, now:datetime = None) -> bool:
+        """
+        True if the headlines of ticker were fetched from source within self.max_age
+        """
+        if now is None: now = datetime.now()
+        with self._connect() as conn:
+            row = conn.execute("SELECT fetched_at FROM fetches WHERE ticker=? AND source=?", (ticker, source)).fetchone()
+        return row is not None and now - datetime.fromisoformat(row[0]) <= self.max_age
+
+    def stats(self) -> dict:
+        """
+        Number of headlines and tickers, the first and the last date
+        """
+        with self._connect() as conn:
+            headlines, tickers, first, last = conn.execute("SELECT COUNT(*), COUNT(DISTINCT ticker), MIN(date), MAX(date) FROM news").fetchone()
+        return {"headlines": headlines, "tickers": tickers, "first": first, "last": last}
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # one connection per operation, so the archive can be used from several threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _dates(dates:pd.Series) -> list:
+        # timezone free ISO dates (sortable as text), None for invalid dates
+        dates = pd.to_datetime(dates, errors="coerce")
+        if getattr(dates.dt, "tz", None) is not None: dates = dates.dt.tz_localize(None)
+        return [None if pd.isna(date) else date.strftime("%Y-%m-%d %H:%M:%S") for date in dates]
+
+    @staticmethod
+    def _date(date) -> str:
+        return pd.Timestamp(date).strftime("%Y-%m-%d %H:%M:%S")
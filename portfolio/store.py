@@ -0,0 +1,127 @@
+import sqlite3
+import json
+import os
+import contextlib
+import pandas as pd
+from datetime import datetime, timedelta
+
+
+class MarketDataStore():
+    """
+    Persistent local store for market data (SQLite), keyed by symbol, interval and date.
+
+    Besides the bars the store records which date ranges were fetched (coverage) and when,
+    so missing date gaps can be computed and only these have to be fetched from the provider.
+    The most recent bars are provisional: a range ending within recent_days of its fetch day is only
+    trusted completely for max_age, afterwards the provisional tail is reported as gap again.
+
+    Attributes
+    ----------
+        self.path           : The file name of the SQLite data base
+        self.recent_days    : Number of days before the fetch day whose bars may still change
+        self.max_age        : Age after which provisional bars have to be fetched again
+        self.info_max_age   : Age after which ticker infos have to be fetched again
+    """
+
+    bar_columns = ["Open", "High", "Low", "Close", "Volume"]
+
+    def __init__(self, path:str, recent_days:int = 1, max_age:timedelta = timedelta(minutes=15), info_max_age:timedelta = timedelta(days=1)):
+        self.path = path
+        self.recent_days = recent_days
+        self.max_age = max_age
+        self.info_max_age = info_max_age
+        if os.path.dirname(path) != "": os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS bars (symbol TEXT, interval TEXT, date TEXT, open REAL, high REAL, low REAL, close REAL, volume REAL, PRIMARY KEY (symbol, interval, date))")
+            conn.execute("CREATE TABLE IF NOT EXISTS coverage (symbol TEXT, interval TEXT, start TEXT, end TEXT, fetched_at TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS coverage_symbol ON coverage (symbol, interval)")
+            conn.execute("CREATE TABLE IF NOT EXISTS info (symbol TEXT PRIMARY KEY, info TEXT, fetched_at TEXT)")
+
+    def read_history(self, symbol:str, start, end, interval:str = "1d") -> pd.DataFrame:
+        """
+        Read the stored bars of symbol in [start, end)
+
+        Returns
+        -------
+        Pandas dataframe with the columns Open, High, Low, Close, Volume and a (timezone free) DatetimeIndex "Date"
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT date, open, high, low, close, volume FROM bars WHERE symbol=? AND interval=? AND date>=? AND date<? ORDER BY date",
+                (symbol, interval, MarketDataStore._day(start), MarketDataStore._day(end))).fetchall()
+        df = pd.DataFrame(rows, columns=["Date"] + MarketDataStore.bar_columns)
+        df["Date"] = pd.to_datetime(df["Date"])
+        return df.set_index("Date")
+
+    def write_history(self, symbol:str, ticker_df:pd.DataFrame, start, end, interval:str = "1d", fetched_at:datetime = None):
+        """
+        Store the bars of ticker_df and record [start, end) as fetched (even if ticker_df has no rows for some days)
+        """
+        if fetched_at is None: fetched_at = datetime.now()
+        index = ticker_df.index.tz_localize(None) if getattr(ticker_df.index, "tz", None) is not None else ticker_df.index
+        bars = ticker_df.reindex(columns=MarketDataStore.bar_columns).astype(float)
+        rows = [(symbol, interval, MarketDataStore._day(day)) + tuple(None if pd.isna(v) else v for v in values) for day, values in zip(index, bars.itertuples(index=False))]
+        start, end = MarketDataStore._day(start), MarketDataStore._day(end)
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("DELETE FROM coverage WHERE symbol=? AND interval=? AND start>=? AND end<=?", (symbol, interval, start, end))
+            conn.execute("INSERT INTO coverage VALUES (?, ?, ?, ?, ?)", (symbol, interval, start, end, fetched_at.isoformat()))
+
+    def history_gaps(self, symbol:str, start, end, interval:str = "1d", now:datetime = None) -> list:
+        """
+        The date ranges in [start, end) which are not (or only provisionally and too long ago) fetched
+
+        Returns
+        -------
+        list of (start, end) tuples of pd.Timestamp, end exclusive
+        """
+        if now is None: now = datetime.now()
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT start, end, fetched_at FROM coverage WHERE symbol=? AND interval=? AND end>? AND start<?",
+                                (symbol, interval, MarketDataStore._day(start), MarketDataStore._day(end))).fetchall()
+        covered = []
+        for cov_start, cov_end, fetched_at in rows:
+            cov_start, cov_end, fetched_at = pd.Timestamp(cov_start), pd.Timestamp(cov_end), pd.Timestamp(fetched_at)
+            final_end = fetched_at.normalize() - pd.Timedelta(days=self.recent_days)
+            if cov_end > final_end and now - fetched_at > self.max_age:
+                cov_end = final_end
+            if cov_end > cov_start: covered.append((cov_start, cov_end))
+
+        gaps, cursor = [], start
+        for cov_start, cov_end in sorted(covered):
+            if cov_start > cursor: gaps.append((cursor, min(cov_start, end)))
+            cursor = max(cursor, cov_end)
+            if cursor >= end: break
+        if cursor < end: gaps.append((cursor, end))
+        return gaps
+
+    def read_info(self, symbol:str, now:datetime = None):
+        """
+        The stored ticker info of symbol or None if there is none or it is older than self.info_max_age
+        """
+        if now is None: now = datetime.now()
+        with self._connect() as conn:
+            row = conn.execute("SELECT info, fetched_at FROM info WHERE symbol=?", (symbol,)).fetchone()
+        if row is None or now - datetime.fromisoformat(row[1]) > self.info_max_age:
+            return None
+        return json.loads(row[0])
+
+    def write_info(self, symbol:str, info:dict, fetched_at:datetime = None):
+        if fetched_at is None: fetched_at = datetime.now()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO info VALUES (?, ?, ?)", (symbol, json.dumps(info, default=str), fetched_at.isoformat()))
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # one connection per operation, so the store can be used from several threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _day(date) -> str:
+        return pd.Timestamp(date).strftime("%Y-%m-%d")
@@ -0,0 +1,452 @@
+import copy
+import collections
+import numpy as np
+import pandas as pd
+
+# --------------------------------------------------------
+# streaming (online) technical indicators
+# every indicator takes one new bar in O(1) with update(), its state is a JSON serializable dict (state(), from_state()).
+# prime() sets the state from a history in one vectorized pass, the results match the batch versions in indicators.py
+# -------------------------------
+class StreamingIndicator():
+    """
+    Base class of the streaming indicators
+
+    Attributes
+    ----------
+        self.params     : The names of the constructor arguments, they are part of the state
+    """
+
+    params = []
+
+    def update(self, *values):
+        """
+        Takes one new bar and returns the current indicator value(s)
+        """
+        raise NotImplementedError
+
+    def update_many(self, *values) -> np.ndarray:
+        """
+        Takes a small batch of bars (one array per input) and returns the indicator value(s) of every bar
+        """
+        return np.array([self.update(*bar) for bar in zip(*values)], dtype=np.float64)
+
+    def prime(self, *values):
+        """
+        Sets the state as if all bars of the history (one array per input) had been passed to update(), returns self
+        """
+        for bar in zip(*values): self.update(*bar)
+        return self
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def state(self) -> dict:
+        """
+        The complete state as JSON serializable dict
+        """
+        return {"type": type(self).__name__, "params": {param: getattr(self, param) for param in self.params}, "state": self._get_state()}
+
+    @staticmethod
+    def from_state(state:dict):
+        """
+        Restores an indicator from state()
+        """
+        indicator = streaming_indicators[state["type"]](**state["params"])
+        indicator._set_state(state["state"])
+        return indicator
+
+    def _get_state(self) -> dict:
+        return {}
+
+    def _set_state(self, state:dict):
+        pass
+
+
+class _Window():
+    # the last values of a rolling window with a compensated (Kahan) running sum, NaN values are not counted.
+    # like pandas a window of equal values has the exact sum value * nobs
+    def __init__(self, window:int):
+        self.window = window
+        self.values = collections.deque()
+        self.reset()
+
+    def reset(self):
+        self.values.clear()
+        self.sum, self.compensation, self.nobs = 0.0, 0.0, 0
+        self.last, self.same = np.nan, 0
+
+    def add(self, value:float):
+        self.values.append(value)
+        if value == value:
+            self.same = self.same + 1 if value == self.last else 1
+            self.last = value
+            self._add(value, 1)
+        if len(self.values) > self.window:
+            removed = self.values.popleft()
+            if removed == removed: self._add(-removed, -1)
+
+    def _add(self, value:float, count:int):
+        self.nobs += count
+        if self.nobs == 0:
+            self.sum, self.compensation = 0.0, 0.0
+            return
+        y = value - self.compensation
+        t = self.sum + y
+        self.compensation = (t - self.sum) - y
+        self.sum = t
+
+    def total(self) -> float:
+        return self.last * self.nobs if self.nobs > 0 and self.same >= self.nobs else self.sum
+
+    def prime(self, values:np.ndarray):
+        self.reset()
+        for value in values[-self.window:]: self.add(float(value))
+
+    def get_state(self) -> dict:
+        return {"values": [None if value != value else value for value in self.values]}
+
+    def set_state(self, state:dict):
+        self.reset()
+        for value in state["values"]: self.add(np.nan if value is None else value)
+
+
+def _ratio_index(gain:float, loss:float) -> float:
+    # 1 - 1 / (1 + gain / loss) with the float semantics of numpy (division by zero gives inf or nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return float(1 - 1 / (1 + np.float64(gain) / np.float64(loss)))
+
+
+class SMA(StreamingIndicator):
+    """
+    Simple moving average over window values, NaN until the window holds window valid values (like rolling(window).mean())
+    """
+
+    params = ["window"]
+
+    def __init__(self, window:int):
+        self.window = window
+        self._values = _Window(window)
+
+    def update(self, value:float) -> float:
+        self._values.add(float(value))
+        return self._values.total() / self._values.nobs if self._values.nobs >= self.window else np.nan
+
+    def prime(self, values):
+        self._values.prime(np.asarray(values, dtype=np.float64))
+        return self
+
+    def _get_state(self):
+        return self._values.get_state()
+
+    def _set_state(self, state):
+        self._values.set_state(state)
+
+
+class RollingStd(StreamingIndicator):
+    """
+    Rolling sample standard deviation (ddof=1) over window values (like rolling(window).std()), updated with Welford's algorithm
+    """
+
+    params = ["window"]
+
+    def __init__(self, window:int):
+        self.window = window
+        self._values = collections.deque()
+        self._nobs, self._mean, self._ssqdm = 0, 0.0, 0.0
+        # number of equal values at the end of the window, a window of equal values has exactly std 0
+        self._last, self._same = np.nan, 0
+
+    def update(self, value:float) -> float:
+        value = float(value)
+        self._values.append(value)
+        if value == value:
+            self._same = self._same + 1 if value == self._last else 1
+            self._last = value
+            self._add(value)
+        if len(self._values) > self.window:
+            removed = self._values.popleft()
+            if removed == removed: self._remove(removed)
+        return self._result()
+
+    def _add(self, value:float):
+        self._nobs += 1
+        delta = value - self._mean
+        self._mean += delta / self._nobs
+        self._ssqdm += (self._nobs - 1) * delta * delta / self._nobs
+
+    def _remove(self, value:float):
+        self._nobs -= 1
+        if self._nobs == 0:
+            self._mean, self._ssqdm = 0.0, 0.0
+            return
+        delta = value - self._mean
+        self._mean -= delta / self._nobs
+        self._ssqdm -= (self._nobs + 1) * delta * delta / self._nobs
+
+    def _result(self) -> float:
+        if self._nobs < self.window or self._nobs < 2: return np.nan
+        if self._same >= self._nobs or self._ssqdm <= 0: return 0.0
+        return float(np.sqrt(self._ssqdm / (self._nobs - 1)))
+
+    def prime(self, values):
+        self._set_state({"values": [float(value) for value in np.asarray(values, dtype=np.float64)[-self.window:]]})
+        return self
+
+    def _get_state(self):
+        return {"values": [None if value != value else value for value in self._values]}
+
+    def _set_state(self, state):
+        self._values.clear()
+        self._nobs, self._mean, self._ssqdm, self._last, self._same = 0, 0.0, 0.0, np.nan, 0
+        for value in state["values"]: self.update(np.nan if value is None else value)
+
+
+class EMA(StreamingIndicator):
+    """
+    Exponential moving average with span (like ewm(span=span, adjust=adjust).mean(), NaN values are skipped but decay the weights)
+    """
+
+    params = ["span", "adjust"]
+
+    def __init__(self, span:float, adjust:bool = True):
+        self.span = span
+        self.adjust = adjust
+        self._alpha = 2 / (span + 1)
+        self._weighted, self._old_wt = np.nan, 1.0
+
+    def update(self, value:float) -> float:
+        value = float(value)
+        observed = value == value
+        new_wt = 1.0 if self.adjust else self._alpha
+        if self._weighted == self._weighted:
+            self._old_wt *= 1 - self._alpha
+            if observed:
+                if self._weighted != value:
+                    self._weighted = (self._old_wt * self._weighted + new_wt * value) / (self._old_wt + new_wt)
+                self._old_wt = self._old_wt + new_wt if self.adjust else 1.0
+        elif observed:
+            self._weighted, self._old_wt = value, 1.0
+        return self._weighted
+
+    def prime(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        observed = np.flatnonzero(~np.isnan(values))
+        if len(observed) == 0:
+            self._weighted, self._old_wt = np.nan, 1.0
+            return self
+        self._weighted = float(pd.Series(values).ewm(span=self.span, adjust=self.adjust).mean().iloc[-1])
+        # the weight of the old values: every row decays it, every observed value adds its weight
+        decay = (1 - self._alpha) ** (len(values) - 1 - observed)
+        self._old_wt = float(decay.sum()) if self.adjust else float(decay[-1])
+        return self
+
+    def _get_state(self):
+        return {"weighted": None if self._weighted != self._weighted else self._weighted, "old_wt": self._old_wt}
+
+    def _set_state(self, state):
+        self._weighted = np.nan if state["weighted"] is None else state["weighted"]
+        self._old_wt = state["old_wt"]
+
+
+class Bollinger(StreamingIndicator):
+    """
+    Upper and lower Bollinger band: sma +/- width * std over window values
+    """
+
+    params = ["window", "width"]
+
+    def __init__(self, window:int, width:float = 2):
+        self.window = window
+        self.width = width
+        self._sma, self._std = SMA(window), RollingStd(window)
+
+    def update(self, value:float):
+        mean, deviation = self._sma.update(value), self._std.update(value)
+        return mean + self.width * deviation, mean - self.width * deviation
+
+    def prime(self, values):
+        self._sma.prime(values)
+        self._std.prime(values)
+        return self
+
+    def _get_state(self):
+        return {"sma": self._sma._get_state(), "std": self._std._get_state()}
+
+    def _set_state(self, state):
+        self._sma._set_state(state["sma"])
+        self._std._set_state(state["std"])
+
+
+class RSI(StreamingIndicator):
+    """
+    Relative strength index (0..1) of the mean gain and loss over window closes (see indicators.rsi())
+    """
+
+    params = ["window"]
+
+    def __init__(self, window:int):
+        self.window = window
+        self._previous = np.nan
+        self._gain, self._loss = SMA(window), SMA(window)
+
+    def update(self, close:float) -> float:
+        delta = float(close) - self._previous
+        self._previous = float(close)
+        gain = self._gain.update(delta if delta > 0 else 0.0)
+        loss = self._loss.update(-delta if delta < 0 else 0.0)
+        return _ratio_index(gain, loss)
+
+    def prime(self, closes):
+        closes = np.asarray(closes, dtype=np.float64)
+        if len(closes) == 0: return self
+        delta = np.diff(closes, prepend=np.nan)
+        self._gain.prime(np.where(delta > 0, delta, 0))
+        self._loss.prime(np.where(delta < 0, -delta, 0))
+        self._previous = float(closes[-1])
+        return self
+
+    def _get_state(self):
+        return {"previous": None if self._previous != self._previous else self._previous, "gain": self._gain._get_state(), "loss": self._loss._get_state()}
+
+    def _set_state(self, state):
+        self._previous = np.nan if state["previous"] is None else state["previous"]
+        self._gain._set_state(state["gain"])
+        self._loss._set_state(state["loss"])
+
+
+class MACD(StreamingIndicator):
+    """
+    macd line, signal line and histogram (see indicators.macd())
+    """
+
+    params = ["interval_1", "interval_2", "interval_3"]
+
+    def __init__(self, interval_1:int = 12, interval_2:int = 26, interval_3:int = 9):
+        self.interval_1, self.interval_2, self.interval_3 = interval_1, interval_2, interval_3
+        self._ema_1, self._ema_2 = EMA(interval_1, adjust=False), EMA(interval_2, adjust=False)
+        self._signal = EMA(interval_3, adjust=False)
+
+    def update(self, close:float):
+        line = self._ema_1.update(close) - self._ema_2.update(close)
+        signal_line = self._signal.update(line)
+        return line, signal_line, line - signal_line
+
+    def prime(self, closes):
+        closes = pd.Series(np.asarray(closes, dtype=np.float64))
+        self._ema_1.prime(closes)
+        self._ema_2.prime(closes)
+        line = closes.ewm(span=self.interval_1, adjust=False).mean() - closes.ewm(span=self.interval_2, adjust=False).mean()
+        self._signal.prime(line)
+        return self
+
+    def _get_state(self):
+        return {"ema_1": self._ema_1._get_state(), "ema_2": self._ema_2._get_state(), "signal": self._signal._get_state()}
+
+    def _set_state(self, state):
+        self._ema_1._set_state(state["ema_1"])
+        self._ema_2._set_state(state["ema_2"])
+        self._signal._set_state(state["signal"])
+
+
+class MFI(StreamingIndicator):
+    """
+    Money flow index (0..1) over window bars (see indicators.mfi())
+    """
+
+    params = ["window"]
+
+    def __init__(self, window:int = 14):
+        self.window = window
+        self._previous = np.nan
+        self._positive, self._negative = _Window(window), _Window(window)
+
+    def update(self, high:float, low:float, close:float, volume:float) -> float:
+        typical_price = (float(high) + float(low) + float(close)) / 3
+        signed_mf = typical_price * float(volume) * (1 if typical_price > self._previous else -1)
+        self._previous = typical_price
+        self._positive.add(signed_mf if signed_mf > 0 else 0.0)
+        self._negative.add(-signed_mf if signed_mf < 0 else 0.0)
+        return _ratio_index(self._positive.total(), self._negative.total())
+
+    def prime(self, high, low, close, volume):
+        typical_price = (np.asarray(high, dtype=np.float64) + np.asarray(low, dtype=np.float64) + np.asarray(close, dtype=np.float64)) / 3
+        if len(typical_price) == 0: return self
+        previous = np.concatenate([[np.nan], typical_price[:-1]])
+        signed_mf = typical_price * np.asarray(volume, dtype=np.float64) * np.where(typical_price > previous, 1, -1)
+        self._positive.prime(np.where(signed_mf > 0, signed_mf, 0))
+        self._negative.prime(np.where(signed_mf < 0, -signed_mf, 0))
+        self._previous = float(typical_price[-1])
+        return self
+
+    def _get_state(self):
+        return {"previous": None if self._previous != self._previous else self._previous, "positive": self._positive.get_state(), "negative": self._negative.get_state()}
+
+    def _set_state(self, state):
+        self._previous = np.nan if state["previous"] is None else state["previous"]
+        self._positive.set_state(state["positive"])
+        self._negative.set_state(state["negative"])
+
+
+class PortfolioIndicators(StreamingIndicator):
+    """
+    The portfolio tech indicators of Portfolio.get_portfolio_tech_indicators() from the daily close and price (invested capital)
+
+    Attributes
+    ----------
+        self.interval   : The window of the indicators
+        self.end        : The date of the last bar passed to update() or prime()
+    """
+
+    params = ["interval"]
+    names = ['win', 'sma', 'ema', 'std', 'bb_upper', 'bb_lower', 'perf', 'perf_sma', 'perf_ema', 'perf_std', 'perf_bb_upper', 'perf_bb_lower', 'rsi', 'macd', 'signal_line', 'histogram']
+
+    def __init__(self, interval:int):
+        self.interval = interval
+        self.end = None
+        self._close = {"sma": SMA(interval), "ema": EMA(interval), "std": RollingStd(interval), "rsi": RSI(interval), "macd": MACD()}
+        self._perf = {"sma": SMA(interval), "ema": EMA(interval), "std": RollingStd(interval)}
+
+    def update(self, close:float, price:float, date = None) -> dict:
+        """
+        Takes the close and price of the next day and returns the indicators (names) of this day
+        """
+        win = float(close) - float(price)
+        perf = _ratio(win, price)
+        values = {"win": win, "perf": perf}
+        for prefix, value, kernels in [("", close, self._close), ("perf_", perf, self._perf)]:
+            for name in ["sma", "ema", "std"]:
+                values[prefix + name] = kernels[name].update(value)
+            values[prefix + "bb_upper"] = values[prefix + "sma"] + 2 * values[prefix + "std"]
+            values[prefix + "bb_lower"] = values[prefix + "sma"] - 2 * values[prefix + "std"]
+        values["rsi"] = self._close["rsi"].update(close)
+        values["macd"], values["signal_line"], values["histogram"] = self._close["macd"].update(close)
+        if date is not None: self.end = pd.Timestamp(date)
+        return {name: values[name] for name in PortfolioIndicators.names}
+
+    def prime(self, close, price, end = None):
+        close, price = np.asarray(close, dtype=np.float64), np.asarray(price, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            perf = (close - price) / price
+        for kernels, values in [(self._close, close), (self._perf, perf)]:
+            for kernel in kernels.values(): kernel.prime(values)
+        self.end = pd.Timestamp(end) if end is not None else None
+        return self
+
+    def _get_state(self):
+        return {"end": None if self.end is None else self.end.isoformat(),
+                "close": {name: kernel.state() for name, kernel in self._close.items()},
+                "perf": {name: kernel.state() for name, kernel in self._perf.items()}}
+
+    def _set_state(self, state):
+        self.end = None if state["end"] is None else pd.Timestamp(state["end"])
+        self._close = {name: StreamingIndicator.from_state(kernel) for name, kernel in state["close"].items()}
+        self._perf = {name: StreamingIndicator.from_state(kernel) for name, kernel in state["perf"].items()}
+
+
+def _ratio(numerator:float, denominator:float) -> float:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return float(np.float64(numerator) / np.float64(denominator))
+
+
+streaming_indicators = {indicator.__name__: indicator for indicator in [SMA, RollingStd, EMA, Bollinger, RSI, MACD, MFI, PortfolioIndicators]}
@@ -1,6 +1,212 @@
 import functools
-import yfinance as yf
-from datetime import datetime
+import os
+import time
+import threading
+import logging
+import concurrent.futures
+import pandas as pd
+from datetime import datetime, timedelta
+from .store import MarketDataStore
+from .provider import MarketDataProvider, provider_from_env
+from . import metrics
+
+# --------------------------------------------------------
+# concurrent, rate limited fetching
+# -------------------------------
+class TokenBucket():
+    """
+    Thread safe token bucket rate limiter: rate tokens per second, at most capacity tokens in the bucket
+    """
+
+    def __init__(self, rate:float, capacity:int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, blocks until a token is available
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class FetchScheduler():
+    """
+    Runs fetch calls on a bounded thread pool with a token bucket rate limit, retries with exponential backoff 
+    and a timeout per request. The results are returned in the order of the requests.
+
+    Attributes
+    ----------
+        self.max_workers    : Number of concurrent requests
+        self.rate           : Requests per second (token bucket rate)
+        self.burst          : Requests which may be started at once (token bucket capacity)
+        self.retries        : Number of retries after a failed request
+        self.backoff        : Wait time before the first retry in seconds, doubled with every retry
+        self.timeout        : Time in seconds to wait for the result of one request (including its retries) from its start
+    """
+
+    def __init__(self, max_workers:int = 8, rate:float = 10.0, burst:int = 10, retries:int = 2, backoff:float = 0.5, timeout:float = 60.0):
+        self.max_workers = max_workers
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._bucket = TokenBucket(rate, burst)
+
+    def map(self, func, items:list, return_exceptions:bool = False, timeout:float = None) -> list:
+        """
+        Calls func(item) for all items concurrently
+
+        Parameters
+        ----------
+        func: callable
+            The fetch function, called with one item
+        items: list
+            The arguments of the requests
+        return_exceptions: bool
+            default: False
+            If True the exception of a failed request is returned in place of its result, 
+            otherwise the first exception (in the order of items) is raised after all requests are done
+        timeout: float (optional)
+            default: None
+            Time in seconds to wait for each request from its start (requests waiting for a worker or the rate limit do not time out),
+            None for self.timeout
+
+        Returns
+        -------
+        list of results in the order of items
+        """
+        items = list(items)
+        if len(items) == 0: return []
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(items)))
+        started = {}
+        try:
+            futures = [executor.submit(self._call, func, item, started, i) for i, item in enumerate(items)]
+            if timeout is None: timeout = self.timeout
+            results = []
+            for i, (item, future) in enumerate(zip(items, futures)):
+                try:
+                    # each request has its own deadline from its start, a large batch waiting for the rate limit does not time out
+                    results.append(self._result(future, started, i, timeout))
+                except Exception as e:
+                    if isinstance(e, concurrent.futures.TimeoutError): e = TimeoutError(f"request {item} timed out after {timeout}s")
+                    logging.error(f"FetchScheduler: request {item} failed: {e}")
+                    results.append(e)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, Exception): raise result
+        return results
+
+    @staticmethod
+    def _result(future, started:dict, index:int, timeout:float):
+        # waits until the request index is done, at most timeout seconds after its start
+        while True:
+            start = started.get(index)
+            try:
+                return future.result(timeout=max(0.0, (start if start is not None else time.monotonic()) + timeout - time.monotonic()))
+            except concurrent.futures.TimeoutError:
+                # a request which was still waiting for a worker gets its full timeout once it is started
+                if started.get(index) is not None and started[index] + timeout <= time.monotonic(): raise
+
+    def _call(self, func, item, started:dict = None, index:int = None):
+        for attempt in range(self.retries + 1):
+            self._bucket.acquire()
+            # the request starts with its first token, the wait for the rate limit does not count
+            if started is not None and attempt == 0: started[index] = time.monotonic()
+            try:
+                return func(item)
+            except Exception as e:
+                if attempt == self.retries: raise
+                wait = self.backoff * 2 ** attempt
+                logging.warning(f"FetchScheduler: request {item} failed ({e}), retry in {wait}s")
+                time.sleep(wait)
+
+_scheduler = FetchScheduler()
+
+def _get_scheduler():
+    """
+    The fetch scheduler used for all downloads
+    """
+    return _scheduler
+
+def _set_scheduler(scheduler:FetchScheduler):
+    """
+    Replace the fetch scheduler used for all downloads
+    """
+    global _scheduler
+    _scheduler = scheduler
+
+# --------------------------------------------------------
+# market data provider (see provider.py)
+# set PORTFOLIO_REPLAY to a directory of recordings to run offline (see provider_from_env())
+# -------------------------------
+_provider = provider_from_env()
+
+def _get_provider():
+    """
+    The market data provider used for all downloads
+    """
+    return _provider
+
+def _set_provider(provider:MarketDataProvider):
+    """
+    Replace the market data provider used for all downloads, clears the in-process caches
+    """
+    global _provider
+    _provider = provider
+    for func in [_get_rates, _get_history_ticker, _get_history_tickers, _get_ticker_info]:
+        func.cache_clear()
+
+# --------------------------------------------------------
+# persistent market data store
+# set PORTFOLIO_CACHE to the file name of the SQLite data base, an empty string disables the store
+# the staleness of the cached data is set with PORTFOLIO_CACHE_RECENT_DAYS, PORTFOLIO_CACHE_MAX_AGE and PORTFOLIO_CACHE_INFO_MAX_AGE (see _store_options())
+# -------------------------------
+_store = None
+_store_path = os.environ.get("PORTFOLIO_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "portfolio", "market_data.sqlite"))
+
+def _get_store():
+    """
+    The persistent market data store or None if disabled
+    """
+    global _store
+    if _store is None and _store_path != "":
+        _store = MarketDataStore(_store_path, **_store_options())
+    return _store
+
+def _store_options():
+    """
+    The staleness settings of the store from the environment: PORTFOLIO_CACHE_RECENT_DAYS (days before the fetch day whose bars may 
+    still change, default 1), PORTFOLIO_CACHE_MAX_AGE (minutes after which these bars are fetched again, default 15) and 
+    PORTFOLIO_CACHE_INFO_MAX_AGE (hours after which the ticker infos are fetched again, default 24)
+    """
+    return {"recent_days": int(os.environ.get("PORTFOLIO_CACHE_RECENT_DAYS", "1")),
+            "max_age": timedelta(minutes=float(os.environ.get("PORTFOLIO_CACHE_MAX_AGE", "15"))),
+            "info_max_age": timedelta(hours=float(os.environ.get("PORTFOLIO_CACHE_INFO_MAX_AGE", "24")))}
+
+def _set_store(store:MarketDataStore):
+    """
+    Replace the persistent market data store (None disables it), clears the in-process caches
+    """
+    global _store, _store_path
+    _store = store
+    _store_path = store.path if store is not None else ""
+    for func in [_get_rates, _get_history_ticker, _get_history_tickers, _get_ticker_info]:
+        func.cache_clear()
 
 # --------------------------------------------------------
 # collection of cached functions to reduce traffic with yf
@@ -15,42 +221,156 @@ def _get_rates(rates_symbols, start:datetime, end:datetime):
         rates_symbols: str
             string in the form "USDEUR=X, EURUSD=X"
         start: datetime
-            start date of the search 
+            start date of the search
         end: datetime
-            end date of the search 
-        
+            end date of the search
+
     Return
     ------
         Pandas dataframe with currency exchange rates
     """
-    tickers = yf.Tickers(rates_symbols)
-    _rates = []
-    for i in tickers.tickers: 
-        _rates.append(tickers.tickers[i].history(start=start, end=end, period="1d").Close)
-    return _rates
+    symbols = rates_symbols.replace(",", " ").split()
+    ticker_dfs = _history(symbols, start, end, download=_download_rates)
+    return [ticker_dfs[symbol].Close for symbol in symbols]
 
 @functools.cache
 def _get_history_ticker(symbol, start:datetime, end:datetime):
     """
     tbd
     """
-    ticker = _get_ticker(symbol)
-    ticker_df = ticker.history(start=start, end=end)
-    return ticker_df, ticker.info["currency"]
+    return _history([symbol], start, end)[symbol], _get_ticker_info(symbol)["currency"]
 
 @functools.cache
-def _get_ticker_info(symbol):
+def _get_history_tickers(symbols:tuple, start:datetime, end:datetime):
     """
-    tbd
+    Get the daily history of several tickers, the missing data is fetched concurrently
+
+    Attributes
+    ----------
+        symbols: tuple
+            the ticker symbols, e.g. ("MSFT", "NVDA")
+        start: datetime or tuple
+            start date of the search, or a tuple with the start date of each symbol
+        end: datetime
+            end date of the search (exclusive)
+
+    Return
+    ------
+        dict symbol -> Pandas dataframe with the columns Open, High, Low, Close, Volume
     """
-    ticker = _get_ticker(symbol)
-    return ticker.info
+    return _history(list(symbols), start, end)
 
 @functools.cache
-def _get_ticker(symbol):
+def _get_ticker_info(symbol):
     """
     tbd
     """
-    ticker = yf.Ticker(symbol)
-    return ticker
-    
\ No newline at end of file
+    store = _get_store()
+    info = store.read_info(symbol) if store is not None else None
+    if info is None:
+        info = _download_info(symbol)
+        metrics.count("provider.info.calls")
+        if store is not None: store.write_info(symbol, info)
+    return info
+
+# hits and misses of the caches are part of the metrics report
+for cached in [_get_rates, _get_history_ticker, _get_history_tickers, _get_ticker_info]:
+    metrics.register_cache(cached.__name__, cached)
+
+# --------------------------------------------------------
+# reading through the store, only missing date gaps are downloaded
+# -------------------------------
+def _history(symbols:list, start:datetime, end:datetime, download = None):
+    """
+    Daily history of symbols in [start, end), read from the persistent store (if enabled) after the missing gaps are fetched.
+    start is one date for all symbols or a tuple with the start date of each symbol, every gap is one request on the fetch scheduler.
+    download(symbol, start, end) fetches one gap, default _download_ticker_history (_download_rates for exchange rates)
+    """
+    if download is None: download = _download_ticker_history
+    starts = _starts(symbols, start)
+    store = _get_store()
+    if store is None:
+        return _download_history(symbols, start, end, download=download)
+    requests = [(symbol, gap_start, gap_end) for symbol in symbols for gap_start, gap_end in store.history_gaps(symbol, starts[symbol], end)]
+    metrics.count("store.history.reads", len(symbols))
+    metrics.count("store.history.gaps", len(requests))
+    with metrics.span("provider.history"):
+        results = _get_scheduler().map(lambda request: download(*request), requests, return_exceptions=True)
+    _count_downloads(results)
+    for (symbol, gap_start, gap_end), ticker_df in zip(requests, results):
+        # failed requests are not stored, so they are fetched again next time
+        if not isinstance(ticker_df, Exception):
+            store.write_history(symbol, ticker_df, gap_start, gap_end)
+    return {symbol: store.read_history(symbol, starts[symbol], end) for symbol in symbols}
+
+def _starts(symbols:list, start) -> dict:
+    # symbol -> start date, start is one date for all symbols or a tuple with one date per symbol
+    return dict(zip(symbols, start)) if isinstance(start, tuple) else {symbol: start for symbol in symbols}
+
+# --------------------------------------------------------
+# network access through the provider
+# -------------------------------
+def _download_history(symbols:list, start:datetime, end:datetime, download = None):
+    """
+    Download the daily history of symbols (from start, one date or a tuple with the start date of each symbol) concurrently on the fetch scheduler.
+    Returns dict symbol -> Pandas dataframe with the columns Open, High, Low, Close, Volume (empty if the download failed)
+    """
+    if download is None: download = _download_ticker_history
+    starts = _starts(symbols, start)
+    with metrics.span("provider.history"):
+        results = _get_scheduler().map(lambda symbol: download(symbol, starts[symbol], end), symbols, return_exceptions=True)
+    _count_downloads(results)
+    empty = pd.DataFrame(columns=MarketDataStore.bar_columns, index=pd.DatetimeIndex([]))
+    return {symbol: empty if isinstance(ticker_df, Exception) else ticker_df for symbol, ticker_df in zip(symbols, results)}
+
+def _download_ticker_history(symbol:str, start:datetime, end:datetime):
+    """
+    Download the daily history of one symbol, raises an exception if the download fails
+    """
+    ticker_df = _get_provider().history(symbol, start, end)
+    return ticker_df[MarketDataStore.bar_columns]
+
+def _count_downloads(results:list):
+    # provider calls, failures and downloaded bytes (in memory) of the history downloads
+    if not metrics.enabled(): return
+    failed = [result for result in results if isinstance(result, Exception)]
+    metrics.count("provider.history.calls", len(results))
+    metrics.count("provider.history.failed", len(failed))
+    metrics.count("provider.history.bytes", sum(int(result.memory_usage(index=True).sum()) for result in results if not isinstance(result, Exception)))
+
+def _download_infos(symbols:list):
+    """
+    Download the ticker infos of symbols concurrently, returns a list of infos in the order of symbols.
+    The info of a symbol which failed is an empty dict (no currency), the failures are logged
+    """
+    results = _get_scheduler().map(_get_ticker_info, symbols, return_exceptions=True)
+    failed = [symbol for symbol, result in zip(symbols, results) if isinstance(result, Exception)]
+    if len(failed) > 0: logging.error(f"no ticker info of {len(failed)} symbols (not valued): {failed}")
+    return [{} if isinstance(result, Exception) else result for result in results]
+
+def _download_rates(symbol:str, start:datetime, end:datetime):
+    """
+    Download the daily exchange rates of a pair like "EURUSD=X" with the fx() of the provider, as bars with the rate as Close
+    """
+    rates = _get_provider().fx(symbol[:3], symbol[3:6], start, end)
+    return rates.rename("Close").to_frame().reindex(columns=MarketDataStore.bar_columns)
+
+def _download_info(symbol):
+    """
+    Download the ticker info of symbol
+    """
+    return _get_provider().info(symbol)
+
+def _download_news(symbol):
+    """
+    Download the latest headlines of symbol (columns Date, Title, Link, Source)
+    """
+    metrics.count("provider.news.calls")
+    return _get_provider().news(symbol)
+
+def _download_quote(symbol):
+    """
+    Download the latest intraday price of symbol, None if there is none
+    """
+    metrics.count("provider.quote.calls")
+    return _get_provider().quote(symbol)
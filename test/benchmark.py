@@ -0,0 +1,323 @@
+"""
+Offline benchmark of the portfolio pipeline.
+
+A synthetic transaction book (number of trades, symbols, currencies and years) is generated and the market data
+is served by a deterministic stub in place of the network access of portfolio/ticker.py, so the benchmark runs without Yahoo
+and every run computes exactly the same data. Time and peak memory (tracemalloc) of every step are written as JSON
+and compared with a stored baseline.
+
+Usage
+-----
+    python benchmark.py                                     # all scenarios, results in benchmark.json
+    python benchmark.py --scenarios small,medium
+    python benchmark.py --save-baseline benchmark.baseline.json
+    python benchmark.py --baseline benchmark.baseline.json  # exit code 1 if a step is slower or needs more memory than the tolerance
+
+The cold import time of the modules a script or the dashboard starts with is checked against import_budgets as well (exit code 1 if exceeded).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import portfolio
+import portfolio.ticker as ticker
+from portfolio import metrics
+from portfolio.fx import FXMatrix
+from portfolio.provider import MarketDataProvider
+from portfolio.presentation import Figure
+
+# --------------------------------------------------------
+# scenarios: size of the synthetic book
+# -------------------------------
+scenarios = {
+    "small":  {"trades": 200,    "symbols": 10,  "currencies": 2, "years": 3},
+    "medium": {"trades": 5_000,  "symbols": 50,  "currencies": 3, "years": 10},
+    "large":  {"trades": 50_000, "symbols": 200, "currencies": 4, "years": 20},
+}
+currencies = ["USD", "EUR", "GBp", "JPY", "CHF", "CAD"]
+# value of one unit in USD, the level of the stub exchange rates and of the quotes (a GBp stock quotes in pence)
+currency_levels = {"USD": 1.0, "EUR": 1.1, "GBP": 1.3, "GBp": 0.013, "JPY": 0.008, "CHF": 1.05, "CAD": 0.75}
+end_date = "2025-12-31"
+# cold import time (seconds) allowed for the modules, the heavy dependencies must only be imported by the features using them
+import_budgets = {"portfolio": 1.0, "portfolio.presentation": 1.0, "portfolio.sentiment": 1.0, "portfolio.ai": 1.0, "portfolio.batch": 1.0}
+heavy_modules = ["prophet", "yfinance", "plotly", "transformers", "torch", "nltk", "crawl4ai", "finvizfinance", "openai", "ollama", "matplotlib"]
+
+
+class StubMarketData(MarketDataProvider):
+    """
+    Deterministic market data provider in place of yfinance: a random walk per symbol (seeded by the symbol) on business days.
+    Every exchange rate is the ratio of two USD series (one per currency, minor units derived from their major currency),
+    so "EURUSD=X" is 1 / "USDEUR=X" and triangulated rates are consistent.
+    install() makes it the provider of portfolio/ticker.py, everything above it (caches, scheduler, FX matrix) runs unchanged.
+
+    Attributes
+    ----------
+        self.currencies : dict symbol -> currency of the symbol
+        self.seed       : Seed of all series
+    """
+
+    name = "stub"
+    days = pd.bdate_range("1990-01-01", "2040-12-31", tz="America/New_York")
+
+    def __init__(self, currencies:dict, seed:int = 0):
+        self.currencies = currencies
+        self.seed = seed
+        self._series = {}
+        self._usd = {}
+
+    def install(self):
+        # the store is disabled (and the in-process caches cleared), the scheduler runs without rate limit
+        ticker._set_store(None)
+        ticker._set_scheduler(ticker.FetchScheduler(max_workers=8, rate=1e9, burst=10**9))
+        ticker._set_provider(self)
+        return self
+
+    def history(self, symbol:str, start, end, interval:str = "1d") -> pd.DataFrame:
+        bars = self._bars(symbol)
+        start, end = pd.Timestamp(start).tz_localize(None).normalize(), pd.Timestamp(end).tz_localize(None).normalize()
+        days = bars.index.tz_localize(None)
+        return bars.loc[(days >= start) & (days < end)]
+
+    def info(self, symbol:str) -> dict:
+        return {"longName": f"Synthetic {symbol}", "country": "None", "currency": self.currencies.get(symbol, "USD"), "sector": "None", "industry": "None", "marketCap": 1e9}
+
+    def news(self, symbol:str) -> pd.DataFrame:
+        return pd.DataFrame({"Date": [pd.Timestamp(end_date)], "Title": [f"{symbol} unchanged"], "Link": [f"https://example.com/{symbol}"], "Source": ["stub"]})
+
+    def close(self, symbol:str, dates:pd.DatetimeIndex) -> np.ndarray:
+        bars = self._bars(symbol)
+        return bars["Close"].to_numpy()[np.searchsorted(bars.index.tz_localize(None), dates, side="right") - 1]
+
+    def _usd_rate(self, currency:str) -> np.ndarray:
+        # value of one unit of the currency in USD: small daily moves around its level, a minor unit is a fraction of its major currency
+        if currency not in self._usd:
+            if currency in FXMatrix.minor_units:
+                major, factor = FXMatrix.minor_units[currency]
+                self._usd[currency] = self._usd_rate(major) * factor
+            elif currency == "USD":
+                self._usd[currency] = np.ones(len(StubMarketData.days))
+            else:
+                rng = np.random.default_rng(zlib.crc32(currency.encode()) + self.seed)
+                self._usd[currency] = currency_levels.get(currency, 1.0) * np.exp(np.cumsum(rng.normal(0, 0.003, len(StubMarketData.days))))
+        return self._usd[currency]
+
+    def _bars(self, symbol:str) -> pd.DataFrame:
+        if symbol not in self._series:
+            rng = np.random.default_rng(zlib.crc32(symbol.encode()) + self.seed)
+            if symbol.endswith("=X"):
+                # exchange rate like "EURUSD=X"
+                close, volatility = self._usd_rate(symbol[:3]) / self._usd_rate(symbol[3:6]), 0.003
+            else:
+                # 10 to 500 USD in the currency of the symbol
+                level, volatility = rng.uniform(10, 500) / currency_levels.get(self.currencies.get(symbol, "USD"), 1.0), 0.015
+                close = level * np.exp(np.cumsum(rng.normal(0, volatility, len(StubMarketData.days))))
+            spread = np.abs(rng.normal(0, volatility, len(close)))
+            self._series[symbol] = pd.DataFrame({"Open": close, "High": close * (1 + spread), "Low": close * (1 - spread), "Close": close,
+                                                 "Volume": rng.integers(10_000, 1_000_000, len(close))}, index=StubMarketData.days)
+        return self._series[symbol]
+
+
+def generate_book(trades:int, symbols:int, currencies_count:int, years:int, seed:int = 0):
+    """
+    Synthetic transaction book
+
+    Parameters
+    ----------
+    trades: int
+        Number of transactions
+    symbols: int
+        Number of symbols, every symbol has at least one trade
+    currencies_count: int
+        Number of currencies of the symbols (see currencies)
+    years: int
+        The trades are spread over the years before end_date
+    seed: int
+        default: 0
+
+    Returns
+    -------
+    (pd.DataFrame, StubMarketData)
+        The transactions (columns like the CSV files) and the stub serving the market data of the symbols
+    """
+    rng = np.random.default_rng(seed)
+    names = [f"SYN{i:04d}" for i in range(symbols)]
+    stub = StubMarketData({name: currencies[i % currencies_count] for i, name in enumerate(names)}, seed=seed)
+    end = pd.Timestamp(end_date)
+    days = pd.bdate_range(end - pd.DateOffset(years=years), end)
+    symbol = np.concatenate([np.arange(symbols), rng.integers(0, symbols, max(trades - symbols, 0))])[:trades]
+    date = days[np.sort(rng.integers(0, len(days), trades))]
+    volume = rng.integers(1, 100, trades).astype(np.float64)
+    # about every fifth trade (except the first one of a symbol) is a sale of a part of a typical buy
+    first = ~pd.Series(symbol).duplicated().to_numpy()
+    sell = (rng.random(trades) < 0.2) & ~first
+    volume[sell] = -np.ceil(volume[sell] * 0.3)
+    book = pd.DataFrame({"NAME": [f"Synthetic {names[i]}" for i in symbol], "VOLUME": volume, "PRICE": 0.0, "DATE": date, "SYMBOL": [names[i] for i in symbol]})
+    for name, rows in book.groupby("SYMBOL").groups.items():
+        book.loc[rows, "PRICE"] = np.round(book.loc[rows, "VOLUME"].to_numpy() * stub.close(name, book.loc[rows, "DATE"]), 2)
+    book["DATE"] = book["DATE"].dt.strftime("%d.%m.%Y")
+    return book, stub
+
+
+def measure(func, memory:bool = True) -> dict:
+    """
+    Wall time of func() and (in a second run under tracemalloc, which slows down python code) its peak memory.
+    The caches of portfolio/ticker.py are cleared before every run, so every run fetches from the stub.
+    """
+    ticker._set_store(None)
+    start = time.perf_counter()
+    func()
+    result = {"seconds": round(time.perf_counter() - start, 4)}
+    if memory:
+        ticker._set_store(None)
+        tracemalloc.start()
+        try:
+            func()
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_scenario(name:str, params:dict, memory:bool = True, seed:int = 0, compact:bool = False) -> dict:
+    metrics.reset()
+    book, stub = generate_book(params["trades"], params["symbols"], params["currencies"], params["years"], seed=seed)
+    stub.install()
+    with tempfile.TemporaryDirectory() as tmp:
+        csvfile = os.path.join(tmp, f"{name}.csv")
+        book.to_csv(csvfile, index=False)
+        my_portfolio = portfolio.Portfolio()
+        my_portfolio.target_currency = "EUR"
+        my_portfolio.compact = compact
+        results = {}
+        results["from_csv"] = measure(lambda: my_portfolio.from_csv(csvfile), memory)
+        results["load_history"] = measure(lambda: my_portfolio.load_history(end=end_date), memory)
+        results["aggregate_to"] = measure(lambda: my_portfolio.aggregate_to(level="portfolio", inplace=True), memory)
+        results["get_portfolio_tech_indicators"] = measure(lambda: my_portfolio.get_portfolio_tech_indicators(interval=30, inplace=True), memory)
+        results["get_all_symbols_tech_indicators"] = measure(lambda: my_portfolio.get_all_symbols_tech_indicators(interval=14), memory)
+        results["Figure.fig"] = measure(lambda: Figure(my_portfolio).fig(date_range=365), memory)
+        my_portfolio.aggregate_to(level="symbol", inplace=True)
+        symbols = list(my_portfolio.basedata["SYMBOL"])
+        results["get_symbol_tech_indicators"] = measure(lambda: [my_portfolio.get_symbol_tech_indicators(symbol, interval=14, inplace=True) for symbol in symbols], memory)
+        history_mb = float(my_portfolio.memory_report().loc["history", "MB"])
+    return {"params": params, "history_shape": list(my_portfolio.history.shape), "history_mb": history_mb, "results": results, "metrics": metrics.report() if metrics.enabled() else None}
+
+
+def import_times(modules:list, repeat:int = 3) -> dict:
+    """
+    Cold import time of every module (the best of repeat fresh interpreters) and the heavy modules (see heavy_modules) loaded by the import
+    """
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    code = "import sys, time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start, ','.join(m for m in {heavy!r} if m in sys.modules))"
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # the working directory is a temporary one, the import of portfolio creates portfolio.log there
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([root] + ([os.environ["PYTHONPATH"]] if "PYTHONPATH" in os.environ else [])))
+        for module in modules:
+            seconds, heavy = [], ""
+            for _ in range(repeat):
+                run = subprocess.run([sys.executable, "-c", code.format(module=module, heavy=heavy_modules)], capture_output=True, text=True, cwd=tmp, env=env)
+                if run.returncode != 0:
+                    results[module] = {"error": run.stderr.strip().splitlines()[-1] if run.stderr.strip() else f"exit code {run.returncode}"}
+                    break
+                elapsed, _, heavy = run.stdout.strip().splitlines()[-1].partition(" ")
+                seconds.append(float(elapsed))
+            else:
+                results[module] = {"seconds": round(min(seconds), 4), "heavy": [m for m in heavy.split(",") if m != ""]}
+    return results
+
+
+def check_imports(imports:dict, budgets:dict) -> list:
+    """
+    The modules whose cold import time exceeds their budget or which load heavy modules
+    """
+    violations = []
+    for module, values in imports.items():
+        if "seconds" not in values: continue
+        if values["seconds"] > budgets[module]:
+            violations.append({"scenario": "imports", "step": module, "metric": "seconds", "baseline": budgets[module], "current": values["seconds"], "ratio": round(values["seconds"] / budgets[module], 3)})
+        if len(values["heavy"]) > 0:
+            violations.append({"scenario": "imports", "step": module, "metric": "heavy", "baseline": [], "current": values["heavy"]})
+    return violations
+
+
+def compare(results:dict, baseline:dict, tolerance:float = 0.25, min_seconds:float = 0.05, min_mb:float = 1.0) -> list:
+    """
+    The regressions of results against baseline: steps which need more than (1 + tolerance) times the time or memory of the baseline.
+    Differences below min_seconds or min_mb are noise and not reported.
+    """
+    regressions = []
+    if baseline.get("compact", False) != results.get("compact", False):
+        print("### the baseline was measured in the other memory mode (--compact), nothing compared")
+        return regressions
+    for scenario, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if base is None or base["params"] != current["params"]: continue
+        for step, values in current["results"].items():
+            for metric, minimum in [("seconds", min_seconds), ("peak_mb", min_mb)]:
+                old, new = base["results"].get(step, {}).get(metric), values.get(metric)
+                if old is None or new is None: continue
+                ratio = new / old if old > 0 else float("inf")
+                print(f"{scenario:8} {step:32} {metric:8} {old:10.3f} -> {new:10.3f}  x{ratio:5.2f}")
+                if ratio > 1 + tolerance and new - old > minimum:
+                    regressions.append({"scenario": scenario, "step": step, "metric": metric, "baseline": old, "current": new, "ratio": round(ratio, 3)})
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Offline benchmark of the portfolio pipeline")
+    parser.add_argument("--scenarios", default=",".join(scenarios), help=f"comma separated, out of {', '.join(scenarios)}")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file of the results")
+    parser.add_argument("--baseline", default=None, help="JSON file of a previous run to compare with")
+    parser.add_argument("--save-baseline", default=None, help="also write the results to this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative growth of time and memory")
+    parser.add_argument("--no-memory", action="store_true", help="only measure the time")
+    parser.add_argument("--compact", action="store_true", help="compact memory mode of the history (see Portfolio.set_memory_mode())")
+    parser.add_argument("--metrics", action="store_true", help="enable the instrumentation (portfolio.metrics) and add its report to the results")
+    parser.add_argument("--no-imports", action="store_true", help="do not check the import times against import_budgets")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.metrics: metrics.enable()
+
+    results = {"created": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+               "machine": platform.machine(), "seed": args.seed, "compact": args.compact, "scenarios": {}}
+    for name in args.scenarios.split(","):
+        print(f"### {name}: {scenarios[name]}")
+        results["scenarios"][name] = run_scenario(name, scenarios[name], memory=not args.no_memory, seed=args.seed, compact=args.compact)
+        for step, values in results["scenarios"][name]["results"].items():
+            print(f"    {step:32} {values}")
+
+    regressions = []
+    if not args.no_imports:
+        results["imports"] = import_times(list(import_budgets))
+        for module, values in results["imports"].items():
+            print(f"    import {module:28} {values}")
+        violations = check_imports(results["imports"], import_budgets)
+        print(f"### {len(violations)} import budget violation(s)")
+        regressions += violations
+
+    if args.baseline is not None:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        compared = compare(results, baseline, tolerance=args.tolerance)
+        results["baseline"] = {"file": args.baseline, "created": baseline.get("created"), "regressions": compared}
+        print(f"### {len(compared)} regression(s) against {args.baseline}")
+        regressions += compared
+
+    for file in [args.output, args.save_baseline]:
+        if file is None: continue
+        with open(file, "w") as fh:
+            json.dump(results, fh, indent=2)
+    sys.exit(1 if len(regressions) > 0 else 0)
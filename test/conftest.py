@@ -0,0 +1,19 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pytest
+import portfolio.ticker as ticker
+
+
+@pytest.fixture()
+def market(monkeypatch):
+    """
+    Restores the provider, store and scheduler of portfolio/ticker.py (and clears its caches) after a test which replaces them,
+    e.g. with benchmark.StubMarketData.install()
+    """
+    for name in ["_provider", "_store", "_store_path", "_scheduler"]:
+        monkeypatch.setattr(ticker, name, getattr(ticker, name))
+    yield ticker
+    for func in [ticker._get_rates, ticker._get_history_ticker, ticker._get_history_tickers, ticker._get_ticker_info]:
+        func.cache_clear()
@@ -0,0 +1,39 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from datetime import datetime
+import numpy as np
+import pytest
+import benchmark
+from portfolio import Portfolio
+from portfolio.batch import PortfolioBatch
+
+END = datetime(2025, 6, 2, 15, 0)
+
+
+@pytest.fixture()
+def books(market):
+    # three clients holding mostly the same symbols
+    book, stub = benchmark.generate_book(150, 8, 3, 2, seed=5)
+    stub.install()
+    return {f"client {i}": book.iloc[i::3].reset_index(drop=True) for i in range(3)}
+
+
+def full_load(book):
+    portfolio = Portfolio()
+    portfolio.load_transactions(book.copy())
+    portfolio.load_history(end=END, aggregate_to="portfolio")
+    return portfolio.history[["price", "close", "high", "low"]]
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_run_matches_load_history(books, workers):
+    batch = PortfolioBatch(books)
+    batch.load(end=END)
+    results = batch.run(workers=workers)
+    assert sorted(results) == sorted(books)
+    for name, book in books.items():
+        expected = full_load(book)
+        assert results[name].index.equals(expected.index)
+        np.testing.assert_allclose(results[name][expected.columns].to_numpy(), expected.to_numpy(dtype=np.float64), rtol=1e-9, atol=1e-6)
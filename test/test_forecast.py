@@ -0,0 +1,101 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+import pandas as pd
+import pytest
+from portfolio import forecast
+from portfolio.forecast import Forecaster
+
+
+def series(days = 300, seed = 1) -> pd.Series:
+    values = 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0.001, 0.01, days)))
+    return pd.Series(values, index=pd.date_range("2024-01-01", periods=days, freq="D"))
+
+
+def extended(values:pd.Series) -> pd.Series:
+    # the next day, like a daily refresh
+    return pd.concat([values, pd.Series([values.iloc[-1] * 1.01], index=[values.index[-1] + pd.Timedelta(days=1)])])
+
+
+@pytest.fixture()
+def fits(monkeypatch):
+    # the tasks fitted in this process (workers=0)
+    tasks = []
+    fit = forecast._fit
+    def recording(task):
+        tasks.append(task)
+        return fit(task)
+    monkeypatch.setattr(forecast, "_fit", recording)
+    return tasks
+
+
+def test_unchanged_series_not_fitted_again(fits):
+    forecaster = Forecaster(horizon=10, model="linear", workers=0, cache_dir=None)
+    first = forecaster.forecast({"a": series(), "b": series(seed=2)})
+    second = forecaster.forecast({"a": series(), "b": series(seed=2)})
+    assert len(fits) == 2
+    pd.testing.assert_frame_equal(first["a"], second["a"])
+    # a new value, another horizon or model is a new fit
+    forecaster.forecast({"a": extended(series())})
+    forecaster.horizon = 20
+    forecaster.forecast({"b": series(seed=2)})
+    assert [task[0] for task in fits[2:]] == ["a", "b"]
+    assert len(forecaster.forecast({"b": series(seed=2)})["b"]) == 20
+    assert len(fits) == 4
+
+
+def test_cache_dir_between_sessions(fits, tmp_path):
+    Forecaster(horizon=10, model="linear", workers=0, cache_dir=str(tmp_path)).forecast({"^GDAXI": series()})
+    forecaster = Forecaster(horizon=10, model="linear", workers=0, cache_dir=str(tmp_path))
+    assert len(forecaster.forecast({"^GDAXI": series()})["^GDAXI"]) == 10
+    assert len(fits) == 1
+    forecaster.clear()
+    forecaster.forecast({"^GDAXI": series()})
+    assert len(fits) == 2
+
+
+def test_warm_start_from_the_previous_parameters(monkeypatch):
+    inits = []
+    def fake_prophet(values, horizon, init = None):
+        inits.append(init)
+        forecast_, params, _ = forecast._fit_linear(values, horizon)
+        return forecast_, {"k": float(len(values))}, "prophet"
+    monkeypatch.setattr(forecast, "_fit_prophet", fake_prophet)
+    forecaster = Forecaster(horizon=10, model="prophet", workers=0, cache_dir=None)
+    forecaster.forecast({"a": series()})
+    forecaster.forecast({"a": extended(series())})
+    assert inits == [None, {"k": 300.0}]
+    # the parameters of another model are no warm start
+    forecaster.model = "linear"
+    forecaster.forecast({"a": series()})
+    forecaster.model = "prophet"
+    forecaster.forecast({"a": extended(series())})
+    assert inits[-1] is None
+
+
+def test_short_series_uses_the_linear_trend():
+    forecaster = Forecaster(horizon=5, model="prophet", workers=0, cache_dir=None)
+    result = forecaster.forecast({"short": series(days=Forecaster.min_points - 1)})
+    assert forecaster._fits["short"]["model"] == "linear"
+    assert list(result["short"].columns) == ["yhat", "yhat_lower", "yhat_upper"]
+    assert result["short"].index[0] == series(days=Forecaster.min_points - 1).index[-1] + pd.Timedelta(days=1)
+
+
+def test_linear_trend_of_an_exponential_series():
+    days = pd.date_range("2024-01-01", periods=400, freq="D")
+    values = pd.Series(100 * np.exp(0.001 * np.arange(400)), index=days)
+    forecast_, params, used = forecast._fit_linear(values, 10)
+    np.testing.assert_allclose(forecast_["yhat"], 100 * np.exp(0.001 * np.arange(400, 410)))
+    np.testing.assert_allclose(forecast_["yhat_lower"], forecast_["yhat"], rtol=1e-9)
+
+
+def test_prophet_accepts_its_warm_start():
+    pytest.importorskip("prophet")
+    forecaster = Forecaster(horizon=10, model="prophet", workers=0, cache_dir=None)
+    forecaster.forecast({"a": series()})
+    params = forecaster._fits["a"]["params"]
+    assert forecaster._fits["a"]["model"] == "prophet"
+    result, refitted, used = forecast._fit_prophet(extended(series()), 10, init=params)
+    assert used == "prophet" and len(result) == 10
@@ -0,0 +1,76 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+import benchmark
+from portfolio import Portfolio
+from portfolio.fx import FXMatrix
+
+START, END = pd.Timestamp("2024-01-01"), pd.Timestamp("2024-07-01")
+
+
+@pytest.fixture()
+def stub(market):
+    stub = benchmark.StubMarketData({}, seed=3).install()
+    requests = []
+    fx = stub.fx
+    def recording(from_currency, to_currency, start, end):
+        requests.append((from_currency, to_currency, pd.Timestamp(start), pd.Timestamp(end)))
+        return fx(from_currency, to_currency, start, end)
+    stub.fx = recording
+    stub.requests = requests
+    return stub
+
+
+def test_triangulation(stub):
+    matrix = FXMatrix()
+    matrix.load(["EUR", "JPY", "CHF"], START, END)
+    np.testing.assert_allclose(matrix.rate("EUR", "JPY") * matrix.rate("JPY", "EUR"), 1.0)
+    np.testing.assert_allclose(matrix.rate("EUR", "JPY"), matrix.rate("EUR", "CHF") * matrix.rate("CHF", "JPY"))
+    assert (matrix.rate("USD", "USD") == 1.0).all()
+    # the pivot rates are the fetched series
+    eurusd = close(stub, "EURUSD=X")
+    np.testing.assert_allclose(matrix.rates["EUR"].dropna(), eurusd.reindex(matrix.rates["EUR"].dropna().index))
+
+
+def test_minor_units(stub):
+    matrix = FXMatrix()
+    matrix.load(["GBp", "EUR"], START, END)
+    # the pence are derived from the pounds, only one series is fetched
+    assert [request[:2] for request in stub.requests] == [("EUR", "USD"), ("GBP", "USD")]
+    np.testing.assert_allclose(matrix.rate("GBp", "EUR"), matrix.rate("GBP", "EUR") * 0.01)
+    np.testing.assert_allclose(matrix.rate("EUR", "GBp"), matrix.rate("EUR", "GBP") * 100)
+    table = matrix.table("EUR")
+    assert {"GBPEUR=X", "GBpEUR=X", "GBXEUR=X", "USDEUR=X", "EUREUR=X"} <= set(table.columns)
+    assert (table["EUREUR=X"] == 1.0).all()
+
+
+def test_only_missing_currencies_and_ranges_are_fetched(stub):
+    matrix = FXMatrix()
+    matrix.load(["EUR"], START, END)
+    matrix.load(["EUR", "USD"], START, END)
+    assert len(stub.requests) == 1
+    matrix.load(["EUR", "CHF"], START, END + pd.Timedelta(days=30))
+    assert sorted(stub.requests[1:]) == [("CHF", "USD", START, END + pd.Timedelta(days=30)), ("EUR", "USD", END, END + pd.Timedelta(days=30))]
+    assert matrix.rates.index.max() >= END
+
+
+def close(stub, symbol) -> pd.Series:
+    bars = stub._bars(symbol)["Close"]
+    return pd.Series(bars.to_numpy(), index=bars.index.tz_localize(None))
+
+
+def test_portfolio_values_pence_in_the_target_currency(market):
+    book, stub = benchmark.generate_book(60, 3, 3, 1, seed=3)
+    stub.install()
+    assert stub.currencies["SYN0002"] == "GBp"
+    portfolio = Portfolio()
+    portfolio.load_transactions(book)
+    portfolio.load_history(end=datetime(2025, 6, 2))
+    day = pd.Timestamp("2025-05-30")
+    expected = close(stub, "SYN0002")[day] * close(stub, "GBPEUR=X")[day] / 100
+    assert portfolio.get_unit_values("close", symbols=["SYN0002"]).loc[day, "SYN0002"] == pytest.approx(expected, rel=1e-9)
@@ -0,0 +1,144 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+import benchmark
+from portfolio import Portfolio
+
+# the incremental paths (refresh_history(), add_transaction(), remove_transaction(), select_transactions())
+# must give the history of a full load_history() of the same transactions on the same (stubbed) market data
+END = datetime(2025, 6, 2, 15, 0)
+INTERVAL = 20
+
+
+@pytest.fixture()
+def book(market):
+    book, stub = benchmark.generate_book(120, 6, 3, 2, seed=11)
+    stub.install()
+    return book
+
+
+def loaded(transactions:pd.DataFrame, end = END, cleanup = False, compact = False) -> Portfolio:
+    portfolio = Portfolio()
+    portfolio.compact = compact
+    portfolio.load_transactions(transactions.copy())
+    portfolio.load_history(end=end, aggregate_to="portfolio", cleanup=cleanup)
+    portfolio.get_portfolio_tech_indicators(interval=INTERVAL)
+    return portfolio
+
+
+def assert_full_load(portfolio:Portfolio, end = END, cleanup = False):
+    full = loaded(portfolio.transactions.reset_index(), end=end, cleanup=cleanup, compact=portfolio.compact)
+    assert sorted(portfolio.history.columns) == sorted(full.history.columns)
+    pd.testing.assert_index_equal(portfolio.history.index, full.history.index)
+    np.testing.assert_allclose(portfolio.history[full.history.columns].to_numpy(dtype=np.float64), full.history.to_numpy(dtype=np.float64), rtol=1e-9, atol=1e-6, equal_nan=True)
+
+
+def trade(symbol:str, volume:float, price:float, date:str) -> pd.DataFrame:
+    return pd.DataFrame([{"NAME": f"Synthetic {symbol}", "VOLUME": volume, "PRICE": price, "DATE": date, "SYMBOL": symbol}])
+
+
+def test_refresh_across_a_new_day(book):
+    portfolio = loaded(book)
+    portfolio.refresh_history(end=datetime(2025, 6, 10, 12, 0))
+    assert_full_load(portfolio, end=datetime(2025, 6, 10, 12, 0))
+
+
+def test_refresh_after_cleanup(book):
+    portfolio = loaded(book, cleanup=True)
+    columns = list(portfolio.history.columns)
+    portfolio.refresh_history(end=datetime(2025, 6, 10, 12, 0))
+    assert list(portfolio.history.columns) == columns
+    assert (portfolio.history.loc["2025-06-02":, "close"] > 0).all()
+    assert_full_load(portfolio, end=datetime(2025, 6, 10, 12, 0), cleanup=True)
+
+
+def test_add_at_the_end(book):
+    portfolio = loaded(book)
+    portfolio.add_transaction(trade("SYN0001", 10, 1000.0, "02.06.2025"))
+    assert_full_load(portfolio)
+
+
+def test_add_in_the_middle(book):
+    portfolio = loaded(book)
+    portfolio.add_transaction(trade("SYN0002", -5, -400.0, "15.01.2025"))
+    assert_full_load(portfolio)
+
+
+def test_add_a_new_symbol(book):
+    portfolio = loaded(book)
+    portfolio.add_transaction(trade("SYNNEW", 20, 2500.0, "03.03.2025"))
+    assert "SYNNEW_close" in portfolio.history.columns
+    assert_full_load(portfolio)
+
+
+def test_remove(book):
+    portfolio = loaded(book)
+    portfolio.remove_transaction(len(portfolio.transactions) // 2)
+    assert_full_load(portfolio)
+
+
+def test_select(book):
+    portfolio = loaded(book)
+    selected = portfolio.transactions["selected"].to_numpy(dtype=bool).copy()
+    selected[::7] = False
+    portfolio.select_transactions(selected)
+    assert_full_load(portfolio)
+    selected[::14] = True
+    portfolio.select_transactions(selected)
+    assert_full_load(portfolio)
+
+
+def test_add_before_the_first_trade(book):
+    # the symbol with the latest first trade, the quotes before it have to be fetched
+    portfolio = loaded(book)
+    firsts = portfolio.transactions.reset_index().groupby("SYMBOL")["DATE"].min()
+    symbol, first = firsts.idxmax(), firsts.max()
+    assert first - pd.Timedelta(days=10) > portfolio.history.index[0]
+    portfolio.add_transaction(trade(symbol, 3, 300.0, (first - pd.Timedelta(days=10)).strftime("%d.%m.%Y")))
+    assert_full_load(portfolio)
+    portfolio.remove_transaction(len(portfolio.transactions) - 1)
+    assert_full_load(portfolio)
+
+
+def test_cleanup(book):
+    # the per symbol values are dropped, the aggregates are summed in the engine and no dropped column comes back
+    portfolio = loaded(book, cleanup=True)
+    portfolio.add_transaction(trade("SYN0001", 10, 1000.0, "15.03.2025"))
+    assert (portfolio.history.loc["2025-03-15":, "close"] > 0).all()
+    assert_full_load(portfolio, cleanup=True)
+    portfolio.add_transaction(trade("SYNNEW", 20, 2500.0, "03.03.2025"))
+    assert "SYNNEW_close" not in portfolio.history.columns
+    assert_full_load(portfolio, cleanup=True)
+    portfolio.remove_transaction(len(portfolio.transactions) // 2)
+    assert_full_load(portfolio, cleanup=True)
+
+
+def test_each_symbol_fetched_from_its_first_trade(book, market):
+    requests = {}
+    stub = market._get_provider()
+    history = stub.history
+    def recording(symbol, start, end, interval="1d"):
+        requests[symbol] = pd.Timestamp(start)
+        return history(symbol, start, end, interval)
+    stub.history = recording
+    portfolio = loaded(book)
+    firsts = portfolio.transactions.reset_index().groupby("SYMBOL")["DATE"].min()
+    assert {symbol: start for symbol, start in requests.items() if not symbol.endswith("=X")} == firsts.to_dict()
+
+
+def test_compact(book):
+    standard, compact = loaded(book), loaded(book, compact=True)
+    assert compact._engine.quotes["close"].dtypes.eq(np.float32).all()
+    assert compact.memory_report().loc["engine", "bytes"] < standard.memory_report().loc["engine", "bytes"]
+    assert compact.memory_report().loc["resident", "bytes"] < standard.memory_report().loc["resident", "bytes"]
+    for field in ["price", "close", "high", "low"]:
+        assert compact.history[field].dtype == np.float64
+        np.testing.assert_allclose(compact.history[field], standard.history[field], rtol=1e-5)
+    compact.add_transaction(trade("SYN0002", -5, -400.0, "15.01.2025"))
+    compact.refresh_history(end=datetime(2025, 6, 10, 12, 0))
+    assert_full_load(compact, end=datetime(2025, 6, 10, 12, 0))
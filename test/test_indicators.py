@@ -0,0 +1,77 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+import pandas as pd
+import pytest
+from portfolio import indicators
+from portfolio.indicators import IndicatorRegistry, portfolio_registry, symbol_registry
+
+
+def counting_registry():
+    # a diamond: d needs b and c, both need a; calls counts the computations
+    calls = []
+    def counted(name, func):
+        def wrapped(*args, interval):
+            calls.append(name)
+            return func(*args)
+        return wrapped
+    registry = IndicatorRegistry()
+    registry.register("a", ["x"], counted("a", lambda x: x + 1), public=False)
+    registry.register("b", ["a"], counted("b", lambda a: a * 2))
+    registry.register("c", ["a", "x"], counted("c", lambda a, x: a - x))
+    registry.register("d", ["b", "c"], counted("d", lambda b, c: b + c))
+    return registry, calls
+
+
+def test_resolve_orders_inputs_first():
+    registry, _ = counting_registry()
+    order = registry.resolve(["d"], sources=["x"])
+    assert sorted(order) == ["a", "b", "c", "d"]
+    for name in order:
+        for input in registry.indicators[name][0]:
+            assert input == "x" or order.index(input) < order.index(name)
+    for shipped in [symbol_registry, portfolio_registry]:
+        order = shipped.resolve(shipped.names(), sources=["close", "high", "low", "volume", "price"])
+        assert all(input not in shipped.indicators or order.index(input) < order.index(name) for name in order for input in shipped.indicators[name][0])
+
+
+def test_shared_inputs_computed_once_and_unneeded_skipped():
+    registry, calls = counting_registry()
+    values = registry.compute({"x": 1.0}, ["d"])
+    assert values == {"d": (1 + 1) * 2 + (1 + 1 - 1)}
+    assert sorted(calls) == ["a", "b", "c", "d"]
+    calls.clear()
+    assert registry.compute({"x": 1.0}, ["b"]) == {"b": 4.0}
+    assert calls == ["a", "b"]
+    # a source with the name of an indicator is taken as it is
+    calls.clear()
+    assert registry.compute({"x": 1.0, "a": 10.0}, ["b"]) == {"b": 20.0}
+    assert calls == ["b"]
+
+
+def test_unknown_and_cyclic_inputs():
+    registry, _ = counting_registry()
+    with pytest.raises(ValueError, match="unknown"):
+        registry.compute({"y": 1.0}, ["d"])
+    registry.register("a", ["d"], lambda d, interval: d)
+    with pytest.raises(ValueError, match="cyclic"):
+        registry.resolve(["d"], sources=["x"])
+
+
+def test_names_are_public_in_registration_order():
+    registry, _ = counting_registry()
+    assert registry.names() == ["b", "c", "d"]
+    copy = registry.copy().register("e", ["d"], lambda d, interval: d)
+    assert "e" in copy.names() and "e" not in registry.names()
+
+
+def test_sources_not_changed():
+    close = pd.Series(np.linspace(100, 120, 60))
+    price = pd.Series(100.0, index=close.index)
+    before = close.copy(), price.copy()
+    values = portfolio_registry.compute({"close": close, "price": price}, ["bb_upper", "perf_sma"], interval=10)
+    pd.testing.assert_series_equal(close, before[0])
+    pd.testing.assert_series_equal(price, before[1])
+    np.testing.assert_allclose(values["bb_upper"], indicators.sma(close, 10) + 2 * indicators.std(close, 10), equal_nan=True)
@@ -17,10 +17,10 @@ if __name__ == "__main__":
     portfolio.from_csv("portfolio.sample.csv")
     portfolio.load_history(aggregate_to="portfolio", cleanup=False)
 
-    transaction = pd.DataFrame([{"NAME":"ASML","AMOUNT":3.0,"PRICE":2635.0,"DATE":"16.02.2024","SYMBOL":"ASMLF"}])
+    transaction = pd.DataFrame([{"NAME":"ASML","VOLUME":3.0,"PRICE":2635.0,"DATE":"16.02.2024","SYMBOL":"ASMLF"}])
     portfolio.add_transaction(transaction=transaction)
     
-    transaction = pd.DataFrame([{"NAME":"ASML","AMOUNT":6.0,"PRICE":5270.0,"DATE":"16.02.2024","SYMBOL":"ASMLF"}])
+    transaction = pd.DataFrame([{"NAME":"ASML","VOLUME":6.0,"PRICE":5270.0,"DATE":"16.02.2024","SYMBOL":"ASMLF"}])
     portfolio.add_transaction(transaction=transaction)
     
     portfolio.load_history(aggregate_to="portfolio", cleanup=False)
@@ -0,0 +1,70 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pandas as pd
+import pytest
+from portfolio.fx import FXMatrix
+from portfolio.provider import MarketDataProvider, ReplayProvider
+
+
+class CountingProvider(MarketDataProvider):
+    # one bar per day of [start, end), the requested ranges are recorded
+    def __init__(self):
+        self.calls = []
+
+    def history(self, symbol, start, end, interval="1d"):
+        self.calls.append((pd.Timestamp(start), pd.Timestamp(end)))
+        days = pd.date_range(start, end, freq="D", inclusive="left")
+        return pd.DataFrame({column: range(len(days)) for column in MarketDataProvider.bar_columns}, index=days, dtype=float)
+
+
+def test_auto_fetches_the_ranges_not_recorded(tmp_path):
+    provider = CountingProvider()
+    ReplayProvider(str(tmp_path), provider, mode="record").history("A", "2024-01-01", "2024-02-01")
+    auto = ReplayProvider(str(tmp_path), provider, mode="auto")
+    bars = auto.history("A", "2024-02-01", "2024-03-01")
+    assert len(bars) == 29
+    assert provider.calls[-1] == (pd.Timestamp("2024-02-01"), pd.Timestamp("2024-03-01"))
+    # recorded now, served without the provider
+    calls = len(provider.calls)
+    assert len(auto.history("A", "2024-01-15", "2024-02-15")) == 31
+    assert len(provider.calls) == calls
+    # only the missing edges are fetched
+    assert len(auto.history("A", "2023-12-20", "2024-03-10")) == 81
+    assert provider.calls[calls:] == [(pd.Timestamp("2023-12-20"), pd.Timestamp("2024-01-01")), (pd.Timestamp("2024-03-01"), pd.Timestamp("2024-03-10"))]
+
+
+def test_replay_raises_for_ranges_not_recorded(tmp_path):
+    ReplayProvider(str(tmp_path), CountingProvider(), mode="record").history("A", "2024-01-01", "2024-02-01")
+    replay = ReplayProvider(str(tmp_path), mode="replay")
+    assert len(replay.history("A", "2024-01-10", "2024-01-20")) == 10
+    with pytest.raises(LookupError):
+        replay.history("A", "2024-01-10", "2024-02-10")
+    with pytest.raises(LookupError):
+        replay.history("B", "2024-01-10", "2024-01-20")
+
+
+def test_recording_without_coverage_covers_its_bars(tmp_path):
+    # recordings of older versions have no coverage file
+    ReplayProvider(str(tmp_path), CountingProvider(), mode="record").history("A", "2024-01-01", "2024-02-01")
+    os.remove(os.path.join(str(tmp_path), "history_A_1d.coverage.json"))
+    replay = ReplayProvider(str(tmp_path), mode="replay")
+    assert len(replay.history("A", "2024-01-01", "2024-02-01")) == 31
+    with pytest.raises(LookupError):
+        replay.history("A", "2024-01-01", "2024-02-02")
+
+
+def test_exchange_rates_through_fx(market):
+    class FXProvider(CountingProvider):
+        def fx(self, from_currency, to_currency, start, end):
+            self.calls.append((from_currency, to_currency))
+            days = pd.date_range(start, end, freq="D", inclusive="left")
+            return pd.Series(2.0, index=days)
+    provider = FXProvider()
+    market._set_store(None)
+    market._set_provider(provider)
+    fx = FXMatrix()
+    fx.load(["EUR", "GBp"], pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-01"))
+    assert sorted(provider.calls) == [("EUR", "USD"), ("GBP", "USD")]
+    assert (fx.rate("GBp", "EUR") == 0.01).all()
@@ -0,0 +1,123 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import time
+import threading
+import pytest
+from portfolio.ticker import FetchScheduler, TokenBucket
+from portfolio.provider import MarketDataProvider
+
+
+class FakeFetch():
+    """
+    Local fake of a provider call: item -> (delay in seconds, number of failures before it succeeds)
+    """
+
+    def __init__(self, plan:dict):
+        self.plan = plan
+        self.calls = {}
+        self.times = []
+        self._lock = threading.Lock()
+
+    def __call__(self, item):
+        delay, failures = self.plan.get(item, (0.0, 0))
+        with self._lock:
+            self.calls[item] = self.calls.get(item, 0) + 1
+            self.times.append(time.monotonic())
+            attempt = self.calls[item]
+        if delay > 0: time.sleep(delay)
+        if attempt <= failures: raise ConnectionError(f"{item} failed ({attempt})")
+        return f"result {item}"
+
+
+def scheduler(**kwargs):
+    # no rate limit and no backoff unless tested
+    options = {"max_workers": 4, "rate": 1e6, "burst": 10**6, "retries": 0, "backoff": 0.0, "timeout": 10.0}
+    options.update(kwargs)
+    return FetchScheduler(**options)
+
+
+def test_results_in_request_order():
+    # the first requests are the slowest, so they finish last
+    fetch = FakeFetch({i: (0.05 * (5 - i), 0) for i in range(6)})
+    assert scheduler().map(fetch, range(6)) == [f"result {i}" for i in range(6)]
+
+
+def test_retry_with_backoff():
+    fetch = FakeFetch({"a": (0.0, 2)})
+    start = time.monotonic()
+    assert scheduler(retries=2, backoff=0.1).map(fetch, ["a"]) == ["result a"]
+    assert fetch.calls["a"] == 3
+    # 0.1s before the first and 0.2s before the second retry
+    assert time.monotonic() - start >= 0.3
+    assert fetch.times[2] - fetch.times[1] >= 2 * (fetch.times[1] - fetch.times[0]) * 0.9
+
+
+def test_failures_returned_or_raised():
+    fetch = FakeFetch({"bad": (0.0, 5)})
+    results = scheduler(retries=1).map(fetch, ["ok", "bad"], return_exceptions=True)
+    assert results[0] == "result ok"
+    assert isinstance(results[1], ConnectionError)
+    assert fetch.calls["bad"] == 2
+    with pytest.raises(ConnectionError):
+        scheduler(retries=1).map(FakeFetch({"bad": (0.0, 5)}), ["ok", "bad"])
+
+
+def test_per_request_timeout():
+    fetch = FakeFetch({"slow": (1.0, 0), "fast": (0.0, 0)})
+    start = time.monotonic()
+    results = scheduler().map(fetch, ["slow", "fast"], return_exceptions=True, timeout=0.2)
+    assert isinstance(results[0], TimeoutError)
+    assert results[1] == "result fast"
+    assert time.monotonic() - start < 0.8
+
+
+def test_per_request_timeout_starts_with_the_request():
+    # with one worker the second request waits for the first, it times out only 0.3s after its own start
+    fetch = FakeFetch({"a": (0.2, 0), "b": (0.2, 0)})
+    assert scheduler(max_workers=1).map(fetch, ["a", "b"], timeout=0.3) == ["result a", "result b"]
+
+
+def test_default_timeout_per_request():
+    # self.timeout counts from the start of each request, a batch longer than the timeout does not fail
+    fetch = FakeFetch({i: (0.1, 0) for i in range(5)})
+    assert scheduler(max_workers=1, timeout=0.3).map(fetch, range(5)) == [f"result {i}" for i in range(5)]
+    results = scheduler(timeout=0.2).map(FakeFetch({"slow": (1.0, 0)}), ["fast", "slow"], return_exceptions=True)
+    assert results[0] == "result fast"
+    assert isinstance(results[1], TimeoutError)
+    with pytest.raises(TimeoutError):
+        scheduler(timeout=0.2).map(FakeFetch({"slow": (1.0, 0)}), ["slow"])
+
+
+def test_rate_limited_batch_does_not_time_out():
+    # 30 requests at 50 per second take 0.6s, each of them is done within the timeout
+    results = scheduler(rate=50.0, burst=1, timeout=0.2).map(FakeFetch({}), range(30), return_exceptions=True)
+    assert results == [f"result {i}" for i in range(30)]
+
+
+def test_download_infos_skips_failures(market):
+    class FailingInfo(MarketDataProvider):
+        def info(self, symbol):
+            if symbol == "BAD": raise ConnectionError("no info")
+            return {"currency": "USD"}
+    market._set_store(None)
+    market._set_scheduler(scheduler())
+    market._set_provider(FailingInfo())
+    assert market._download_infos(["A", "BAD", "B"]) == [{"currency": "USD"}, {}, {"currency": "USD"}]
+
+
+def test_token_bucket_limits_the_rate():
+    bucket = TokenBucket(rate=20.0, capacity=2)
+    start = time.monotonic()
+    for _ in range(12):
+        bucket.acquire()
+    # 2 tokens at once, the other 10 at 20 per second
+    assert time.monotonic() - start >= 0.45
+
+
+def test_scheduler_call_rate():
+    fetch = FakeFetch({})
+    scheduler(max_workers=8, rate=20.0, burst=1).map(fetch, range(11))
+    times = sorted(fetch.times)
+    assert times[-1] - times[0] >= 0.45
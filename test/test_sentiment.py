@@ -0,0 +1,186 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+import benchmark
+import portfolio.sentiment as sentiment
+from portfolio import Portfolio
+from portfolio.sentiment_store import NewsArchive
+
+
+class NewsSource():
+    # news source (see sentiment.news_sources) serving the headlines of self.news from since on, the calls are recorded
+    def __init__(self, news:dict):
+        self.news = news
+        self.calls = []
+
+    def __call__(self, ticker:str, since = None) -> pd.DataFrame:
+        self.calls.append((ticker, since))
+        if ticker not in self.news: raise ConnectionError(f"no news of {ticker}")
+        news = pd.DataFrame(self.news[ticker], columns=["Date", "Title", "Link"]).assign(Source="test")
+        news["Date"] = pd.to_datetime(news["Date"])
+        return news if since is None else news.loc[news["Date"] >= since]
+
+
+@pytest.fixture()
+def archive(tmp_path, monkeypatch, market):
+    # the news archive of portfolio/sentiment.py (and the scheduler) is restored after the test
+    market._set_scheduler(market.FetchScheduler(max_workers=4, rate=1e9, burst=10**9, retries=0))
+    monkeypatch.setattr(sentiment, "_news_archive", sentiment._news_archive)
+    monkeypatch.setattr(sentiment, "_news_archive_path", sentiment._news_archive_path)
+    archive = NewsArchive(str(tmp_path / "news.sqlite"))
+    sentiment._set_news_archive(archive)
+    return archive
+
+
+def test_load_news_fetches_only_new_headlines(archive, monkeypatch):
+    source = NewsSource({
+        "KO": [("2025-01-02 09:00", "Coke beats", "k1"), ("2025-01-03 09:00", "Coke misses", "k2")],
+        "PEP": [("2025-01-02 10:00", "Pepsi beats", "p1")],
+    })
+    monkeypatch.setitem(sentiment.news_sources, "test", source)
+    news = sentiment.Sentiment(["KO", "PEP"])
+    news.load_news("test")
+    assert sorted(source.calls) == [("KO", None), ("PEP", None)]
+    assert len(news.news_df) == 3 and news.errors == []
+
+    # fetched within the max_age of the archive: served from the archive
+    source.calls = []
+    news.load_news("test")
+    assert source.calls == []
+    assert list(news.news_df["Title"]) == ["Coke beats", "Coke misses", "Pepsi beats"]
+
+    # stale: only the headlines from the newest archived one on are requested
+    archive.max_age = timedelta(0)
+    source.news["KO"].append(("2025-01-04 09:00", "Coke rallies", "k3"))
+    news.load_news("test")
+    assert sorted(source.calls) == [("KO", pd.Timestamp("2025-01-03 09:00")), ("PEP", pd.Timestamp("2025-01-02 10:00"))]
+    assert list(news.news_df["Title"]) == ["Coke beats", "Coke misses", "Coke rallies", "Pepsi beats"]
+    assert archive.stats()["headlines"] == 4
+
+    # the newest news_limit headlines per ticker
+    news.news_limit = 1
+    news.load_news("test")
+    assert list(news.news_df["Title"]) == ["Coke rallies", "Pepsi beats"]
+
+
+def test_load_news_failed_ticker(archive, monkeypatch):
+    source = NewsSource({"KO": [("2025-01-02 09:00", "Coke beats", "k1")]})
+    monkeypatch.setitem(sentiment.news_sources, "test", source)
+    news = sentiment.Sentiment(["KO", "XXX"])
+    news.load_news("test")
+    assert [(error["ticker"], error["stage"]) for error in news.errors] == [("XXX", "news")]
+    # a ticker without archived headlines gets one neutral headline
+    assert list(news.news_df["Ticker"]) == ["KO", "XXX"]
+    assert list(news.news_df["Title"]) == ["Coke beats", "Neutral"]
+    # the failed ticker is fetched again
+    source.calls = []
+    news.load_news("test")
+    assert source.calls == [("XXX", None)]
+
+
+@pytest.fixture()
+def scores(monkeypatch):
+    # headlines with "up" score 1, with "down" -1, others 0 (instead of a model), without the score cache
+    monkeypatch.setattr(sentiment, "_score_cache", sentiment._score_cache)
+    monkeypatch.setattr(sentiment, "_score_cache_path", sentiment._score_cache_path)
+    sentiment._set_score_cache(None)
+    def score_titles(model, titles):
+        compound = [1.0 if "up" in title else (-1.0 if "down" in title else 0.0) for title in titles]
+        return pd.DataFrame({"neg": 0.0, "neu": 0.0, "pos": 0.0, "compound": compound})
+    monkeypatch.setattr(sentiment.Sentiment, "_score_titles", staticmethod(score_titles))
+
+
+def archived(archive:NewsArchive, ticker:str, rows:list):
+    # (date, title) -> archived headlines of ticker
+    archive.write(ticker, pd.DataFrame({"Date": [row[0] for row in rows], "Title": [row[1] for row in rows],
+                                        "Link": [f"{ticker}/{row[0]}/{row[1]}" for row in rows], "Source": "test"}), "test")
+
+
+def test_decayed():
+    values = np.array([[1.0, 0.0], [0.0, 2.0], [3.0, 0.0], [0.0, 0.0]])
+    initial, decay = np.array([0.5, 1.0]), 0.8
+    expected, previous = [], initial
+    for row in values:
+        previous = decay * previous + row
+        expected.append(previous)
+    np.testing.assert_allclose(sentiment._decayed(values, initial, decay), np.array(expected))
+
+
+def test_index_halves_the_weight_of_a_headline(archive, scores):
+    archived(archive, "KO", [("2025-01-01 09:00", "Coke up"), ("2025-01-03 09:00", "Coke down")])
+    index = sentiment.SentimentIndex(half_life=2)
+    assert index.update(end="2025-01-20") == 2
+    panel = index.panel(["KO", "PEP"])
+    assert panel.index[0] == pd.Timestamp("2025-01-01") and panel.index[-1] == pd.Timestamp("2025-01-20")
+    assert panel.loc["2025-01-01", "KO"] == pytest.approx(1.0)
+    assert panel.loc["2025-01-02", "KO"] == pytest.approx(1.0)
+    # the first headline is two days (one half-life) old: (0.5 * 1 - 1) / (0.5 + 1)
+    assert panel.loc["2025-01-03", "KO"] == pytest.approx(-1 / 3)
+    assert panel.loc["2025-01-06", "KO"] == pytest.approx(-1 / 3)
+    # below min_weight (0.1) without recent headlines: 1.5 * 0.5 ** (days / 2) < 0.1 after 8 days
+    assert not np.isnan(panel.loc["2025-01-10", "KO"])
+    assert panel.loc["2025-01-12":, "KO"].isna().all()
+    assert panel["PEP"].isna().all()
+    assert index.update(end="2025-01-20") == 0
+
+
+def test_index_update_equals_rebuild(archive, scores):
+    archived(archive, "KO", [("2025-01-05 09:00", "Coke up"), ("2025-01-08 09:00", "Coke flat")])
+    archived(archive, "PEP", [("2025-01-06 09:00", "Pepsi down")])
+    index = sentiment.SentimentIndex(half_life=3)
+    index.update(end="2025-01-10")
+    # newer and older headlines than the indexed ones, a new ticker and a later end
+    archived(archive, "KO", [("2025-01-02 09:00", "Coke down"), ("2025-01-12 09:00", "Coke up again")])
+    archived(archive, "MSFT", [("2025-01-07 09:00", "Microsoft up")])
+    assert index.update(end="2025-01-15") == 3
+    rebuilt = sentiment.SentimentIndex(half_life=3)
+    rebuilt.update(end="2025-01-15")
+    for panel in ["daily_scores", "daily_counts", "sums", "weights"]:
+        pd.testing.assert_frame_equal(getattr(index, panel), getattr(rebuilt, panel).reindex(columns=getattr(index, panel).columns))
+    assert sorted(index.panel().columns) == ["KO", "MSFT", "PEP"]
+
+
+def test_index_needs_the_archive(monkeypatch, scores):
+    monkeypatch.setattr(sentiment, "_news_archive", None)
+    monkeypatch.setattr(sentiment, "_news_archive_path", "")
+    with pytest.raises(ValueError):
+        sentiment.SentimentIndex().update()
+    with pytest.raises(ValueError):
+        sentiment.SentimentIndex(model="unknown")
+
+
+def test_portfolio_sentiment(archive, scores):
+    book, stub = benchmark.generate_book(30, 3, 1, 1, seed=5)
+    stub.install()
+    portfolio = Portfolio()
+    portfolio.load_transactions(book)
+    # no sentiment without a history
+    assert len(portfolio.get_sentiment()) == 0
+    portfolio.load_history(end=datetime(2025, 6, 2, 15, 0))
+    up, down, silent = portfolio._engine.symbols
+    days = pd.date_range("2025-03-01", "2025-06-02", freq="D")
+    archived(archive, up, [(f"{day:%Y-%m-%d} 09:00", f"{up} up {day:%d%m}") for day in days])
+    archived(archive, down, [(f"{day:%Y-%m-%d} 09:00", f"{down} down {day:%d%m}") for day in days])
+
+    frame = portfolio.get_sentiment(half_life=2)
+    assert list(frame.columns) == ["__sent__nltk", "__sent__nltk_coverage"]
+    pd.testing.assert_index_equal(frame.index, portfolio.history.index)
+    values = portfolio._engine.values("close", symbols=[up, down, silent]).reindex(portfolio.history.index)
+    held = values.where(values > 0, 0.0)
+    recent = frame.index >= pd.Timestamp("2025-03-01")
+    # the sentiment of up (1) and down (-1) weighted with the value of their holdings, silent has no headlines
+    expected = (held[up] - held[down]) / (held[up] + held[down])
+    coverage = (held[up] + held[down]) / held.sum(axis=1)
+    assert expected[recent].notna().any() and (coverage[recent] < 1).any()
+    np.testing.assert_allclose(frame.loc[recent, "__sent__nltk"], expected[recent], equal_nan=True)
+    np.testing.assert_allclose(frame.loc[recent, "__sent__nltk_coverage"], coverage[recent].fillna(0.0))
+    # no sentiment before the first headline
+    assert frame.loc[~recent, "__sent__nltk"].isna().all()
+    assert (frame.loc[~recent, "__sent__nltk_coverage"] == 0).all()
+    # inplace: the columns of the history
+    pd.testing.assert_frame_equal(portfolio.history[frame.columns], frame)
@@ -0,0 +1,157 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pytest
+import pandas as pd
+from datetime import datetime, timedelta
+import portfolio.sentiment as sentiment
+import portfolio.sentiment_store as sentiment_store
+from portfolio.sentiment_store import ScoreCache, NewsArchive, headline_hash
+
+
+class Clock():
+    # deterministic time.time() of the store, every call is one second later
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+def scores(keys:list, compound:float = 0.5) -> pd.DataFrame:
+    return pd.DataFrame({"neg": 0.0, "neu": 0.5, "pos": 0.5, "compound": compound}, index=pd.Index(keys, name="hash"))
+
+
+@pytest.fixture()
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(sentiment_store.time, "time", Clock())
+    return ScoreCache(str(tmp_path / "scores.sqlite"), max_entries=10)
+
+
+def test_headline_hash_normalizes_whitespace_and_unicode():
+    assert headline_hash("Stocks  rally\ton  earnings ") == headline_hash("Stocks rally on earnings")
+    # NFKC: the non-breaking space and the ligature are the plain characters
+    assert headline_hash("Stocks\u00a0rally \ufb01nally") == headline_hash("Stocks rally finally")
+    # the case is kept, VADER scores capitals as emphasis
+    assert headline_hash("STOCKS RALLY") != headline_hash("stocks rally")
+
+
+def test_read_write(cache):
+    cache.write("nltk", "vader", scores(["a", "b"], compound=0.25))
+    found = cache.read("nltk", "vader", ["a", "b", "c", "a"])
+    assert sorted(found.index) == ["a", "b"]
+    assert list(found.columns) == ScoreCache.score_columns
+    assert (found["compound"] == 0.25).all()
+    # keyed by model and model version
+    assert len(cache.read("nltk", "vader2", ["a"])) == 0
+    assert len(cache.read("finBERT", "vader", ["a"])) == 0
+    assert cache.stats() == {"hits": 2, "misses": 3, "hit_rate": 0.4, "size": 2, "evicted": 0}
+    assert cache.cache_info() == (2, 3, 10, 2)
+    cache.clear()
+    assert cache.size() == 0
+
+
+def test_least_recently_used_are_evicted(cache):
+    for i in range(10):
+        cache.write("nltk", "vader", scores([f"h{i}"]))
+    assert cache.size() == 10 and cache.evicted == 0
+    # the oldest entries are used again and survive the eviction
+    cache.read("nltk", "vader", ["h0", "h1", "h2"])
+    cache.write("nltk", "vader", scores(["h10", "h11"]))
+    # 12 entries above max_entries 10: evicted down to 90%, the oldest unused first
+    assert cache.size() == 9
+    assert cache.evicted == 3
+    assert set(cache.read("nltk", "vader", [f"h{i}" for i in range(12)]).index) == {"h0", "h1", "h2", "h6", "h7", "h8", "h9", "h10", "h11"}
+    assert cache.stats()["evicted"] == 3
+
+
+def test_headline_scores_scores_only_misses(tmp_path, monkeypatch):
+    monkeypatch.setattr(sentiment, "_score_cache", None)
+    monkeypatch.setattr(sentiment, "_score_cache_path", "")
+    sentiment._set_score_cache(ScoreCache(str(tmp_path / "scores.sqlite")))
+    scored = []
+    def score_titles(model, titles):
+        scored.append(list(titles))
+        return pd.DataFrame({"neg": 0.0, "neu": 0.0, "pos": 1.0, "compound": [float(len(title)) for title in titles]})
+    monkeypatch.setattr(sentiment.Sentiment, "_score_titles", staticmethod(score_titles))
+
+    titles = pd.Series(["up", "down", "up"], index=[10, 11, 12])
+    first = sentiment.headline_scores("nltk", titles)
+    assert list(first.index) == [10, 11, 12]
+    assert list(first["compound"]) == [2.0, 4.0, 2.0]
+    assert scored == [["up", "down"]]
+
+    # the cached headlines are not scored again, also with other whitespace
+    second = sentiment.headline_scores("nltk", pd.Series(["down ", "flat", "up"]))
+    assert list(second["compound"]) == [4.0, 4.0, 2.0]
+    assert scored == [["up", "down"], ["flat"]]
+
+
+def headlines(rows:list) -> pd.DataFrame:
+    # (date, title, link) -> the columns of a news source
+    return pd.DataFrame({"Date": [row[0] for row in rows], "Title": [row[1] for row in rows], "Link": [row[2] for row in rows], "Source": "test"})
+
+
+@pytest.fixture()
+def archive(tmp_path):
+    return NewsArchive(str(tmp_path / "news.sqlite"), max_age=timedelta(minutes=15))
+
+
+def test_archive_deduplicates_by_link_and_headline(archive):
+    assert archive.write("KO", headlines([("2025-01-02 09:00", "Coke beats", "l1"), ("2025-01-03 09:00", "Coke misses", "l2")]), "test") == 2
+    # the same link, the same headline (other whitespace) under a new link, and one new headline
+    assert archive.write("KO", headlines([("2025-01-02 09:00", "Coke beats again", "l1"), ("2025-01-03 10:00", "Coke  misses", "l3"),
+                                          ("2025-01-04 09:00", "Coke rallies", "l4")]), "test") == 1
+    # the same headline of another ticker is kept
+    assert archive.write("PEP", headlines([("2025-01-02 09:00", "Coke beats", "l1")]), "test") == 1
+    news = archive.read()
+    assert list(news.columns) == NewsArchive.news_columns
+    assert list(news.loc[news["Ticker"] == "KO", "Title"]) == ["Coke beats", "Coke misses", "Coke rallies"]
+    assert archive.stats() == {"headlines": 4, "tickers": 2, "first": "2025-01-02 09:00:00", "last": "2025-01-04 09:00:00"}
+
+
+def test_archive_read(archive):
+    archive.write("KO", headlines([(f"2025-01-{day:02d} 09:00", f"Coke day {day}", f"l{day}") for day in range(1, 11)]), "test")
+    archive.write("PEP", headlines([("2025-01-05 09:00", "Pepsi", "p1")]), "test")
+    # only the newest limit headlines per ticker, ordered by date
+    news = archive.read(["KO", "PEP"], limit=3)
+    assert list(news["Title"]) == ["Coke day 8", "Coke day 9", "Coke day 10", "Pepsi"]
+    # start inclusive, end exclusive
+    news = archive.read(["KO"], start="2025-01-03", end="2025-01-05 09:00")
+    assert list(news["Title"]) == ["Coke day 3", "Coke day 4"]
+    assert news["Date"].dtype.kind == "M"
+    assert len(archive.read(["MSFT"])) == 0
+
+
+def test_archive_latest_and_fresh(archive):
+    assert archive.latest("KO") is None
+    fetched_at = datetime(2025, 1, 10, 12, 0)
+    archive.write("KO", headlines([("2025-01-02 09:00", "Coke beats", "l1"), ("2025-01-03 09:30", "Coke misses", "l2")]), "test", fetched_at=fetched_at)
+    assert archive.latest("KO") == pd.Timestamp("2025-01-03 09:30")
+    assert archive.is_fresh("KO", "test", now=fetched_at + timedelta(minutes=10))
+    assert not archive.is_fresh("KO", "test", now=fetched_at + timedelta(minutes=20))
+    # per source and ticker
+    assert not archive.is_fresh("KO", "finviz", now=fetched_at)
+    assert not archive.is_fresh("PEP", "test", now=fetched_at)
+    # a fetch without new headlines is recorded as well
+    archive.write("PEP", headlines([]), "test", fetched_at=fetched_at)
+    assert archive.is_fresh("PEP", "test", now=fetched_at)
+    assert archive.latest("PEP") is None
+
+
+def test_archive_changes(archive):
+    news, last_row = archive.changes()
+    assert len(news) == 0 and last_row == 0
+    archive.write("KO", headlines([("2025-01-02 09:00", "Coke beats", "l1"), ("2025-01-03 09:00", "Coke misses", "l2")]), "test")
+    news, last_row = archive.changes()
+    assert list(news.columns) == ["Date", "Title", "Ticker", "hash"]
+    assert list(news["Title"]) == ["Coke beats", "Coke misses"]
+    assert list(news["hash"]) == [headline_hash("Coke beats"), headline_hash("Coke misses")]
+    # only the headlines archived after last_row, the duplicates are not archived
+    archive.write("KO", headlines([("2025-01-02 09:00", "Coke beats", "l1"), ("2025-01-04 09:00", "Coke rallies", "l3")]), "test")
+    news, newer_row = archive.changes(last_row)
+    assert list(news["Title"]) == ["Coke rallies"]
+    assert newer_row > last_row
+    assert archive.changes(newer_row)[1] == newer_row
@@ -0,0 +1,28 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from datetime import datetime, timedelta
+import pandas as pd
+
+
+def test_staleness_from_the_environment(market, monkeypatch, tmp_path):
+    monkeypatch.setenv("PORTFOLIO_CACHE_RECENT_DAYS", "3")
+    monkeypatch.setenv("PORTFOLIO_CACHE_MAX_AGE", "60")
+    monkeypatch.setenv("PORTFOLIO_CACHE_INFO_MAX_AGE", "2")
+    market._store, market._store_path = None, str(tmp_path / "market_data.sqlite")
+    store = market._get_store()
+    assert (store.recent_days, store.max_age, store.info_max_age) == (3, timedelta(minutes=60), timedelta(hours=2))
+    # the last 3 days of a range are provisional, trusted for 60 minutes after the fetch
+    bars = pd.DataFrame({"Close": 1.0}, index=pd.date_range("2024-01-01", "2024-01-09"))
+    store.write_history("A", bars, "2024-01-01", "2024-01-10", fetched_at=datetime(2024, 1, 10, 12, 0))
+    assert store.history_gaps("A", "2024-01-01", "2024-01-10", now=datetime(2024, 1, 10, 12, 30)) == []
+    assert store.history_gaps("A", "2024-01-01", "2024-01-10", now=datetime(2024, 1, 10, 13, 30)) == [(pd.Timestamp("2024-01-07"), pd.Timestamp("2024-01-10"))]
+
+
+def test_default_staleness(market, monkeypatch, tmp_path):
+    for name in ["PORTFOLIO_CACHE_RECENT_DAYS", "PORTFOLIO_CACHE_MAX_AGE", "PORTFOLIO_CACHE_INFO_MAX_AGE"]:
+        monkeypatch.delenv(name, raising=False)
+    market._store, market._store_path = None, str(tmp_path / "market_data.sqlite")
+    store = market._get_store()
+    assert (store.recent_days, store.max_age, store.info_max_age) == (1, timedelta(minutes=15), timedelta(days=1))
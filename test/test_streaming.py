@@ -0,0 +1,100 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from portfolio import Portfolio, indicators
+from portfolio.streaming import StreamingIndicator, SMA, RollingStd, EMA, Bollinger, RSI, MACD, MFI, PortfolioIndicators
+
+INTERVAL = 14
+DAYS = 300
+
+
+@pytest.fixture(scope="module")
+def bars():
+    # random walk with flat stretches (weekends, no trades), the invested capital is a step function
+    rng = np.random.default_rng(7)
+    days = pd.date_range("2023-01-01", periods=DAYS, freq="D", name="Date")
+    close = pd.Series(1000 * np.exp(np.cumsum(rng.normal(0, 0.01, DAYS))), index=days)
+    close[days.dayofweek >= 5] = np.nan
+    close = close.ffill()
+    price = pd.Series(np.repeat(rng.uniform(800, 1200, DAYS // 50), 50), index=days)
+    high = close * (1 + rng.uniform(0, 0.02, DAYS))
+    low = close * (1 - rng.uniform(0, 0.02, DAYS))
+    volume = pd.Series(rng.integers(1000, 5000, DAYS), index=days)
+    return {"close": close, "price": price, "high": high, "low": low, "volume": volume}
+
+
+def stream(indicator:StreamingIndicator, *inputs) -> np.ndarray:
+    """
+    The values of indicator fed bar by bar, the indicator is restored from its JSON state halfway
+    """
+    values = []
+    for row in range(len(inputs[0])):
+        if row == len(inputs[0]) // 2:
+            indicator = StreamingIndicator.from_state(json.loads(json.dumps(indicator.state())))
+        values.append(indicator.update(*[float(series.iloc[row]) for series in inputs]))
+    return np.array(values, dtype=np.float64)
+
+
+def assert_parity(streamed, batch):
+    np.testing.assert_allclose(streamed, np.asarray(batch, dtype=np.float64), rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_sma_std_ema(bars):
+    close = bars["close"]
+    assert_parity(stream(SMA(INTERVAL), close), indicators.sma(close, INTERVAL))
+    assert_parity(stream(RollingStd(INTERVAL), close), indicators.std(close, INTERVAL))
+    assert_parity(stream(EMA(INTERVAL), close), indicators.ema(close, INTERVAL))
+
+
+def test_bollinger(bars):
+    upper, lower = indicators.bollinger(bars["close"], INTERVAL)
+    streamed = stream(Bollinger(INTERVAL), bars["close"])
+    assert_parity(streamed[:, 0], upper)
+    assert_parity(streamed[:, 1], lower)
+
+
+def test_rsi(bars):
+    streamed = stream(RSI(INTERVAL), bars["close"])
+    assert_parity(streamed, indicators.rsi(bars["close"], INTERVAL))
+    assert_parity(streamed, Portfolio.calculate_rsi(pd.DataFrame({"close": bars["close"]}), INTERVAL))
+
+
+def test_macd(bars):
+    streamed = stream(MACD(), bars["close"])
+    for column, batch, method in zip(range(3), indicators.macd(bars["close"]), Portfolio.calculate_macd(pd.DataFrame({"close": bars["close"]}))):
+        assert_parity(streamed[:, column], batch)
+        assert_parity(streamed[:, column], method)
+
+
+def test_mfi(bars):
+    quotes = [bars[field] for field in ["high", "low", "close", "volume"]]
+    streamed = stream(MFI(INTERVAL), *quotes)
+    assert_parity(streamed, indicators.mfi(*[quote.to_frame() for quote in quotes], interval=INTERVAL).iloc[:, 0])
+    assert_parity(streamed, Portfolio.calculate_mfi(*quotes, interval=INTERVAL))
+
+
+def test_portfolio_indicators(bars):
+    close, price = bars["close"], bars["price"]
+    batch = indicators.portfolio_registry.compute({"close": close, "price": price}, PortfolioIndicators.names, interval=INTERVAL)
+    half = DAYS // 2
+    # primed with the first half, restored from JSON and updated with the second half
+    primed = PortfolioIndicators(INTERVAL).prime(close.iloc[:half], price.iloc[:half], end=close.index[half - 1])
+    restored = StreamingIndicator.from_state(json.loads(json.dumps(primed.state())))
+    assert restored.end == close.index[half - 1]
+    rows = [restored.update(close.iloc[row], price.iloc[row], date=close.index[row]) for row in range(half, DAYS)]
+    for name in PortfolioIndicators.names:
+        assert_parity([row[name] for row in rows], batch[name].iloc[half:])
+    assert restored.end == close.index[-1]
+
+
+def test_prime_matches_update(bars):
+    close = bars["close"]
+    for make in [lambda: SMA(INTERVAL), lambda: RollingStd(INTERVAL), lambda: EMA(INTERVAL), lambda: RSI(INTERVAL), lambda: MACD()]:
+        updated, primed = make(), make().prime(close.iloc[:-1].to_numpy())
+        for value in close.iloc[:-1]: updated.update(value)
+        assert_parity(primed.update(close.iloc[-1]), updated.update(close.iloc[-1]))